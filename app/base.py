@@ -18,16 +18,24 @@
 #  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
 
 import signal
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 
 import colored
 from colored import stylize
 
-from app.exceptions import ShutdownException
-from app.models.codec import CodecMetadata
+from app.decoder_plans import DecoderPlans
+from app.failure_cache import DecodeFailureCache
+from app.exceptions import ShutdownException, BlockRuntimeNotFound
+from app.models.codec import CodecMetadata, RuntimeStorage, CodecDecodeFailure
 from app.models.node import HarvesterStatus, NodeBlockHeader, NodeBlockHeaderDigestLog, NodeBlockExtrinsic, \
-    NodeBlockRuntime, NodeMetadata, NodeBlockStorage
+    NodeBlockRuntime, NodeMetadata, NodeBlockStorage, NodeRuntime, HarvesterStorageTask, HarvesterStorageCron
+from scalecodec.base import ScaleBytes, RuntimeConfigurationObject
+from scalecodec.type_registry import load_type_registry_preset
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
 from substrateinterface import SubstrateInterface
+from substrateinterface.exceptions import BlockNotFound, SubstrateRequestException, StorageFunctionNotFound
 
 
 class Job:
@@ -55,26 +63,422 @@ class Job:
                     self.log("🛑 Warm shutdown initiated", 1)
                     raise ShutdownException()
 
+    def get_extrinsic_failure_key(self, node_extrinsic):
+        """
+        Key of an extrinsic in the decode failure cache; requires the runtime of the extrinsic to be initialized
+        :return: call of the extrinsic, or None when it cannot be determined without a full decode
+        """
+        try:
+            call_index = self.db_substrate.get_extrinsic_call_index(node_extrinsic.data)
+
+            if call_index is not None:
+                return 'call:{}.{}'.format(*self.db_substrate.get_call_function_name(call_index))
+        except Exception:
+            return None
+
+    def add_decode_failure(self, item_type: str, node_item, exception: Exception, type_key: str = None,
+                           spec_version: int = None):
+        """
+        Queues a raw extrinsic, log or storage item that failed to decode, to be retried by `Cron`
+        """
+        decode_failure = CodecDecodeFailure(
+            item_type=item_type,
+            block_hash=node_item.block_hash,
+            item_idx=getattr(node_item, f'{item_type}_idx', 0),
+            storage_key=getattr(node_item, 'storage_key', None) or b'',
+            block_number=node_item.block_number,
+            spec_version=spec_version,
+            type_key=type_key,
+            attempts=1
+        )
+        self.set_decode_failure_error(decode_failure, exception)
+        self.session.merge(decode_failure)
+
+    def set_decode_failure_error(self, decode_failure: CodecDecodeFailure, exception: Exception):
+        """
+        Records the error of the last attempt and schedules the next attempt with an exponential backoff,
+        or stops retrying after `DECODE_RETRY_MAX_ATTEMPTS` attempts
+        """
+        decode_failure.error_class = exception.__class__.__name__
+        decode_failure.error_message = str(exception)[:1024]
+
+        if decode_failure.attempts >= self.harvester.settings.DECODE_RETRY_MAX_ATTEMPTS:
+            decode_failure.next_attempt = None
+        else:
+            decode_failure.next_attempt = datetime.now(timezone.utc) + timedelta(
+                seconds=self.harvester.settings.DECODE_RETRY_INTERVAL * 2 ** (decode_failure.attempts - 1)
+            )
+
+    def report_decode_failure_stats(self, failure_stats: dict):
+        for type_key, (failed_count, skipped_count) in failure_stats.items():
+            self.harvester.prom_decode_failures.labels(type_key).inc(failed_count)
+            self.harvester.prom_decode_failures_skipped.labels(type_key).inc(skipped_count)
+
+    def report_data_cache_stats(self, data_cache_stats: dict):
+        for cache_name, (hit_count, miss_count) in data_cache_stats.items():
+            self.harvester.prom_data_cache_hits.labels(cache_name).inc(hit_count)
+            self.harvester.prom_data_cache_misses.labels(cache_name).inc(miss_count)
+
     @staticmethod
     def format_hash(_hash: bytes):
         return f'0x{_hash.hex()[0:5]}...{_hash.hex()[-5:]}'
 
+    def process_storage_cron_events(self, block_number: int, events: list):
+        """
+        Schedules a storage task for every storage cron entry which is triggered by one of the given decoded events,
+        once per cron entry and block, so decoding a block again does not schedule the same capture twice
+        :param block_number: block in which the events occurred
+        :param events: list of decoded event records
+        :return:
+        """
+        block_events = set((event['module_id'], event['event_id']) for event in events)
+
+        for cron_entry in self.harvester.storage_cron_entries:
+
+            if not cron_entry.trigger_event_module:
+                continue
+
+            if (cron_entry.trigger_event_module, cron_entry.trigger_event_name) in block_events:
+
+                if HarvesterStorageTask.query(self.session).filter_by(
+                        cron_id=cron_entry.id, block_number=block_number).count():
+                    continue
+
+                task = HarvesterStorageTask(
+                    storage_pallet=cron_entry.storage_module,
+                    storage_name=cron_entry.storage_name,
+                    storage_key=cron_entry.storage_key,
+                    storage_key_prefix=cron_entry.storage_key_prefix,
+                    blocks={'block_ids': [block_number]},
+                    cron_id=cron_entry.id,
+                    block_number=block_number,
+                    complete=False,
+                    description=f'{cron_entry.storage_module}.{cron_entry.storage_name} for block {block_number} '
+                                f'(triggered by {cron_entry.trigger_event_module}.{cron_entry.trigger_event_name})'
+                )
+                task.save(self.session)
+
+                self.log(f'Scheduled {cron_entry.storage_module}.{cron_entry.storage_name} for #{block_number}')
+
+
+class CachedRuntimeConfigurationObject(RuntimeConfigurationObject):
+    """
+    RuntimeConfigurationObject that reuses the decoder classes it resolves. The default implementation parses the type
+    string and creates a new class for every composite type like `Vec<T>` or `(A, B)` on every lookup, which accounts
+    for most of the time spent decoding metadata and initialising a runtime. The cache is cleared on every change of
+    the type registry and disabled while it is being updated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.decoder_class_cache = {}
+        super().__init__(*args, **kwargs)
+
+    def get_decoder_class(self, type_string):
+        if type(type_string) is not str or self.decoder_class_cache is None:
+            return super().get_decoder_class(type_string)
+
+        if type_string in self.decoder_class_cache:
+            decoder_class = self.decoder_class_cache[type_string]
+
+            if decoder_class and decoder_class.runtime_config is not self:
+                # Shared base classes are attached to the runtime configuration that looked them up last
+                decoder_class.runtime_config = self
+
+            return decoder_class
+
+        decoder_class = super().get_decoder_class(type_string)
+        self.decoder_class_cache[type_string] = decoder_class
+
+        return decoder_class
+
+    def clear_type_registry(self):
+        self.decoder_class_cache = {}
+        super().clear_type_registry()
+
+    def update_type_registry_types(self, types_dict):
+        self.decoder_class_cache = None
+        try:
+            super().update_type_registry_types(types_dict)
+        finally:
+            self.decoder_class_cache = {}
+
+    def update_from_scale_info_types(self, scale_info_types: list, prefix: str = None):
+        self.decoder_class_cache = None
+        try:
+            super().update_from_scale_info_types(scale_info_types, prefix=prefix)
+        finally:
+            self.decoder_class_cache = {}
+
 
 class DatabaseSubstrateInterface(SubstrateInterface):
 
     def __init__(self, **kwargs):
         self.db_session = kwargs.pop('db_session')
         self.verbose_level = kwargs.pop('verbose_level', 1)
+        self.runtime_cache_size = kwargs.pop('runtime_cache_size', 10)
+        self.data_cache_size = kwargs.pop('data_cache_size', 1000)
+        self.enable_decoder_plans = kwargs.pop('enable_decoder_plans', False)
         kwargs['url'] = 'http://dummy'
+        self.local_metadata_cache = OrderedDict()
+        self.local_storage_function_cache = {}
+        self.runtime_cache = OrderedDict()
+        self.block_runtime_cache = {}
+        self.data_caches = {'header': OrderedDict(), 'digest_logs': OrderedDict(), 'runtime': OrderedDict(),
+                            'metadata': OrderedDict()}
+        self.data_cache_stats = {}
+        self.decoder_plans = {}
+        self.call_function_names = {}
+        self.storage_value_types = {}
+        kwargs.setdefault('runtime_config', CachedRuntimeConfigurationObject())
         super().__init__(**kwargs)
 
     def log(self, message, verbose_level=1):
         if verbose_level <= self.verbose_level:
             print(stylize(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), colored.fg("gray")), message)
 
+    def get_local_metadata(self, spec_name: str, spec_version: int):
+        """
+        Decodes metadata of given runtime from the `NodeMetadata` table, kept in an LRU cache of `runtime_cache_size`
+        runtimes like the runtime cache of `init_runtime()`
+        :return: MetadataVersioned or None when metadata is not stored
+        """
+        cache_key = (spec_name, spec_version)
+
+        if cache_key in self.local_metadata_cache:
+            self.local_metadata_cache.move_to_end(cache_key)
+            return self.local_metadata_cache[cache_key]
+
+        metadata_data = self.get_metadata_data(spec_name, spec_version)
+
+        if not metadata_data:
+            return None
+
+        metadata = self.runtime_config.create_scale_object(
+            'MetadataVersioned', data=ScaleBytes(bytearray(metadata_data))
+        )
+        metadata.decode()
+
+        self.local_metadata_cache[cache_key] = metadata
+
+        while len(self.local_metadata_cache) > self.runtime_cache_size:
+            evicted_cache_key, _ = self.local_metadata_cache.popitem(last=False)
+
+            # Storage functions are part of the evicted metadata
+            for storage_function_key in [key for key in self.local_storage_function_cache if
+                                         key[:2] == evicted_cache_key]:
+                del self.local_storage_function_cache[storage_function_key]
+
+        return metadata
+
+    def get_local_storage_function(self, spec_name: str, spec_version: int, pallet: str, storage_name: str):
+        """
+        Resolves a storage function and its key prefix from the `RuntimeStorage` and `NodeMetadata` tables, without
+        requests to the node. Results are cached per runtime
+        :return: tuple of (storage key prefix, storage function metadata) or (None, None) when not found
+        """
+        cache_key = (spec_name, spec_version, pallet, storage_name)
+
+        if cache_key not in self.local_storage_function_cache:
+
+            runtime_storage = RuntimeStorage.query(self.db_session).get(
+                (spec_name, spec_version, pallet, storage_name)
+            )
+
+            metadata = self.get_local_metadata(spec_name, spec_version)
+
+            if not runtime_storage or not metadata:
+                return None, None
+
+            metadata_pallet = metadata.get_metadata_pallet(pallet)
+            storage_function = metadata_pallet.get_storage_function(storage_name) if metadata_pallet else None
+
+            if not storage_function:
+                return None, None
+
+            self.local_storage_function_cache[cache_key] = (
+                runtime_storage.key_prefix_pallet + runtime_storage.key_prefix_name, storage_function
+            )
+
+        return self.local_storage_function_cache[cache_key]
+
+    def load_block_runtimes(self, block_start: int, block_end: int):
+        """
+        Resolves the runtime spec version that applies to each block in given range with one query, so
+        `init_runtime` does not have to look up the header and runtime version of every block separately
+        """
+        block_runtimes = {
+            block_hash: spec_version for block_hash, spec_version in self.db_session.query(
+                NodeBlockRuntime.hash, NodeBlockRuntime.spec_version
+            ).filter(NodeBlockRuntime.block_number >= block_start - 1, NodeBlockRuntime.block_number <= block_end)
+        }
+
+        block_headers = self.db_session.query(NodeBlockHeader.hash, NodeBlockHeader.parent_hash).filter(
+            NodeBlockHeader.block_number >= block_start, NodeBlockHeader.block_number <= block_end
+        )
+
+        self.block_runtime_cache = {}
+
+        for block_hash, parent_hash in block_headers:
+            # Calls and storage are decoded against the runtime of the parent block
+            runtime_block_hash = block_hash if parent_hash == bytes(32) else parent_hash
+
+            if runtime_block_hash in block_runtimes:
+                self.block_runtime_cache[f'0x{block_hash.hex()}'] = block_runtimes[runtime_block_hash]
+
+    def load_block_hash_runtimes(self, block_hashes: list):
+        """
+        Resolves the runtime spec version that applies to each of given blocks, which do not have to be contiguous,
+        with one query for the headers and one for the runtimes
+        """
+        block_headers = self.db_session.query(NodeBlockHeader.hash, NodeBlockHeader.parent_hash).filter(
+            NodeBlockHeader.hash.in_(block_hashes)
+        ).all()
+
+        # Calls and storage are decoded against the runtime of the parent block
+        runtime_block_hashes = {
+            block_hash: block_hash if parent_hash == bytes(32) else parent_hash
+            for block_hash, parent_hash in block_headers
+        }
+
+        block_runtimes = dict(self.db_session.query(NodeBlockRuntime.hash, NodeBlockRuntime.spec_version).filter(
+            NodeBlockRuntime.hash.in_(set(runtime_block_hashes.values()))
+        ))
+
+        self.block_runtime_cache = {}
+
+        for block_hash, runtime_block_hash in runtime_block_hashes.items():
+            if runtime_block_hash in block_runtimes:
+                self.block_runtime_cache[f'0x{block_hash.hex()}'] = block_runtimes[runtime_block_hash]
+
+    def get_block_spec_version(self, block_hash: str) -> int:
+        """
+        Retrieves the runtime spec version used to decode given block, which is the runtime of its parent block
+        """
+        if block_hash in self.block_runtime_cache:
+            return self.block_runtime_cache[block_hash]
+
+        return self.get_runtime_of_block(block_hash).spec_version
+
+    def get_runtime_of_block(self, block_hash: str):
+        """
+        Retrieves the runtime used to decode given block, which is the runtime of its parent block
+        :return: row with hash, spec_name and spec_version of the runtime
+        """
+        block = self.get_block_header_data(bytes.fromhex(block_hash[2:]))
+
+        if not block:
+            raise BlockNotFound(f'Block not found for "{block_hash}"')
+
+        runtime_block_hash = block.hash if block.parent_hash == bytes(32) else block.parent_hash
+
+        block_runtime = self.get_block_runtime_data(runtime_block_hash)
+
+        if not block_runtime:
+            raise BlockRuntimeNotFound(f"No runtime information for block '{block_hash}'")
+
+        return block_runtime
+
+    # Data source: raw bytes as stored by the harvester, used directly by the decoder and by the emulated RPC requests
+
+    def get_cached_data(self, cache_name: str, key, load_data, cache_size: int):
+        """
+        Looks up `key` in given LRU cache, or stores the result of `load_data()` when it is not found. Only finalized
+        blocks are stored, so cached results never change; results that are not found (None) are not cached
+        """
+        cache = self.data_caches[cache_name]
+        cache_stats = self.data_cache_stats.setdefault(cache_name, [0, 0])
+
+        if key in cache:
+            cache.move_to_end(key)
+            cache_stats[0] += 1
+            return cache[key]
+
+        cache_stats[1] += 1
+        data = load_data()
+
+        if data is not None:
+            cache[key] = data
+
+            if len(cache) > cache_size:
+                cache.popitem(last=False)
+
+        return data
+
+    def pop_data_cache_stats(self) -> dict:
+        """
+        :return: dict of cache name to [hit count, miss count] since the previous call
+        """
+        data_cache_stats = self.data_cache_stats
+        self.data_cache_stats = {}
+        return data_cache_stats
+
+    def get_block_header_data(self, block_hash: bytes):
+        """
+        :return: row with hash, parent_hash, number, extrinsics_root and state_root of given block, or None
+        """
+        return self.get_cached_data('header', block_hash, lambda: self.db_session.query(
+            NodeBlockHeader.hash, NodeBlockHeader.parent_hash, NodeBlockHeader.number,
+            NodeBlockHeader.extrinsics_root, NodeBlockHeader.state_root
+        ).filter_by(hash=block_hash).first(), self.data_cache_size)
+
+    def get_block_digest_logs_data(self, block_hash: bytes) -> list:
+        """
+        :return: list of SCALE encoded digest logs of given block
+        """
+        return self.get_cached_data('digest_logs', block_hash, lambda: [
+            data for data, in self.db_session.query(NodeBlockHeaderDigestLog.data).filter_by(
+                block_hash=block_hash
+            ).order_by(NodeBlockHeaderDigestLog.log_idx)
+        ], self.data_cache_size)
+
+    def get_block_extrinsics_data(self, block_hash: bytes) -> list:
+        """
+        :return: list of SCALE encoded extrinsics of given block, including their length prefix
+        """
+        return [
+            length + data for length, data in self.db_session.query(
+                NodeBlockExtrinsic.length, NodeBlockExtrinsic.data
+            ).filter_by(block_hash=block_hash).order_by(NodeBlockExtrinsic.extrinsic_idx)
+        ]
+
+    def get_block_runtime_data(self, block_hash: bytes):
+        """
+        :return: row with hash, spec_name and spec_version of the runtime of given block, or None
+        """
+        return self.get_cached_data('runtime', block_hash, lambda: self.db_session.query(
+            NodeBlockRuntime.hash, NodeBlockRuntime.spec_name, NodeBlockRuntime.spec_version
+        ).filter_by(hash=block_hash).first(), self.data_cache_size)
+
+    def get_metadata_data(self, spec_name: str, spec_version: int) -> bytes:
+        """
+        :return: SCALE encoded metadata of given runtime, or None when not stored
+        """
+        return self.get_cached_data('metadata', (spec_name, spec_version), lambda: self.db_session.query(
+            NodeMetadata.data
+        ).filter_by(spec_name=spec_name, spec_version=spec_version).scalar(), self.runtime_cache_size)
+
+    def get_transaction_version_data(self, spec_name: str, spec_version: int) -> int:
+        """
+        :return: transaction version of given runtime, or None when not stored
+        """
+        return self.db_session.query(NodeRuntime.transaction_version).filter_by(
+            spec_name=spec_name, spec_version=spec_version
+        ).limit(1).scalar()
+
+    def get_storage_data(self, block_hash: bytes, storage_key: bytes) -> bytes:
+        """
+        :return: raw storage value at given block, or None when no entry is stored
+        """
+        storage_entry = NodeBlockStorage.query(self.db_session).filter_by(
+            block_hash=block_hash, storage_key=storage_key
+        ).first()
+
+        if storage_entry:
+            return storage_entry.data
+
     def get_block_hash(self, block_id):
 
-        block = NodeBlockHeader.query(self.db_session).filter_by(block_number=block_id)
+        block = NodeBlockHeader.query(self.db_session).filter_by(block_number=block_id).first()
 
         if block:
             return '0x{}'.format(block.hash.hex())
@@ -98,19 +502,17 @@ class DatabaseSubstrateInterface(SubstrateInterface):
             return {"jsonrpc": "2.0", "result": item.value, "id": self.request_id}
 
         elif method == 'chain_getHeader':
-            block = NodeBlockHeader.query(self.db_session).get(bytes.fromhex(params[0][2:]))
+            block = self.get_block_header_data(bytes.fromhex(params[0][2:]))
             if block:
 
-                logs = NodeBlockHeaderDigestLog.query(self.db_session).filter_by(
-                    block_hash=block.hash
-                ).order_by('log_idx')
+                logs = self.get_block_digest_logs_data(block.hash)
 
                 return {
                     "jsonrpc": "2.0",
                     "result": {
                         "digest": {
                             "logs": [
-                                '0x{}'.format(log.data.hex()) for log in logs
+                                '0x{}'.format(log.hex()) for log in logs
                             ]
                         },
                         "extrinsicsRoot": '0x{}'.format(block.extrinsics_root.hex()),
@@ -121,29 +523,24 @@ class DatabaseSubstrateInterface(SubstrateInterface):
                     "id": self.request_id
                 }
         elif method == 'chain_getBlock':
-            block = NodeBlockHeader.query(self.db_session).get(bytes.fromhex(params[0][2:]))
+            block = self.get_block_header_data(bytes.fromhex(params[0][2:]))
             if block:
 
-                extrinsics = NodeBlockExtrinsic.query(self.db_session).filter_by(
-                    block_hash=block.hash
-                ).order_by('extrinsic_idx')
+                extrinsics = self.get_block_extrinsics_data(block.hash)
 
-                logs = NodeBlockHeaderDigestLog.query(self.db_session).filter_by(
-                    block_hash=block.hash
-                ).order_by('log_idx')
+                logs = self.get_block_digest_logs_data(block.hash)
 
                 return {
                     "jsonrpc": "2.0",
                     "result": {
                         "block": {
                             "extrinsics": [
-                                '0x{}{}'.format(extrinsic.length.hex(), extrinsic.data.hex())
-                                for extrinsic in extrinsics
+                                '0x{}'.format(extrinsic.hex()) for extrinsic in extrinsics
                             ],
                             "header": {
                                 "digest": {
                                     "logs": [
-                                        '0x{}'.format(log.data.hex()) for log in logs
+                                        '0x{}'.format(log.hex()) for log in logs
                                     ]
                                 },
                                 "extrinsicsRoot": '0x{}'.format(block.extrinsics_root.hex()),
@@ -158,7 +555,7 @@ class DatabaseSubstrateInterface(SubstrateInterface):
                 }
 
         elif method in ['chain_getRuntimeVersion', 'state_getRuntimeVersion']:
-            block_runtime = NodeBlockRuntime.query(self.db_session).get(bytes.fromhex(params[0][2:]))
+            block_runtime = self.get_block_runtime_data(bytes.fromhex(params[0][2:]))
 
             if block_runtime:
                 return {
@@ -181,22 +578,21 @@ class DatabaseSubstrateInterface(SubstrateInterface):
             }
 
         elif method == 'state_getMetadata':
-            block_runtime = NodeBlockRuntime.query(self.db_session).get(bytes.fromhex(params[0][2:]))
-            metadata = NodeMetadata.query(self.db_session).filter_by(
-                spec_name=block_runtime.spec_name, spec_version=block_runtime.spec_version
-            ).one()
+            block_runtime = self.get_block_runtime_data(bytes.fromhex(params[0][2:]))
+            metadata_data = self.get_metadata_data(block_runtime.spec_name, block_runtime.spec_version)
+
+            if metadata_data is None:
+                raise SubstrateRequestException(f"No metadata for runtime '{block_runtime.spec_version}'")
 
             return {
                 "jsonrpc": "2.0",
-                "result": '0x{}'.format(metadata.data.hex()),
+                "result": '0x{}'.format(metadata_data.hex()),
                 "id": self.request_id
             }
         elif method == 'state_getStorageAt':
-            storage_entry = NodeBlockStorage.query(self.db_session).filter_by(
-                block_hash=bytes.fromhex(params[1][2:]), storage_key=bytes.fromhex(params[0][2:])
-            ).first()
-            if storage_entry:
-                return {"jsonrpc": "2.0", "result": storage_entry.data, "id": self.request_id}
+            storage_data = self.get_storage_data(bytes.fromhex(params[1][2:]), bytes.fromhex(params[0][2:]))
+            if storage_data is not None:
+                return {"jsonrpc": "2.0", "result": storage_data, "id": self.request_id}
 
             raise ValueError("NodeBlockStorage entry expected but not found")
 
@@ -247,10 +643,288 @@ class DatabaseSubstrateInterface(SubstrateInterface):
 
         raise ValueError("No handler for method '{}'".format(method))
 
-    def init_runtime(self, *args, **kwargs):
-        super().init_runtime(*args, **kwargs)
-        # Reset ss58_format to prevent automatic SS58 encoding of AccountIds
-        self.runtime_config.ss58_format = None
+    def init_runtime(self, block_hash=None, block_id=None):
+        """
+        Activates the runtime of given block. Fully initialised runtime configurations and metadata are kept in an LRU
+        cache per spec version, so switching between runtimes does not reload the type registry or parse metadata
+        again
+        """
+        if block_id is not None and block_hash is None:
+            block_hash = self.get_block_hash(block_id)
+
+        if block_hash is None:
+            super().init_runtime()
+            self.runtime_config.ss58_format = None
+            return
+
+        # Check if runtime state already set to current block
+        if block_hash == self.block_hash:
+            return
+
+        spec_version = self.get_block_spec_version(block_hash)
+
+        if spec_version != self.runtime_version:
+
+            if spec_version in self.runtime_cache:
+                self.runtime_cache.move_to_end(spec_version)
+                self.runtime_config, self.metadata, self.config['is_weight_v2'], self.transaction_version, \
+                    self._SubstrateInterface__ss58_format = self.runtime_cache[spec_version]
+                self.runtime_version = spec_version
+            else:
+                # Initialise runtime in a new configuration object, leaving cached ones intact
+                self.runtime_config = CachedRuntimeConfigurationObject()
+
+                self.load_runtime(self.get_runtime_of_block(block_hash))
+
+                self.runtime_cache[spec_version] = (
+                    self.runtime_config, self.metadata, self.config.get('is_weight_v2'), self.transaction_version,
+                    self._SubstrateInterface__ss58_format
+                )
+
+                while len(self.runtime_cache) > self.runtime_cache_size:
+                    evicted_spec_version, _ = self.runtime_cache.popitem(last=False)
+                    self._SubstrateInterface__metadata_cache.pop(evicted_spec_version, None)
+                    self.decoder_plans.pop(evicted_spec_version, None)
+                    self.call_function_names.pop(evicted_spec_version, None)
+                    self.storage_value_types.pop(evicted_spec_version, None)
+
+            # Reset ss58_format to prevent automatic SS58 encoding of AccountIds
+            self.runtime_config.ss58_format = None
+
+        self.block_hash = block_hash
+        self.block_id = block_id
+
+    def load_runtime(self, block_runtime):
+        """
+        Initialises the active runtime configuration for given runtime like `SubstrateInterface.init_runtime()`, but
+        decodes the metadata from the stored bytes instead of requesting the header, runtime version and metadata as
+        hex encoded RPC results.
+
+        Follows the steps of `init_runtime()` of substrate-interface 1.8.x after the runtime version is determined,
+        including its private metadata cache; review this method when upgrading substrate-interface.
+        """
+        metadata_data = self.get_metadata_data(block_runtime.spec_name, block_runtime.spec_version)
+
+        if metadata_data is None:
+            raise SubstrateRequestException(f"No metadata for runtime '{block_runtime.spec_version}'")
+
+        self.runtime_version = block_runtime.spec_version
+        self.transaction_version = self.get_transaction_version_data(
+            block_runtime.spec_name, block_runtime.spec_version
+        )
+
+        metadata_cache = self._SubstrateInterface__metadata_cache
+
+        # Metadata types are needed to decode the metadata itself
+        self.runtime_config.update_type_registry(load_type_registry_preset(name="core"))
+
+        if self.runtime_version in metadata_cache:
+            self.metadata = metadata_cache[self.runtime_version]
+        else:
+            self.metadata = self.runtime_config.create_scale_object(
+                'MetadataVersioned', data=ScaleBytes(bytearray(metadata_data))
+            )
+            self.metadata.decode()
+            metadata_cache[self.runtime_version] = self.metadata
+
+        self.reload_type_registry(
+            use_remote_preset=self.config.get('use_remote_preset'), auto_discover=self.config.get('auto_discover')
+        )
+
+        if self.implements_scaleinfo():
+            self.runtime_config.add_portable_registry(self.metadata)
+
+        self.runtime_config.set_active_spec_version_id(self.runtime_version)
+
+        # Check and apply runtime constants
+        ss58_prefix_constant = self.get_runtime_constant("System", "SS58Prefix")
+
+        if ss58_prefix_constant is not None:
+            self.ss58_format = ss58_prefix_constant
+
+        # Set runtime compatibility flags
+        try:
+            self.runtime_config.create_scale_object("sp_weights::weight_v2::Weight")
+            self.config['is_weight_v2'] = True
+            self.runtime_config.update_type_registry_types({'Weight': 'sp_weights::weight_v2::Weight'})
+        except NotImplementedError:
+            self.config['is_weight_v2'] = False
+            self.runtime_config.update_type_registry_types({'Weight': 'WeightV1'})
+
+    def get_runtime_constant(self, pallet: str, constant_name: str):
+        """
+        Decodes a constant of the runtime that is being loaded, without `get_constant()` initialising a runtime
+        :return: decoded value, or None when the constant does not exist
+        """
+        for metadata_pallet in self.metadata.pallets:
+            if metadata_pallet.name == pallet:
+                for constant in metadata_pallet.constants or []:
+                    if constant.value['name'] == constant_name:
+                        return self.runtime_config.create_scale_object(
+                            constant.type, data=ScaleBytes(constant.constant_value), metadata=self.metadata
+                        ).decode()
+
+    def get_decoder_plans(self) -> DecoderPlans:
+        if self.runtime_version not in self.decoder_plans:
+            self.decoder_plans[self.runtime_version] = DecoderPlans(self.runtime_config, self.metadata)
+
+        return self.decoder_plans[self.runtime_version]
+
+    def get_extrinsic_call_index(self, data: bytes):
+        """
+        Determines the call index of an extrinsic of the active runtime without decoding the call itself
+        :param data: extrinsic without length prefix
+        :return: call index as bytes, or None when it cannot be determined without a full decode
+        """
+        if data[0] & 128 == 0:
+            # Unsigned extrinsic: version byte is followed by the call
+            return bytes(data[1:3])
+
+        # Only the fields preceding the call are skipped, also used when decoder plans are disabled for decoding
+        if self.metadata.portable_registry:
+            return self.get_decoder_plans().decode_call_index(data)
+
+    def get_call_function_name(self, call_index: bytes) -> tuple:
+        """
+        :return: tuple of (pallet name, call function name) for given call index of the active runtime
+        """
+        call_function_names = self.call_function_names.setdefault(self.runtime_version, {})
+
+        if call_index not in call_function_names:
+
+            if self.metadata.portable_registry:
+                pallet = self.metadata.get_pallet_by_index(call_index[0])
+                call_function = [call for call in pallet.calls or [] if call.value['index'] == call_index[1]][0]
+                call_function_names[call_index] = (pallet.name, call_function.name)
+            else:
+                call_module, call_function = self.metadata.call_index[call_index.hex()]
+                call_function_names[call_index] = (call_module.value['name'], call_function.value['name'])
+
+        return call_function_names[call_index]
+
+    def get_storage_value_type(self, pallet: str, storage_name: str) -> tuple:
+        """
+        Resolves the value type of a storage function of the active runtime, cached per runtime
+        :return: tuple of (value type string, modifier, default value as bytes)
+        """
+        storage_value_types = self.storage_value_types.setdefault(self.runtime_version, {})
+        key = (pallet, storage_name)
+
+        if key not in storage_value_types:
+            metadata_pallet = self.metadata.get_metadata_pallet(pallet)
+            storage_function = metadata_pallet.get_storage_function(storage_name) if metadata_pallet else None
+
+            if not storage_function:
+                raise StorageFunctionNotFound(f'Storage function "{pallet}.{storage_name}" not found')
+
+            storage_value_types[key] = (
+                storage_function.get_value_type_string(),
+                storage_function.value['modifier'],
+                bytes(storage_function.value_object['default'].value_object)
+            )
+
+        return storage_value_types[key]
+
+    def decode_storage_value(self, pallet: str, storage_name: str, data: bytes = None) -> tuple:
+        """
+        Decodes a raw storage value of the active runtime, the same way as `query()` but without the storage key
+        handling and the request for the raw value. When `data` is None, the default value of the storage function
+        is decoded.
+        :return: tuple of (type string, decoded value)
+        """
+        value_type, modifier, default = self.get_storage_value_type(pallet, storage_name)
+
+        if data is None:
+            data = default
+
+            if modifier != 'Default':
+                # No result is interpreted as an Option<...> result
+                value_type = f'Option<{value_type}>'
+
+        return value_type, self.decode_scale(value_type, data)
+
+    def decode_storage_values(self, pallet: str, storage_name: str, data_list: list,
+                              return_exceptions: bool = False) -> tuple:
+        """
+        Decodes a list of raw storage values of the same storage function of the active runtime at once
+        :param return_exceptions: return the exception of a value that fails to decode in its place instead of raising
+        :return: tuple of (type string, list of decoded values)
+        """
+        value_type = self.get_storage_value_type(pallet, storage_name)[0]
+
+        if self.enable_decoder_plans and self.metadata.portable_registry:
+            return value_type, self.get_decoder_plans().decode_batch(value_type, data_list, return_exceptions)
+
+        values = []
+
+        for data in data_list:
+            try:
+                values.append(self.decode_scale(value_type, data))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                values.append(e)
+
+        return value_type, values
+
+    def decode_scale(self, type_string: str, data: bytes):
+        """
+        Decodes SCALE encoded `data` as `type_string` for the active runtime. When enabled and the runtime contains a
+        PortableRegistry, decoder plans compiled for this runtime are used instead of the generic decoder
+        :return: decoded value
+        """
+        if self.enable_decoder_plans and self.metadata.portable_registry:
+            return self.get_decoder_plans().decode(type_string, data)
+
+        scale_obj = self.runtime_config.create_scale_object(
+            type_string, data=ScaleBytes(bytearray(data)), metadata=self.metadata
+        )
+        return scale_obj.decode()
+
+
+class WorkerHarvester:
+    """
+    Minimal harvester context for jobs running in a worker process, with its own database session and
+    DatabaseSubstrateInterface but without a connection to the node
+    """
+
+    def __init__(self, settings, verbose_level=1, block_start=None, block_end=None):
+        self.settings = settings
+        self.verbose_level = verbose_level
+        self.block_start = block_start
+        self.block_end = block_end
+
+        self.engine = create_engine(settings.DB_CONNECTION, echo=False, pool_pre_ping=True)
+        session_factory = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+
+        self.session = scoped_session(session_factory)
+
+        self.event_storage_key = settings.STORAGE_KEY_EVENTS
+
+        self.substrate = None
+
+        # Load all settings
+        for item in HarvesterStatus.query(self.session).all():
+            setattr(self.settings, item.key, item.value)
+
+        self.db_substrate = DatabaseSubstrateInterface(
+            db_session=self.session,
+            ss58_format=self.settings.SUBSTRATE_SS58_FORMAT,
+            type_registry_preset=self.settings.TYPE_REGISTRY,
+            runtime_cache_size=self.settings.RUNTIME_CACHE_SIZE,
+            data_cache_size=self.settings.DATA_CACHE_SIZE,
+            enable_decoder_plans=self.settings.ENABLE_DECODER_PLANS
+        )
+        # Disable automatic SS58 encoding
+        self.db_substrate.runtime_config.ss58_format = None
+
+        self.storage_cron_entries = HarvesterStorageCron.query(self.session)
+
+        self.decode_failure_cache = DecodeFailureCache(self.settings.DECODE_FAILURE_THRESHOLD)
+
+    def log(self, message, verbose_level=1):
+        if verbose_level <= self.verbose_level:
+            print(stylize(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), colored.fg("dark_gray")), message)
 
 
 class GracefulInterruptHandler(object):
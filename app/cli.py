@@ -15,6 +15,7 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import json
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -39,7 +40,8 @@ def main():
 @click.option('--job', type=click.Choice(['blocks', 'state', 'decode', 'cron', 'etl', 'event_index', 'all'], case_sensitive=False), default='all', show_default=True)
 @click.option('--block-start', type=int)
 @click.option('--block-end', type=int)
-def run(verbose, prometheus, type_, force_start, job, block_start, block_end):
+@click.option('--decoder-processes', type=int, help='Number of worker processes used by the decoder')
+def run(verbose, prometheus, type_, force_start, job, block_start, block_end, decoder_processes):
     if verbose:
         verbose_level = 3
         import logging
@@ -58,9 +60,62 @@ def run(verbose, prometheus, type_, force_start, job, block_start, block_end):
     if block_end:
         harvester.block_end = block_end
 
+    if decoder_processes:
+        harvester.decoder_processes = decoder_processes
+
     harvester.run(job)
 
 
+@main.command('decode-range', help='Decodes a block range again, e.g. after changing the decode filters')
+@click.argument('block_start', type=int)
+@click.argument('block_end', type=int)
+def decode_range(block_start, block_end):
+    harvester.decode_block_range(block_start, block_end)
+    click.echo(f'Decoded blocks #{block_start}-#{block_end}', color=True)
+
+
+@main.command('decode-deferred', help='Fully decodes extrinsics of which decoding was deferred')
+@click.argument('block_number', type=int, required=False)
+def decode_deferred(block_number):
+    harvester.decode_deferred_extrinsics(block_number)
+
+
+@main.group()
+def decoded():
+    pass
+
+
+@decoded.command('extrinsic', help='Shows a decoded extrinsic, decoding it first when decoding was deferred')
+@click.argument('block_number', type=int)
+@click.argument('extrinsic_idx', type=int)
+def show_decoded_extrinsic(block_number, extrinsic_idx):
+    click.echo(json.dumps(harvester.get_decoded_extrinsic(block_number, extrinsic_idx), indent=2))
+
+
+@decoded.command('storage', help='Shows a decoded storage value, decoding it first when decoding was deferred')
+@click.argument('block_number', type=int)
+@click.argument('storage_key', type=str)
+def show_decoded_storage(block_number, storage_key):
+    click.echo(json.dumps(harvester.get_decoded_storage(block_number, storage_key), indent=2))
+
+
+@main.group()
+def decode_failures():
+    pass
+
+
+@decode_failures.command('list', help='Lists queued decode failures per type and error')
+def list_decode_failures():
+    harvester.list_decode_failures()
+
+
+@decode_failures.command('requeue', help='Retries queued decode failures immediately, e.g. after a type registry fix')
+@click.option('--type', 'type_key', type=str, help="Only failures of given type (e.g. 'storage:System.Events')")
+def requeue_decode_failures(type_key):
+    count = harvester.requeue_decode_failures(type_key)
+    click.echo(f'Requeued {count} decode failures', color=True)
+
+
 @main.group()
 def storage_tasks():
     pass
@@ -127,12 +182,108 @@ def add_storage_cron():
     click.echo(f'Added cron {pallet}.{storage_function} every {block_interval} blocks', color=True)
 
 
+@storage_cron.command('add-event', help='Adds a storage cron record triggered by an event')
+def add_event_storage_cron():
+    event = click.prompt("Event (e.g. Staking.EraPaid)", type=str)
+    pallet = click.prompt("Pallet", type=str)
+    storage_function = click.prompt("Storage function", type=str)
+
+    if '.' not in event:
+        raise click.BadParameter("Event must be formatted as 'Pallet.Event'")
+
+    event_module, event_name = event.split('.', 1)
+
+    harvester.add_storage_cron(
+        None, pallet, storage_function, trigger_event_module=event_module, trigger_event_name=event_name
+    )
+    click.echo(f'Added cron {pallet}.{storage_function} on event {event}', color=True)
+
+
+@storage_cron.command('add-watchlist', help='Adds a storage cron record for a watchlist of storage keys')
+def add_watchlist_storage_cron():
+    block_interval = click.prompt("Block interval (e.g. 10 = every 10th block)", type=int)
+    pallet = click.prompt("Pallet", type=str)
+    storage_function = click.prompt("Storage function", type=str)
+
+    cron = harvester.add_storage_cron(block_interval, pallet, storage_function, capture_mode='watchlist')
+    click.echo(f'Added watchlist cron {cron.id} {pallet}.{storage_function} every {block_interval} blocks', color=True)
+
+
+@storage_cron.command('add-trace', help='Adds a storage cron record that only captures keys written in a block')
+def add_trace_storage_cron():
+    block_interval = click.prompt("Block interval (e.g. 1 = every block)", type=int, default=1)
+    pallet = click.prompt("Pallet", type=str)
+    storage_function = click.prompt("Storage function", type=str)
+
+    cron = harvester.add_storage_cron(block_interval, pallet, storage_function, capture_mode='trace')
+    click.echo(f'Added trace cron {cron.id} {pallet}.{storage_function} every {block_interval} blocks', color=True)
+
+
 @storage_cron.command('rm', help='Removes a storage cron by its ID')
 @click.argument('id', type=int)
 def remove_storage_cron(id):
     harvester.remove_storage_cron(id)
 
 
+@storage_cron.command('track-keys', help='Tracks the key set of a prefix storage cron between full enumerations')
+@click.argument('id', type=int)
+@click.option('--interval', type=int, required=True, help='Blocks between full key enumerations (0 = disable)')
+@click.option('--events', type=str, help="Comma separated events that force an enumeration (e.g. 'System.NewAccount')")
+def track_storage_cron_keys(id, interval, events):
+    key_refresh_events = [event.strip() for event in events.split(',')] if events else None
+    harvester.set_storage_cron_key_refresh(id, interval or None, key_refresh_events)
+
+
+@storage_cron.command('sink', help='Sets where captured entries are stored: database rows or snapshot files')
+@click.argument('id', type=int)
+@click.argument('sink', type=click.Choice(['database', 'file'], case_sensitive=False))
+def set_storage_cron_sink(id, sink):
+    harvester.set_storage_cron_sink(id, sink)
+
+
+@storage_cron.command('keys', help='Lists the storage keys of a watchlist or key tracking storage cron')
+@click.argument('id', type=int)
+def list_storage_cron_keys(id):
+    harvester.list_storage_cron_keys(id)
+
+
+def parse_storage_key_param(value: str):
+    # Params are JSON values (e.g. 12 or '[1, 2]'), other values like SS58 addresses are passed as string
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+@storage_cron.command(
+    'watch', help="Adds a storage key to a watchlist storage cron, params as JSON (e.g. watch 3 <account> '[1, 2]')"
+)
+@click.argument('id', type=int)
+@click.argument('params', nargs=-1, required=True)
+def add_storage_cron_key(id, params):
+    cron_key = harvester.add_storage_cron_key(id, [parse_storage_key_param(param) for param in params])
+    click.echo(f'Added storage key 0x{cron_key.storage_key.hex()} to cron {id}', color=True)
+
+
+@storage_cron.command('unwatch', help='Removes a storage key from a watchlist storage cron')
+@click.argument('id', type=int)
+@click.argument('storage_key', type=str)
+def remove_storage_cron_key(id, storage_key):
+    harvester.remove_storage_cron_key(id, bytes.fromhex(storage_key.replace('0x', '')))
+
+
+@main.group()
+def data_serialization():
+    pass
+
+
+@data_serialization.command('benchmark', help='Compares serialization formats on records of a codec table')
+@click.argument('table', type=str)
+@click.option('--limit', type=int, default=1000, show_default=True, help='Number of records to sample')
+def benchmark_data_serialization(table, limit):
+    harvester.benchmark_data_serialization(table, limit)
+
+
 if __name__ == '__main__':
     harvester = Harvester(
         settings=app_settings,
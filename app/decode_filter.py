@@ -0,0 +1,48 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+
+class DecodeFilter:
+    """
+    Include and exclude filters that determine which calls, events and storage functions are decoded. Entries are
+    either a pallet name, matching all items of that pallet, or "Pallet.Name". When include entries are defined for
+    a kind of item, only matching items are included; excluded items are never included.
+    """
+
+    kinds = ('calls', 'events', 'storage')
+
+    def __init__(self, include: dict = None, exclude: dict = None):
+        self.include = {kind: set((include or {}).get(kind) or []) for kind in self.kinds}
+        self.exclude = {kind: set((exclude or {}).get(kind) or []) for kind in self.kinds}
+        self.cache = {}
+
+    def is_active(self, kind: str) -> bool:
+        return len(self.include[kind]) > 0 or len(self.exclude[kind]) > 0
+
+    def is_included(self, kind: str, pallet: str, name: str) -> bool:
+        if not self.is_active(kind):
+            return True
+
+        key = (kind, pallet, name)
+
+        if key not in self.cache:
+            entries = {pallet, f'{pallet}.{name}'}
+
+            self.cache[key] = (not self.include[kind] or len(entries & self.include[kind]) > 0) and \
+                len(entries & self.exclude[kind]) == 0
+
+        return self.cache[key]
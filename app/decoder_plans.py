@@ -0,0 +1,941 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import json
+from hashlib import blake2b
+
+from scalecodec.base import ScaleBytes, ScaleType
+from scalecodec.exceptions import RemainingScaleBytesNotEmptyException
+from scalecodec.types import Struct, Tuple, Vec, Enum, FixedLengthArray, Compact, CompactU32, Option, Null, Bool, \
+    U8, U16, U32, U64, U128, U256, I8, I16, I32, I64, I128, I256, H160, H256, H512, GenericAccountId, GenericCall, \
+    GenericScaleInfoEvent, GenericEventRecord, GenericExtrinsic
+
+
+class UnsupportedPlanException(Exception):
+    pass
+
+
+def decode_compact(stream: ScaleBytes) -> int:
+    compact_byte = stream.data[stream.offset]
+    byte_mod = compact_byte % 4
+
+    if byte_mod == 0:
+        stream.offset += 1
+        return compact_byte >> 2
+    elif byte_mod == 1:
+        value = int.from_bytes(stream.data[stream.offset:stream.offset + 2], byteorder='little') >> 2
+        stream.offset += 2
+        return value
+    elif byte_mod == 2:
+        value = int.from_bytes(stream.data[stream.offset:stream.offset + 4], byteorder='little') >> 2
+        stream.offset += 4
+        return value
+    else:
+        length = 4 + (compact_byte >> 2)
+        value = int.from_bytes(stream.data[stream.offset + 1:stream.offset + 1 + length], byteorder='little')
+        stream.offset += 1 + length
+        return value
+
+
+def primitive_decoder(length: int, signed: bool = False):
+    def decode(stream):
+        value = int.from_bytes(stream.data[stream.offset:stream.offset + length], byteorder='little', signed=signed)
+        stream.offset += length
+        return value
+    return decode
+
+
+def hex_decoder(length: int):
+    def decode(stream):
+        value = '0x{}'.format(stream.data[stream.offset:stream.offset + length].hex())
+        stream.offset += length
+        return value
+    return decode
+
+
+def decode_bool(stream: ScaleBytes) -> bool:
+    value = stream.data[stream.offset]
+    if value > 1:
+        raise ValueError('Invalid value for datatype "bool"')
+    stream.offset += 1
+    return value == 1
+
+
+def decode_null(stream: ScaleBytes):
+    return None
+
+
+PRIMITIVE_DECODERS = {
+    U8: primitive_decoder(1),
+    U16: primitive_decoder(2),
+    U32: primitive_decoder(4),
+    U64: primitive_decoder(8),
+    U128: primitive_decoder(16),
+    U256: primitive_decoder(32),
+    I8: primitive_decoder(1, signed=True),
+    I16: primitive_decoder(2, signed=True),
+    I32: primitive_decoder(4, signed=True),
+    I64: primitive_decoder(8, signed=True),
+    I128: primitive_decoder(16, signed=True),
+    I256: primitive_decoder(32, signed=True),
+    H160: hex_decoder(20),
+    H256: hex_decoder(32),
+    H512: hex_decoder(64),
+    Bool: decode_bool
+}
+
+
+FIXED_INT_DTYPES = {
+    U8: '<u1', U16: '<u2', U32: '<u4', U64: '<u8', I8: '<i1', I16: '<i2', I32: '<i4', I64: '<i8'
+}
+
+
+def int_column(column) -> list:
+    return column.tolist()
+
+
+def u128_column(column) -> list:
+    return [low | (high << 64) for low, high in column.tolist()]
+
+
+def hex_column(width: int):
+    hex_width = width * 2
+
+    def convert(column) -> list:
+        data = column.tobytes().hex()
+        return ['0x' + data[offset:offset + hex_width] for offset in range(0, len(data), hex_width)]
+    return convert
+
+
+class FixedLayout:
+    """
+    Type with a fixed width, of which many values are decoded at once with a NumPy structured dtype. NumPy is only
+    imported when batch decoding is used.
+    """
+
+    def __init__(self, fields: list, keys: list = None):
+        """
+        :param fields: list of (NumPy dtype, column converter)
+        :param keys: field names of a struct, or None for a single value or tuple
+        """
+        import numpy as np
+
+        self.dtype = np.dtype([(f'f{idx}', dtype) for idx, (dtype, converter) in enumerate(fields)])
+        self.converters = [converter for dtype, converter in fields]
+        self.keys = keys
+        self.width = self.dtype.itemsize
+
+    def decode_many(self, payloads: list) -> list:
+        import numpy as np
+
+        array = np.frombuffer(b''.join(payloads), dtype=self.dtype)
+        columns = [converter(array[f'f{idx}']) for idx, converter in enumerate(self.converters)]
+
+        if self.keys is not None:
+            return [dict(zip(self.keys, row)) for row in zip(*columns)]
+
+        if len(columns) == 1:
+            return columns[0]
+
+        return [tuple(row) for row in zip(*columns)]
+
+
+class DecoderPlans:
+    """
+    Decoder functions compiled from the type definitions of one runtime, as a faster alternative for the generic
+    `create_scale_object(...).decode()` of scalecodec. Every type is resolved once into a specialised function that
+    reads directly from the SCALE-bytes stream; the output is the same as the `value` of the generic decoder.
+
+    Types of which the decoding process is not supported are delegated to the generic decoder. Every result of an
+    entry type is verified against the generic decoder until `verify_count` results are proven identical, and
+    periodically after that; when a difference is found, the plan for that entry type is disabled.
+    """
+
+    verify_count = 1000
+    verify_interval = 1000
+
+    def __init__(self, runtime_config, metadata):
+        self.runtime_config = runtime_config
+        self.metadata = metadata
+        self.decoders = {}
+        self.entries = {}
+        self.decode_count = {}
+        self.call_index_decoder = None
+        self.batch_entries = {}
+        self.batch_count = {}
+
+    def decode(self, type_string: str, data: bytes):
+        """
+        Decodes `data` as `type_string`, using the compiled plan when available
+        :return: decoded value, identical to `value` of the generic decoder
+        """
+        decoder = self.get_entry(type_string)
+
+        if decoder is None:
+            return self.decode_generic(type_string, data)
+
+        self.decode_count[type_string] = self.decode_count.get(type_string, 0) + 1
+
+        try:
+            stream = ScaleBytes(bytearray(data))
+            value = decoder(stream)
+
+            if stream.offset != stream.length:
+                raise RemainingScaleBytesNotEmptyException(
+                    f'Decoding <{type_string}> - Current offset: {stream.offset} / length: {stream.length}'
+                )
+        except Exception:
+            # Generic decoder raises the appropriate exception when data is invalid
+            return self.decode_generic(type_string, data)
+
+        decode_count = self.decode_count[type_string]
+
+        if decode_count <= self.verify_count or decode_count % self.verify_interval == 0:
+            generic_value = self.decode_generic(type_string, data)
+
+            if json.dumps(value, default=str) != json.dumps(generic_value, default=str):
+                self.entries[type_string] = None
+                return generic_value
+
+        return value
+
+    def decode_batch(self, type_string: str, data_list: list, return_exceptions: bool = False) -> list:
+        """
+        Decodes a list of values of the same type. For event records, the attributes of events with a fixed width
+        layout are collected over the whole list and decoded together per event type with NumPy; other types are
+        decoded one by one. Items that cannot be scanned are decoded one by one with `decode()`. Results are verified
+        like `decode()`.
+        :param return_exceptions: return the exception of an item that fails to decode in its place instead of raising
+        :return: list of decoded values
+        """
+        scanner = self.get_batch_entry(type_string)
+
+        if scanner is None:
+            return [self.decode_item(type_string, data, return_exceptions) for data in data_list]
+
+        fixed_payloads = {}
+        values = []
+        scanned_idx = []
+
+        for idx, data in enumerate(data_list):
+            item_payloads = {}
+
+            try:
+                stream = ScaleBytes(bytearray(data))
+                value = scanner(stream, item_payloads)
+
+                if stream.offset != stream.length:
+                    raise RemainingScaleBytesNotEmptyException(
+                        f'Decoding <{type_string}> - Current offset: {stream.offset} / length: {stream.length}'
+                    )
+            except Exception:
+                values.append(self.decode_item(type_string, data, return_exceptions))
+                continue
+
+            for layout, items in item_payloads.items():
+                fixed_payloads.setdefault(layout, []).extend(items)
+
+            values.append(value)
+            scanned_idx.append(idx)
+
+        try:
+            for layout, items in fixed_payloads.items():
+                for (record, payload), attributes in zip(items, layout.decode_many([item[1] for item in items])):
+                    record['event']['attributes'] = record['attributes'] = attributes
+
+        except Exception:
+            for idx in scanned_idx:
+                values[idx] = self.decode_item(type_string, data_list[idx], return_exceptions)
+            return values
+
+        self.batch_count[type_string] = self.batch_count.get(type_string, 0) + 1
+        batch_count = self.batch_count[type_string]
+
+        if batch_count <= self.verify_count or batch_count % self.verify_interval == 0:
+            expected_values = [self.decode_item(type_string, data_list[idx], True) for idx in scanned_idx]
+
+            if json.dumps([values[idx] for idx in scanned_idx], default=str) != \
+                    json.dumps(expected_values, default=str):
+                self.batch_entries[type_string] = None
+
+                for idx, expected_value in zip(scanned_idx, expected_values):
+                    if isinstance(expected_value, Exception) and not return_exceptions:
+                        raise expected_value
+                    values[idx] = expected_value
+
+        return values
+
+    def decode_item(self, type_string: str, data: bytes, return_exceptions: bool = False):
+        try:
+            return self.decode(type_string, data)
+        except Exception as e:
+            if return_exceptions:
+                return e
+            raise
+
+    def get_batch_entry(self, type_string: str):
+        if type_string not in self.batch_entries:
+            try:
+                self.batch_entries[type_string] = self.compile_event_batch(type_string)
+            except Exception:
+                self.batch_entries[type_string] = None
+
+        return self.batch_entries[type_string]
+
+    def decode_call_index(self, data: bytes):
+        """
+        Determines the call index of a signed V4 extrinsic by only decoding the fields that precede the call
+        :param data: extrinsic without length prefix
+        :return: call index as bytes, or None when it cannot be determined
+        """
+        if self.call_index_decoder is None:
+            try:
+                self.call_index_decoder = self.compile_extrinsic_call_index()
+            except Exception:
+                self.call_index_decoder = False
+
+        if not self.call_index_decoder:
+            return None
+
+        try:
+            return self.call_index_decoder(ScaleBytes(bytearray(data)))
+        except Exception:
+            return None
+
+    def decode_generic(self, type_string: str, data: bytes):
+        scale_obj = self.runtime_config.create_scale_object(
+            type_string, data=ScaleBytes(bytearray(data)), metadata=self.metadata
+        )
+        return scale_obj.decode()
+
+    def get_entry(self, type_string: str):
+        if type_string not in self.entries:
+            try:
+                self.entries[type_string] = self.compile(type_string)
+            except Exception:
+                self.entries[type_string] = None
+
+        return self.entries[type_string]
+
+    def compile(self, type_string):
+        """
+        Returns decoder function for given type string (or inline struct definition), of which the result is equal
+        to `value` of the generic decoder
+        """
+        if type(type_string) is str and type_string in self.decoders:
+            return self.decoders[type_string]
+
+        decoder_class = self.runtime_config.get_decoder_class(type_string)
+
+        if decoder_class is None:
+            raise ValueError(f'Decoder class for "{type_string}" not found')
+
+        if type(type_string) is not str:
+            return self.compile_class(decoder_class)
+
+        # Placeholder for recursive types
+        self.decoders[type_string] = lambda stream: self.decoders[type_string](stream)
+
+        try:
+            decoder = self.compile_class(decoder_class)
+        except Exception:
+            # Delegate types that cannot be compiled to the generic decoder
+            decoder = self.compile_generic(decoder_class)
+
+        self.decoders[type_string] = decoder
+
+        return decoder
+
+    def compile_class(self, decoder_class):
+
+        if decoder_class in PRIMITIVE_DECODERS:
+            return PRIMITIVE_DECODERS[decoder_class]
+
+        process = decoder_class.process
+
+        if process is GenericAccountId.process and self.runtime_config.ss58_format is None:
+            return PRIMITIVE_DECODERS[H256]
+
+        for hash_class in (H160, H256, H512):
+            if process is hash_class.process:
+                return PRIMITIVE_DECODERS[hash_class]
+
+        if process in (Compact.process, CompactU32.process):
+            return decode_compact
+
+        if process is Null.process:
+            return decode_null
+
+        if process is Option.process and decoder_class.sub_type:
+            return self.compile_option(decoder_class)
+
+        if process is Struct.process and decoder_class.type_mapping is not None:
+            return self.compile_struct(decoder_class)
+
+        if process is Tuple.process and decoder_class.type_mapping is not None:
+            return self.compile_tuple(decoder_class)
+
+        if process is Vec.process and decoder_class.sub_type and ',' not in decoder_class.sub_type:
+            return self.compile_vec(decoder_class)
+
+        if process is FixedLengthArray.process and decoder_class.sub_type:
+            return self.compile_array(decoder_class)
+
+        if process is Enum.process and decoder_class.type_mapping:
+            return self.compile_enum(decoder_class)
+
+        if process is GenericScaleInfoEvent.process and decoder_class.type_mapping:
+            return self.compile_event(decoder_class)
+
+        if process is GenericEventRecord.process and decoder_class.type_mapping:
+            return self.compile_event_record(decoder_class)
+
+        if process is GenericCall.process and self.metadata.portable_registry:
+            return self.compile_call()
+
+        if process is GenericExtrinsic.process and self.metadata.portable_registry:
+            return self.compile_extrinsic()
+
+        return self.compile_generic(decoder_class)
+
+    def compile_generic(self, decoder_class, serialize=False):
+        """
+        Delegates decoding to the generic decoder, continuing on the same stream
+        """
+        metadata = self.metadata
+
+        def decode(stream):
+            scale_obj = decoder_class(data=stream, metadata=metadata)
+            scale_obj.decode(check_remaining=False)
+            return scale_obj.serialize() if serialize else scale_obj.value
+
+        return decode
+
+    def compile_option(self, decoder_class):
+        sub_decoder = self.compile(decoder_class.sub_type)
+
+        def decode(stream):
+            option_byte = stream.data[stream.offset]
+            stream.offset += 1
+            if option_byte != 0:
+                return sub_decoder(stream)
+            return None
+
+        return decode
+
+    def compile_struct(self, decoder_class):
+        fields = [
+            (key, self.compile(data_type if data_type is not None else 'Null'))
+            for key, data_type in decoder_class.type_mapping
+        ]
+
+        def decode(stream):
+            return {key: field_decoder(stream) for key, field_decoder in fields}
+
+        return decode
+
+    def compile_tuple(self, decoder_class):
+        if len(decoder_class.type_mapping) == 1:
+            return self.compile(decoder_class.type_mapping[0])
+
+        members = [
+            self.compile(member_type if member_type is not None else 'Null')
+            for member_type in decoder_class.type_mapping
+        ]
+
+        def decode(stream):
+            return tuple(member_decoder(stream) for member_decoder in members)
+
+        return decode
+
+    def compile_vec(self, decoder_class):
+        if self.runtime_config.get_decoder_class(decoder_class.sub_type) is U8:
+
+            def decode_bytes(stream):
+                element_count = decode_compact(stream)
+                value = stream.data[stream.offset:stream.offset + element_count]
+                stream.offset += element_count
+                try:
+                    return value.decode()
+                except UnicodeDecodeError:
+                    return '0x{}'.format(value.hex())
+
+            return decode_bytes
+
+        element_decoder = self.compile(decoder_class.sub_type)
+
+        def decode(stream):
+            return [element_decoder(stream) for _ in range(decode_compact(stream))]
+
+        return decode
+
+    def compile_array(self, decoder_class):
+        element_count = decoder_class.element_count
+
+        if not element_count:
+            return lambda stream: []
+
+        if self.runtime_config.get_decoder_class(decoder_class.sub_type) is U8:
+            return hex_decoder(element_count)
+
+        element_decoder = self.compile(decoder_class.sub_type)
+
+        def decode(stream):
+            return [element_decoder(stream) for _ in range(element_count)]
+
+        return decode
+
+    def compile_enum_variants(self, decoder_class) -> list:
+        """
+        :return: list of (variant name, decoder function or None) per index
+        """
+        variants = []
+        for variant_name, variant_type in decoder_class.type_mapping:
+            if variant_type is None or variant_type == 'Null':
+                variants.append((variant_name, None))
+            else:
+                variants.append((variant_name, self.compile(variant_type)))
+        return variants
+
+    def compile_enum(self, decoder_class):
+        variants = self.compile_enum_variants(decoder_class)
+
+        def decode(stream):
+            variant_name, variant_decoder = variants[stream.data[stream.offset]]
+            stream.offset += 1
+
+            if variant_decoder is None:
+                return variant_name
+
+            return {variant_name: variant_decoder(stream)}
+
+        return decode
+
+    def compile_enum_parts(self, type_string):
+        """
+        Decoder of an enum that returns (index, variant name, variant value, has value) instead of the serialized value
+        """
+        decoder_class = self.runtime_config.get_decoder_class(type_string)
+
+        if decoder_class is None or decoder_class.process is not Enum.process or not decoder_class.type_mapping:
+            raise UnsupportedPlanException(f'Type "{type_string}" is not a generic enum')
+
+        variants = self.compile_enum_variants(decoder_class)
+
+        def decode(stream):
+            index = stream.data[stream.offset]
+            variant_name, variant_decoder = variants[index]
+            stream.offset += 1
+
+            if variant_decoder is None:
+                return index, variant_name, None, False
+
+            return index, variant_name, variant_decoder(stream), True
+
+        return decode
+
+    def compile_event(self, decoder_class):
+        """
+        Emulates `GenericScaleInfoEvent`: an enum of pallets containing an enum of pallet events
+        """
+        pallet_events = []
+
+        for pallet_name, pallet_event_type in decoder_class.type_mapping:
+            if pallet_event_type is None or pallet_event_type == 'Null':
+                pallet_events.append((pallet_name, None))
+            else:
+                pallet_events.append((pallet_name, self.compile_enum_parts(pallet_event_type)))
+
+        def decode(stream):
+            pallet_index = stream.data[stream.offset]
+            pallet_name, pallet_event_decoder = pallet_events[pallet_index]
+            stream.offset += 1
+
+            if pallet_event_decoder is None:
+                raise UnsupportedPlanException('Event without attributes')
+
+            event_index, event_name, attributes, has_attributes = pallet_event_decoder(stream)
+
+            return {
+                'event_index': bytes([pallet_index, event_index]).hex(),
+                'module_id': pallet_name,
+                'event_id': event_name,
+                'attributes': attributes if has_attributes else None
+            }
+
+        return decode
+
+    def compile_event_record(self, decoder_class):
+        """
+        Emulates `GenericEventRecord`
+        """
+        type_mapping = dict(decoder_class.type_mapping)
+
+        if list(type_mapping.keys()) != ['phase', 'event', 'topics']:
+            raise UnsupportedPlanException('Unsupported EventRecord layout')
+
+        phase_decoder = self.compile_enum_parts(type_mapping['phase'])
+        event_decoder = self.compile(type_mapping['event'])
+        topics_decoder = self.compile(type_mapping['topics'])
+
+        def decode(stream):
+            phase_index, phase_name, phase_value, _ = phase_decoder(stream)
+            event_pallet_index = stream.data[stream.offset]
+            event = event_decoder(stream)
+            topics = topics_decoder(stream)
+
+            return {
+                'phase': phase_name,
+                'extrinsic_idx': phase_value if phase_name == 'ApplyExtrinsic' else None,
+                'event': event,
+                'event_index': event_pallet_index,
+                'module_id': event['module_id'],
+                'event_id': event['event_id'],
+                'attributes': event['attributes'],
+                'topics': topics
+            }
+
+        return decode
+
+    def compile_fixed_layout(self, type_string):
+        """
+        :return: FixedLayout of given struct, tuple or single type, or None when its width is not fixed
+        """
+        decoder_class = self.runtime_config.get_decoder_class(type_string)
+
+        if decoder_class is None:
+            return None
+
+        if decoder_class.process in (Struct.process, Tuple.process) and decoder_class.type_mapping:
+
+            if decoder_class.process is Struct.process:
+                keys = [key for key, data_type in decoder_class.type_mapping]
+                member_types = [data_type for key, data_type in decoder_class.type_mapping]
+            else:
+                keys = None
+                member_types = list(decoder_class.type_mapping)
+
+            fields = [self.get_fixed_field(member_type) for member_type in member_types]
+
+            if None in fields:
+                return None
+
+            return FixedLayout(fields, keys)
+
+        field = self.get_fixed_field(type_string)
+
+        if field is None:
+            return None
+
+        return FixedLayout([field])
+
+    def get_fixed_field(self, type_string):
+        """
+        :return: tuple of (NumPy dtype, column converter) for primitive types with a fixed width, otherwise None
+        """
+        if type_string is None:
+            return None
+
+        decoder_class = self.runtime_config.get_decoder_class(type_string)
+
+        if decoder_class is None:
+            return None
+
+        if decoder_class in FIXED_INT_DTYPES:
+            return FIXED_INT_DTYPES[decoder_class], int_column
+
+        if decoder_class is U128:
+            return ('<u8', (2,)), u128_column
+
+        if decoder_class.process is GenericAccountId.process and self.runtime_config.ss58_format is None:
+            return ('u1', (32,)), hex_column(32)
+
+        for hash_class, width in ((H160, 20), (H256, 32), (H512, 64)):
+            if decoder_class.process is hash_class.process:
+                return ('u1', (width,)), hex_column(width)
+
+        if decoder_class.process is FixedLengthArray.process and decoder_class.element_count and \
+                self.runtime_config.get_decoder_class(decoder_class.sub_type) is U8:
+            return ('u1', (decoder_class.element_count,)), hex_column(decoder_class.element_count)
+
+        return None
+
+    def compile_event_batch(self, type_string):
+        """
+        Scanner of a `Vec<EventRecord>` that decodes everything except the attributes of events with a fixed width
+        layout; those payloads are collected per layout to be decoded together
+        """
+        vec_class = self.runtime_config.get_decoder_class(type_string)
+
+        if vec_class is None or vec_class.process is not Vec.process or not vec_class.sub_type:
+            raise UnsupportedPlanException(f'Type "{type_string}" is not a Vec')
+
+        record_class = self.runtime_config.get_decoder_class(vec_class.sub_type)
+
+        if record_class is None or record_class.process is not GenericEventRecord.process or \
+                not record_class.type_mapping:
+            raise UnsupportedPlanException(f'Type "{type_string}" is not a Vec of EventRecord')
+
+        type_mapping = dict(record_class.type_mapping)
+
+        if list(type_mapping.keys()) != ['phase', 'event', 'topics']:
+            raise UnsupportedPlanException('Unsupported EventRecord layout')
+
+        phase_decoder = self.compile_enum_parts(type_mapping['phase'])
+        topics_decoder = self.compile(type_mapping['topics'])
+
+        event_class = self.runtime_config.get_decoder_class(type_mapping['event'])
+
+        if event_class is None or event_class.process is not GenericScaleInfoEvent.process:
+            raise UnsupportedPlanException('Event is not a GenericScaleInfoEvent')
+
+        pallet_events = []
+
+        for pallet_name, pallet_event_type in event_class.type_mapping:
+            if pallet_event_type is None or pallet_event_type == 'Null':
+                pallet_events.append((pallet_name, None))
+                continue
+
+            enum_class = self.runtime_config.get_decoder_class(pallet_event_type)
+
+            if enum_class is None or enum_class.process is not Enum.process or not enum_class.type_mapping:
+                raise UnsupportedPlanException(f'Type "{pallet_event_type}" is not a generic enum')
+
+            variants = []
+            for event_index, (variant_name, variant_type) in enumerate(enum_class.type_mapping):
+                event_index_hex = bytes([len(pallet_events), event_index]).hex()
+
+                if variant_type is None or variant_type == 'Null':
+                    variants.append((variant_name, event_index_hex, None, None))
+                else:
+                    variants.append((
+                        variant_name, event_index_hex, self.compile(variant_type),
+                        self.compile_fixed_layout(variant_type)
+                    ))
+
+            pallet_events.append((pallet_name, variants))
+
+        def scan(stream, fixed_payloads: dict):
+            records = []
+            data = memoryview(stream.data)
+
+            for _ in range(decode_compact(stream)):
+                phase_index, phase_name, phase_value, _ = phase_decoder(stream)
+
+                pallet_index = stream.data[stream.offset]
+                pallet_name, variants = pallet_events[pallet_index]
+
+                if variants is None:
+                    raise UnsupportedPlanException('Event without attributes')
+
+                event_name, event_index_hex, variant_decoder, layout = variants[stream.data[stream.offset + 1]]
+                stream.offset += 2
+
+                event = {
+                    'event_index': event_index_hex,
+                    'module_id': pallet_name,
+                    'event_id': event_name,
+                    'attributes': None
+                }
+
+                record = {
+                    'phase': phase_name,
+                    'extrinsic_idx': phase_value if phase_name == 'ApplyExtrinsic' else None,
+                    'event': event,
+                    'event_index': pallet_index,
+                    'module_id': pallet_name,
+                    'event_id': event_name,
+                    'attributes': None,
+                    'topics': None
+                }
+
+                if layout is not None:
+                    if layout not in fixed_payloads:
+                        fixed_payloads[layout] = []
+                    fixed_payloads[layout].append((record, data[stream.offset:stream.offset + layout.width]))
+                    stream.offset += layout.width
+                elif variant_decoder is not None:
+                    event['attributes'] = record['attributes'] = variant_decoder(stream)
+
+                if stream.data[stream.offset] == 0:
+                    # No topics
+                    record['topics'] = []
+                    stream.offset += 1
+                else:
+                    record['topics'] = topics_decoder(stream)
+
+                records.append(record)
+
+            return records
+
+        return scan
+
+    def compile_call(self):
+        """
+        Emulates `GenericCall` for runtimes with a PortableRegistry
+        """
+        if 'GenericCall' in self.decoders:
+            return self.decoders['GenericCall']
+
+        self.decoders['GenericCall'] = lambda stream: self.decoders['GenericCall'](stream)
+
+        pallets = {}
+
+        for pallet in self.metadata.pallets:
+            if not pallet['calls'].value_object:
+                continue
+
+            call_type_string = pallet['calls'].value_object.get_type_string()
+            call_decoder_class = self.runtime_config.get_decoder_class(call_type_string)
+
+            if call_decoder_class is None or call_decoder_class.process is not Enum.process:
+                raise UnsupportedPlanException(f'Call type "{call_type_string}" is not a generic enum')
+
+            call_variants = call_decoder_class.scale_info_type['def'][1]
+
+            call_functions = {}
+            for call_index, (call_name, call_type) in enumerate(call_decoder_class.type_mapping):
+                call_function = call_variants.get_variant_by_index(call_index)
+
+                if call_function is None:
+                    continue
+
+                if call_type is not None and call_type != 'Null' and type(call_type) is not dict:
+                    # Call arguments without names are not supported
+                    continue
+
+                try:
+                    call_args = [
+                        (call_arg.value['name'], Struct.convert_type(call_arg.value['typeName']))
+                        for call_arg in call_function['fields']
+                    ]
+                except TypeError:
+                    # Arguments without type name are not supported
+                    continue
+
+                call_functions[call_index] = (
+                    call_function.name, call_args, self.compile('Null' if call_type is None else call_type)
+                )
+
+            pallets[pallet.value['index']] = (pallet.name, call_functions)
+
+        def decode(stream):
+            start_offset = stream.offset
+
+            pallet_index = stream.data[stream.offset]
+            call_module_name, call_functions = pallets[pallet_index]
+
+            call_index = stream.data[stream.offset + 1]
+            stream.offset += 2
+
+            call_function_name, call_args, call_args_decoder = call_functions[call_index]
+
+            call_args_value = call_args_decoder(stream)
+
+            # Hash of all bytes from start of the call, same as the generic decoder
+            call_hash = blake2b(stream.data[start_offset:], digest_size=32).digest()
+
+            return {
+                'call_index': '0x{:02x}{:02x}'.format(pallet_index, call_index),
+                'call_function': call_function_name,
+                'call_module': call_module_name,
+                'call_args': [
+                    {'name': name, 'type': arg_type, 'value': call_args_value[name]} for name, arg_type in call_args
+                ],
+                'call_hash': f'0x{call_hash.hex()}'
+            }
+
+        self.decoders['GenericCall'] = decode
+
+        return decode
+
+    def compile_extrinsic(self):
+        """
+        Emulates `GenericExtrinsic` for V4 extrinsics
+        """
+        signed_type_mapping = self.runtime_config.create_scale_object(
+            'ExtrinsicV4', metadata=self.metadata
+        ).type_mapping
+        unsigned_type_mapping = self.runtime_config.create_scale_object(
+            'Inherent', metadata=self.metadata
+        ).type_mapping
+
+        signed_fields = [(key, self.compile_serialized(data_type)) for key, data_type in signed_type_mapping]
+        unsigned_fields = [(key, self.compile_serialized(data_type)) for key, data_type in unsigned_type_mapping]
+
+        def decode(stream):
+            extrinsic_length = decode_compact(stream)
+
+            version = stream.data[stream.offset]
+            stream.offset += 1
+
+            if version & 128 == 128:
+                if version & 127 != 4:
+                    raise UnsupportedPlanException(f"Unsupported Extrinsic version '{version & 127}'")
+                fields = signed_fields
+            else:
+                fields = unsigned_fields
+
+            value = {'extrinsic_length': extrinsic_length}
+
+            for key, field_decoder in fields:
+                value[key] = field_decoder(stream)
+
+            return {'extrinsic_hash': f'0x{blake2b(stream.data, digest_size=32).digest().hex()}', **value}
+
+        return decode
+
+    def compile_extrinsic_call_index(self):
+        """
+        Decoder function that skips the signature fields of a signed V4 extrinsic and returns the call index
+        """
+        signed_type_mapping = self.runtime_config.create_scale_object(
+            'ExtrinsicV4', metadata=self.metadata
+        ).type_mapping
+
+        if signed_type_mapping[-1][0] != 'call':
+            raise UnsupportedPlanException('Call is not the last field of ExtrinsicV4')
+
+        signature_fields = [self.compile_serialized(data_type) for key, data_type in signed_type_mapping[:-1]]
+
+        def decode(stream):
+            version = stream.data[stream.offset]
+            stream.offset += 1
+
+            if version != 132:
+                raise UnsupportedPlanException(f"Unsupported Extrinsic version '{version}'")
+
+            for field_decoder in signature_fields:
+                field_decoder(stream)
+
+            return bytes(stream.data[stream.offset:stream.offset + 2])
+
+        return decode
+
+    def compile_serialized(self, type_string):
+        """
+        Decoder function of which the result equals `serialize()` of the generic decoder
+        """
+        decoder_class = self.runtime_config.get_decoder_class(type_string)
+
+        if decoder_class is None:
+            raise ValueError(f'Decoder class for "{type_string}" not found')
+
+        if decoder_class.serialize is not ScaleType.serialize and decoder_class.process is not GenericAccountId.process:
+            return self.compile_generic(decoder_class, serialize=True)
+
+        return self.compile(type_string)
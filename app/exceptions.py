@@ -15,6 +15,8 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+from substrateinterface.exceptions import SubstrateRequestException
+
 
 class ShutdownException(BaseException):
     pass
@@ -22,3 +24,11 @@ class ShutdownException(BaseException):
 
 class BlockDecodeException(BaseException):
     pass
+
+
+class UndecodableTypeException(Exception):
+    pass
+
+
+class BlockRuntimeNotFound(SubstrateRequestException):
+    pass
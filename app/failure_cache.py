@@ -0,0 +1,56 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+
+class DecodeFailureCache:
+    """
+    Negative cache of types that repeatedly failed to decode per runtime, so known failing items
+    are skipped instead of being decoded again. The cache is kept in memory only, so after a fix of the type registry
+    (e.g. an upgraded scalecodec preset) the restart of the harvester clears it.
+    """
+
+    def __init__(self, threshold: int = 3):
+        self.threshold = threshold
+        self.failures = {}
+        self.failure_stats = {}
+
+    def has_failures(self) -> bool:
+        return len(self.failures) > 0
+
+    def is_undecodable(self, spec_version: int, type_key: str) -> bool:
+        if type_key is None or self.threshold <= 0 or self.failures.get((spec_version, type_key), 0) < self.threshold:
+            return False
+
+        self.failure_stats.setdefault(type_key, [0, 0])[1] += 1
+        return True
+
+    def add_failure(self, spec_version: int, type_key: str):
+        self.failure_stats.setdefault(type_key or 'unknown', [0, 0])[0] += 1
+
+        if type_key is not None:
+            self.failures[(spec_version, type_key)] = self.failures.get((spec_version, type_key), 0) + 1
+
+    def add_success(self, spec_version: int, type_key: str):
+        self.failures.pop((spec_version, type_key), None)
+
+    def pop_failure_stats(self) -> dict:
+        """
+        :return: dict of type key to [failed count, skipped count] since the previous call
+        """
+        failure_stats = self.failure_stats
+        self.failure_stats = {}
+        return failure_stats
@@ -16,28 +16,34 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
 import argparse
+import time
 
 from tabulate import tabulate
 
 from app import settings as app_settings, __version__, jobs
 
-from datetime import datetime
+from datetime import datetime, timezone
 import colored
 from colored import stylize
 
 from app.base import DatabaseSubstrateInterface, Job
+from app.failure_cache import DecodeFailureCache
 from time import sleep
 from websocket import WebSocketConnectionClosedException, WebSocketBadStatusException
-from prometheus_client import start_http_server, Counter, Enum, Histogram
+from prometheus_client import start_http_server, Counter, Enum, Histogram, Gauge
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, inspect
 from sqlalchemy.orm import sessionmaker, scoped_session
+from scalecodec.base import ScaleBytes
 from substrateinterface import SubstrateInterface
 from substrateinterface.exceptions import SubstrateRequestException
 
 from app.exceptions import ShutdownException, BlockDecodeException
 
-from app.models.node import HarvesterStatus, HarvesterStorageCron, HarvesterStorageTask
+from app.models.codec import CodecBlockExtrinsic, CodecBlockEvent, CodecBlockHeaderDigestLog, CodecBlockStorage, \
+    CodecMetadata, CodecDecodeFailure, CodecDecodeCache
+from app.models.node import HarvesterStatus, HarvesterStorageCron, HarvesterStorageTask, HarvesterStorageCronKey
+from app.serialization import SERIALIZATION_FORMATS, dumps_data, loads_data, is_binary_format
 
 
 
@@ -53,6 +59,7 @@ class Harvester:
         self.prometheus_endpoint = prometheus_endpoint
         self.block_start = self.settings.BLOCK_START
         self.block_end = self.settings.BLOCK_END
+        self.decoder_processes = self.settings.DECODER_PROCESSES
         self.storage_cron_entries = []
 
         if not hasattr(self.settings, 'DB_CONNECTION') or self.settings.DB_CONNECTION is None:
@@ -86,7 +93,10 @@ class Harvester:
             ss58_format=self.settings.SUBSTRATE_SS58_FORMAT,
             type_registry_preset=self.settings.TYPE_REGISTRY,
             type_registry=self.settings.CUSTOM_TYPE_REGISTRY,
-            auto_discover=False
+            auto_discover=False,
+            runtime_cache_size=self.settings.RUNTIME_CACHE_SIZE,
+            data_cache_size=self.settings.DATA_CACHE_SIZE,
+            enable_decoder_plans=self.settings.ENABLE_DECODER_PLANS
         )
         # Disable automatic SS58 encoding
         self.db_substrate.runtime_config.ss58_format = None
@@ -94,23 +104,53 @@ class Harvester:
         self.jobs = {}
 
         self.prom_block_process_speed = Histogram('block_process_speed', 'Block process speed')
+        self.prom_state_capture_missed = Counter(
+            'state_capture_missed', 'Blocks of which the state was pruned by the node before it was captured'
+        )
+        self.prom_state_capture_margin = Gauge(
+            'state_capture_margin', 'Blocks left before the state of the next block to capture is pruned'
+        )
+        self.prom_decode_memo_hits = Counter(
+            'decode_memo_hits', 'Storage items of which the decoded value was reused from the decode memo'
+        )
+        self.prom_decode_memo_misses = Counter(
+            'decode_memo_misses', 'Storage items that were not found in the decode memo'
+        )
+        self.prom_decode_failures = Counter(
+            'decode_failures', 'Items that failed to decode', ['type']
+        )
+        self.prom_decode_failures_skipped = Counter(
+            'decode_failures_skipped', 'Items skipped because their type is known to fail to decode', ['type']
+        )
+        self.prom_data_cache_hits = Counter(
+            'data_cache_hits', 'Header, runtime and metadata lookups served from the data source cache', ['cache']
+        )
+        self.prom_data_cache_misses = Counter(
+            'data_cache_misses', 'Header, runtime and metadata lookups that queried the database', ['cache']
+        )
+
+        self.decode_failure_cache = DecodeFailureCache(self.settings.DECODE_FAILURE_THRESHOLD)
 
         self.force_start = force_start
 
     def init(self):
 
+        self.check_data_serialization()
+
         # Add jobs
         self.add_job('cron', jobs.Cron)
         self.add_job('retrieve_blocks', jobs.RetrieveBlocks)
         self.add_job('retrieve_runtime_state', jobs.RetrieveRuntimeState)
+        self.add_job('retrieve_recent_state', jobs.RetrieveRecentState)
         self.add_job('scale_decode', jobs.ScaleDecode)
+        self.add_job('deferred_decode', jobs.DeferredDecode)
         self.add_job('event_index', jobs.EventIndex)
         self.add_job('etl_process', jobs.EtlProcess)
         self.add_job('storage_tasks', jobs.StorageTask)
 
         self.prom_current_job = Enum('current_job', 'Current Job', states=[
-            'cron', 'retrieve_blocks', 'retrieve_runtime_state', 'scale_decode',
-            'event_index', 'etl_process', 'storage_tasks', '-'
+            'cron', 'retrieve_blocks', 'retrieve_runtime_state', 'retrieve_recent_state', 'scale_decode',
+            'deferred_decode', 'event_index', 'etl_process', 'storage_tasks', '-'
         ])
 
         # Check if status records are present
@@ -266,7 +306,10 @@ class Harvester:
         self.db_substrate = DatabaseSubstrateInterface(
             db_session=self.session,
             ss58_format=self.settings.SUBSTRATE_SS58_FORMAT,
-            type_registry_preset=self.settings.TYPE_REGISTRY
+            type_registry_preset=self.settings.TYPE_REGISTRY,
+            runtime_cache_size=self.settings.RUNTIME_CACHE_SIZE,
+            data_cache_size=self.settings.DATA_CACHE_SIZE,
+            enable_decoder_plans=self.settings.ENABLE_DECODER_PLANS
         )
 
         self.storage_cron_entries = HarvesterStorageCron.query(self.session)
@@ -278,7 +321,7 @@ class Harvester:
     def rpc_call(self, method, params, result_handler=None):
         response = self.substrate.rpc_request(method, params, result_handler=result_handler)
         if 'error' in response:
-            raise ValueError(response['error']['data'])
+            raise ValueError(response['error'].get('data') or response['error'].get('message'))
         return response
 
     def add_job(self, name: str, job):
@@ -293,6 +336,7 @@ class Harvester:
             self.log(stylize(f'🟢 Job "{name}" started'.ljust(60), colored.bg(235) + colored.fg(246)))
             self.prom_current_job.state(name)
             self.jobs[name].start()
+            self.jobs[name].report_data_cache_stats(self.db_substrate.pop_data_cache_stats())
             self.prom_current_job.state('-')
 
     def run(self, action):
@@ -332,7 +376,15 @@ class Harvester:
                         else:
                             self.log("⏸  Job 'retrieve_runtime_state' paused", 1)
 
-                    if action in ['decode', 'all'] and self.type == 'archive':
+                    elif action in ['state', 'all']:
+
+                        if getattr(self.settings, 'ENABLE_HARVESTER', 0) and \
+                                getattr(self.settings, 'ENABLE_HARVESTER_STATE', 0):
+                            self.process_job('retrieve_recent_state')
+                        else:
+                            self.log("⏸  Job 'retrieve_recent_state' paused", 1)
+
+                    if action in ['decode', 'all']:
 
                         if getattr(self.settings, 'ENABLE_HARVESTER', 0) and \
                                 getattr(self.settings, 'ENABLE_HARVESTER_DECODER', 0):
@@ -356,6 +408,14 @@ class Harvester:
                         else:
                             self.log("⏸  Job 'etl_process' paused", 1)
 
+                    if action in ['decode', 'all']:
+
+                        if getattr(self.settings, 'ENABLE_HARVESTER', 0) and \
+                                getattr(self.settings, 'ENABLE_HARVESTER_DECODER', 0):
+                            self.process_job('deferred_decode')
+                        else:
+                            self.log("⏸  Job 'deferred_decode' paused", 1)
+
                 except BlockDecodeException as e:
                     self.log("⛔ An error occurred: '{}' Restarting ...".format(e))
 
@@ -378,6 +438,34 @@ class Harvester:
         except (ShutdownException, KeyboardInterrupt):
             self.log(stylize("🛑 Shutdown finished".ljust(60), colored.bg(235) + colored.fg(246)))
 
+    def list_decode_failures(self):
+
+        rows = self.session.query(
+            CodecDecodeFailure.item_type, CodecDecodeFailure.type_key, CodecDecodeFailure.error_class,
+            func.count(), func.max(CodecDecodeFailure.attempts), func.min(CodecDecodeFailure.next_attempt)
+        ).group_by(
+            CodecDecodeFailure.item_type, CodecDecodeFailure.type_key, CodecDecodeFailure.error_class
+        ).all()
+
+        print(tabulate(rows, headers=['Item type', 'Type', 'Error', 'Items', 'Max attempts', 'Next attempt']))
+
+    def requeue_decode_failures(self, type_key: str = None) -> int:
+        """
+        Schedules queued decode failures for an immediate retry with a new attempt budget, e.g. after a type
+        registry fix
+        """
+        decode_failures = CodecDecodeFailure.query(self.session)
+
+        if type_key:
+            decode_failures = decode_failures.filter_by(type_key=type_key)
+
+        count = decode_failures.update(
+            {'attempts': 1, 'next_attempt': datetime.now(timezone.utc)}, synchronize_session=False
+        )
+        self.session.commit()
+
+        return count
+
     def list_storage_tasks(self):
 
         rows = [
@@ -410,25 +498,247 @@ class Harvester:
     def list_storage_cron(self):
 
         rows = [
-            [item.id, item.block_number_interval, item.storage_module, item.storage_name]
+            [
+                item.id, item.block_number_interval, item.storage_module, item.storage_name,
+                f'{item.trigger_event_module}.{item.trigger_event_name}' if item.trigger_event_module else None,
+                item.capture_mode, item.key_refresh_interval, item.sink
+            ]
             for item in HarvesterStorageCron.query(self.session).all()
         ]
-        print(tabulate(rows, headers=['Id', 'Block interval', 'Pallet', 'Storage name']))
+        print(tabulate(rows, headers=[
+            'Id', 'Block interval', 'Pallet', 'Storage name', 'Trigger event', 'Mode', 'Key refresh interval', 'Sink'
+        ]))
 
-    def add_storage_cron(self, block_interval: int, pallet: str, storage_function: str):
+    def add_storage_cron(self, block_interval: int, pallet: str, storage_function: str,
+                         trigger_event_module: str = None, trigger_event_name: str = None, capture_mode: str = None):
         cron = HarvesterStorageCron(
             block_number_interval=block_interval,
             storage_module=pallet,
-            storage_name=storage_function
+            storage_name=storage_function,
+            trigger_event_module=trigger_event_module,
+            trigger_event_name=trigger_event_name,
+            capture_mode=capture_mode
         )
         cron.save(self.session)
         self.session.commit()
+        return cron
 
     def remove_storage_cron(self, cron_id):
         cron = HarvesterStorageCron.query(self.session).get(cron_id)
+        HarvesterStorageCronKey.query(self.session).filter_by(cron_id=cron_id).delete()
         self.session.delete(cron)
         self.session.commit()
 
+    def set_storage_cron_key_refresh(self, cron_id, key_refresh_interval: int, key_refresh_events: list = None):
+        cron = HarvesterStorageCron.query(self.session).get(cron_id)
+
+        if not cron:
+            raise ValueError(f"Storage cron {cron_id} not found")
+
+        if cron.capture_mode is not None or cron.storage_key_prefix is None and cron.storage_key is not None:
+            raise ValueError(f"Storage cron {cron_id} is not a prefix storage cron")
+
+        cron.key_refresh_interval = key_refresh_interval
+        cron.key_refresh_events = key_refresh_events or None
+        cron.key_refresh_block_number = None
+
+        if not key_refresh_interval:
+            HarvesterStorageCronKey.query(self.session).filter_by(cron_id=cron_id, kind='tracked').delete()
+
+        cron.save(self.session)
+        self.session.commit()
+
+    def set_storage_cron_sink(self, cron_id, sink: str):
+        cron = HarvesterStorageCron.query(self.session).get(cron_id)
+
+        if not cron:
+            raise ValueError(f"Storage cron {cron_id} not found")
+
+        cron.sink = None if sink == 'database' else sink
+        cron.save(self.session)
+        self.session.commit()
+
+    def list_storage_cron_keys(self, cron_id):
+
+        rows = [
+            [f'0x{item.storage_key.hex()}', item.kind, item.params]
+            for item in HarvesterStorageCronKey.query(self.session).filter_by(cron_id=cron_id)
+        ]
+        print(tabulate(rows, headers=['Storage key', 'Kind', 'Params']))
+
+    def add_storage_cron_key(self, cron_id, params: list):
+        cron = HarvesterStorageCron.query(self.session).get(cron_id)
+
+        if not cron:
+            raise ValueError(f"Storage cron {cron_id} not found")
+
+        if cron.capture_mode != 'watchlist':
+            raise ValueError(f"Storage cron {cron_id} is not a watchlist")
+
+        storage_function = self.substrate.get_metadata_storage_function(cron.storage_module, cron.storage_name)
+
+        if not storage_function:
+            raise ValueError(f"Storage function {cron.storage_module}.{cron.storage_name} not found")
+
+        param_types = storage_function.get_params_type_string()
+
+        if len(params) != len(param_types):
+            raise ValueError(
+                f"{cron.storage_module}.{cron.storage_name} expects {len(param_types)} params "
+                f"({', '.join(param_types)}), got {len(params)}"
+            )
+
+        try:
+            storage_key = self.substrate.create_storage_key(cron.storage_module, cron.storage_name, params)
+        except Exception as e:
+            raise ValueError(f"Params do not match key types ({', '.join(param_types)}): {e}")
+
+        # Store the params as decoded from their encoding, so listed params are the values actually keyed
+        params = [
+            self.substrate.decode_scale(param_type, ScaleBytes(param.data))
+            for param_type, param in zip(param_types, storage_key.params_encoded)
+        ]
+
+        cron_key = HarvesterStorageCronKey(
+            cron_id=cron.id,
+            storage_key=bytes(storage_key.data),
+            kind='watchlist',
+            params=params
+        )
+        cron_key.save(self.session)
+        self.session.commit()
+        return cron_key
+
+    def remove_storage_cron_key(self, cron_id, storage_key: bytes):
+        HarvesterStorageCronKey.query(self.session).filter_by(
+            cron_id=cron_id, storage_key=storage_key, kind='watchlist'
+        ).delete()
+        self.session.commit()
+
+    def decode_block_range(self, block_from: int, block_to: int):
+        """
+        Decodes given block range again with the current decode filters, e.g. to decode items that were skipped
+        """
+        jobs.ScaleDecode(harvester=self).decode_block_range(block_from, block_to)
+
+    def decode_deferred_extrinsics(self, block_number: int = None):
+        """
+        Fully decodes deferred extrinsics on demand, optionally only of given block
+        """
+        job = jobs.ScaleDecode(harvester=self)
+
+        for codec_extrinsic in job.get_deferred_extrinsics(block_number):
+            job.decode_deferred_extrinsic(codec_extrinsic)
+            self.session.commit()
+
+    def get_decoded_extrinsic(self, block_number: int, extrinsic_idx: int) -> dict:
+        """
+        Reads the decoded value of an extrinsic, which is decoded first when decoding was deferred
+        """
+        codec_extrinsic = CodecBlockExtrinsic.query(self.session).filter_by(
+            block_number=block_number, extrinsic_idx=extrinsic_idx
+        ).first()
+
+        if not codec_extrinsic:
+            raise ValueError(f'Extrinsic {block_number}-{extrinsic_idx} not found')
+
+        value = jobs.ScaleDecode(harvester=self).get_extrinsic_value(codec_extrinsic)
+        self.session.commit()
+
+        return value
+
+    def get_decoded_storage(self, block_number: int, storage_key: str):
+        """
+        Reads the decoded value of a storage item, which is decoded first when decoding was deferred
+        """
+        codec_storage = CodecBlockStorage.query(self.session).filter_by(
+            block_number=block_number, storage_key=bytes.fromhex(storage_key.replace('0x', ''))
+        ).first()
+
+        if not codec_storage:
+            raise ValueError(f'Storage key {storage_key} not found for #{block_number}')
+
+        value = jobs.ScaleDecode(harvester=self).get_storage_value(codec_storage)
+        self.session.commit()
+
+        return value
+
+    def get_codec_model(self, table_name: str):
+        for model in [CodecBlockExtrinsic, CodecBlockEvent, CodecBlockHeaderDigestLog, CodecBlockStorage, CodecMetadata,
+                      CodecDecodeCache]:
+            if model.__tablename__ == table_name:
+                return model
+
+        raise ValueError(f'Table "{table_name}" has no serialized data column')
+
+    def check_data_serialization(self):
+        """
+        Verifies that the data column of each table in `CODEC_DATA_SERIALIZATION` can store the configured format. The
+        migrations create JSON columns, binary formats require the column to be changed to LONGBLOB first.
+        """
+        inspector = inspect(self.engine)
+
+        for table_name, serialization_format in self.settings.CODEC_DATA_SERIALIZATION.items():
+
+            self.get_codec_model(table_name)
+
+            if serialization_format not in SERIALIZATION_FORMATS:
+                raise ValueError(f'Unknown serialization format "{serialization_format}" for table "{table_name}"')
+
+            if not is_binary_format(serialization_format):
+                continue
+
+            column_type = next(
+                column['type'] for column in inspector.get_columns(table_name) if column['name'] == 'data'
+            )
+
+            try:
+                is_binary_column = column_type.python_type is bytes
+            except NotImplementedError:
+                is_binary_column = False
+
+            if not is_binary_column:
+                raise ValueError(
+                    f'Serialization format "{serialization_format}" requires a LONGBLOB data column in table '
+                    f'"{table_name}", found {column_type}'
+                )
+
+    def benchmark_data_serialization(self, table_name: str, limit: int = 1000):
+        """
+        Compares size and speed of the serialization formats on the most recent records of given codec table
+        """
+        model = self.get_codec_model(table_name)
+
+        values = [
+            item.data for item in model.query(self.session).filter(model.data.isnot(None)).order_by(
+                *[column.desc() for column in model.__table__.primary_key.columns]
+            ).limit(limit)
+        ]
+
+        rows = []
+        json_size = None
+
+        for serialization_format in SERIALIZATION_FORMATS:
+            start = time.perf_counter()
+            serialized = [dumps_data(value, serialization_format) for value in values]
+            serialize_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for data in serialized:
+                loads_data(data)
+            deserialize_time = time.perf_counter() - start
+
+            size = sum(len(data.encode() if type(data) is str else data) for data in serialized)
+            json_size = json_size or size
+
+            rows.append([
+                serialization_format, size, f'{size / (json_size or 1):.1%}',
+                f'{serialize_time * 1000:.1f}', f'{deserialize_time * 1000:.1f}'
+            ])
+
+        print(f'{len(values)} records of {table_name}')
+        print(tabulate(rows, headers=['Format', 'Size (bytes)', 'Size vs json', 'Serialize (ms)', 'Deserialize (ms)']))
+
 
 if __name__ == '__main__':
 
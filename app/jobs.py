@@ -16,21 +16,30 @@
 #  You should have received a copy of the GNU General Public License
 #  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
 import json
+import multiprocessing
+import signal
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
 from hashlib import blake2b
+from itertools import groupby, islice
 
 from sqlalchemy.exc import IntegrityError
 
 from scalecodec.base import ScaleType
-from sqlalchemy import func
+from sqlalchemy import func, select, and_, exists
 
 from app import settings
-from app.base import Job, GracefulInterruptHandler
-from app.exceptions import ShutdownException
+from app.base import Job, GracefulInterruptHandler, WorkerHarvester
+from app.decode_filter import DecodeFilter
+from app.snapshot import get_snapshot_path, write_storage_snapshot, read_storage_snapshot
+from app.exceptions import ShutdownException, BlockDecodeException, UndecodableTypeException, BlockRuntimeNotFound
 from app.models.codec import CodecBlockExtrinsic, CodecBlockHeaderDigestLog, CodecBlockStorage, CodecBlockEvent, \
     CodecMetadata, Runtime, RuntimePallet, RuntimeCall, RuntimeCallArgument, RuntimeEvent, RuntimeEventAttribute, \
-    RuntimeStorage, RuntimeConstant, RuntimeErrorMessage, CodecEventIndexAccount
+    RuntimeStorage, RuntimeConstant, RuntimeErrorMessage, CodecEventIndexAccount, CodecDecodeFailure, CodecDecodeCache, \
+    CodecDeferredDecode
 from app.models.node import NodeBlockExtrinsic, NodeBlockStorage, HarvesterStatus, NodeBlockHeader, \
-    NodeBlockHeaderDigestLog, NodeBlockRuntime, NodeRuntime, NodeMetadata, HarvesterStorageTask
+    NodeBlockHeaderDigestLog, NodeBlockRuntime, NodeRuntime, NodeMetadata, HarvesterStorageTask, \
+    HarvesterStorageCron, HarvesterStorageCronKey, NodeBlockStorageSnapshot
 from scalecodec.base import ScaleDecoder, ScaleBytes
 from scalecodec.exceptions import RemainingScaleBytesNotEmptyException
 from substrateinterface.utils.hasher import xxh128
@@ -40,163 +49,237 @@ class Cron(Job):
 
     icon = '⌛'
 
+    retry_batch_size = 1000
+
+    def __init__(self, **kwargs):
+        self.decode_filter = DecodeFilter(settings.DECODE_INCLUDE, settings.DECODE_EXCLUDE)
+        super().__init__(**kwargs)
+
+    def check_decode_failure_cache(self, spec_version: int, failure_key: str):
+        if self.harvester.decode_failure_cache.is_undecodable(spec_version, failure_key):
+            raise UndecodableTypeException(f'Skipped known undecodable type "{failure_key}"')
+
     def decode_storage_item(self, node_storage, codec_block_storage):
+        spec_version = self.db_substrate.runtime_version
+        failure_key = f'storage:{node_storage.storage_module}.{node_storage.storage_name}'
 
-        decoded_storage_entry = self.db_substrate.query(
-            module=node_storage.storage_module,
-            storage_function=node_storage.storage_name,
-            raw_storage_key=node_storage.storage_key,
-            block_hash=f'0x{node_storage.block_hash.hex()}'
-        )
-        if decoded_storage_entry:
-            codec_block_storage.data = decoded_storage_entry.value
-            codec_block_storage.scale_type = decoded_storage_entry.type_string or \
-                decoded_storage_entry.__class__.__name__
+        self.check_decode_failure_cache(spec_version, failure_key)
 
-            if codec_block_storage.storage_key == self.harvester.event_storage_key:
+        try:
+            codec_block_storage.scale_type, codec_block_storage.data = self.db_substrate.decode_storage_value(
+                node_storage.storage_module, node_storage.storage_name, node_storage.data
+            )
+        except Exception:
+            self.harvester.decode_failure_cache.add_failure(spec_version, failure_key)
+            raise
 
-                for event_idx, event_data in enumerate(codec_block_storage.data):
+        self.harvester.decode_failure_cache.add_success(spec_version, failure_key)
 
-                    event_data['event_index'] = f"0x{event_data['event_index']}"
+        if codec_block_storage.data and codec_block_storage.storage_key == self.harvester.event_storage_key:
 
-                    codec_event = CodecBlockEvent(
-                        block_hash=codec_block_storage.block_hash,
-                        block_number=codec_block_storage.block_number,
-                        event_idx=event_idx,
-                        scale_type='EventRecord<Event, Hash>',
-                        event_module=event_data['module_id'],
-                        event_name=event_data['event_id'],
-                        extrinsic_idx=event_data['extrinsic_idx'],
-                        data=event_data,
-                        complete=True
-                    )
+            for event_idx, event_data in enumerate(codec_block_storage.data):
 
-                    codec_event.save(self.session)
+                event_data['event_index'] = f"0x{event_data['event_index']}"
 
-                self.log(f'Decoded events for #{node_storage.block_number}')
+                if not self.decode_filter.is_included('events', event_data['module_id'], event_data['event_id']):
+                    continue
+
+                codec_event = CodecBlockEvent(
+                    block_hash=codec_block_storage.block_hash,
+                    block_number=codec_block_storage.block_number,
+                    event_idx=event_idx,
+                    scale_type='EventRecord<Event, Hash>',
+                    event_module=event_data['module_id'],
+                    event_name=event_data['event_id'],
+                    extrinsic_idx=event_data['extrinsic_idx'],
+                    data=event_data,
+                    complete=True
+                )
+
+                self.session.add(codec_event)
+
+            self.process_storage_cron_events(node_storage.block_number, codec_block_storage.data)
+
+            self.log(f'Decoded events for #{node_storage.block_number}')
 
         codec_block_storage.complete = True
         codec_block_storage.retry = False
 
-        codec_block_storage.save(self.session)
-        self.session.commit()
-
     def decode_extrinsic(self, extrinsic, node_block_extrinsic):
-        self.db_substrate.init_runtime(block_hash=f'0x{extrinsic.block_hash.hex()}')
+        failure_key = self.get_extrinsic_failure_key(node_block_extrinsic)
 
-        block_extrinsic = self.db_substrate.runtime_config.create_scale_object(
-            "Extrinsic",
-            data=ScaleBytes(node_block_extrinsic.length + node_block_extrinsic.data),
-            metadata=self.db_substrate.metadata
-        )
-        block_extrinsic.decode()
+        self.check_decode_failure_cache(self.db_substrate.runtime_version, failure_key)
+
+        try:
+            extrinsic_value = self.db_substrate.decode_scale(
+                "Extrinsic", node_block_extrinsic.length + node_block_extrinsic.data
+            )
+        except Exception:
+            self.harvester.decode_failure_cache.add_failure(self.db_substrate.runtime_version, failure_key)
+            raise
 
-        extrinsic.data = block_extrinsic.value
-        extrinsic.call_module = block_extrinsic.value['call']['call_module']
-        extrinsic.call_name = block_extrinsic.value['call']['call_function']
-        extrinsic.signed = 'signature' in block_extrinsic.value
+        self.harvester.decode_failure_cache.add_success(self.db_substrate.runtime_version, failure_key)
+
+        extrinsic.data = extrinsic_value
+        extrinsic.call_module = extrinsic_value['call']['call_module']
+        extrinsic.call_name = extrinsic_value['call']['call_function']
+        extrinsic.signed = 'signature' in extrinsic_value
         extrinsic.complete = True
         extrinsic.retry = False
-        extrinsic.save(self.session)
-        self.session.commit()
 
     def decode_log_item(self, log_item, node_log_item):
-        self.db_substrate.init_runtime(block_hash=f'0x{node_log_item.block_hash.hex()}')
+        failure_key = f'log:DigestItem.0x{node_log_item.data[:1].hex()}'
 
-        log_digest = self.db_substrate.runtime_config.create_scale_object(
-            'sp_runtime::generic::digest::DigestItem', data=ScaleBytes(node_log_item.data)
-        )
-        log_digest.decode()
+        self.check_decode_failure_cache(self.db_substrate.runtime_version, failure_key)
+
+        try:
+            log_item.data = self.db_substrate.decode_scale(
+                'sp_runtime::generic::digest::DigestItem', node_log_item.data
+            )
+        except Exception:
+            self.harvester.decode_failure_cache.add_failure(self.db_substrate.runtime_version, failure_key)
+            raise
+
+        self.harvester.decode_failure_cache.add_success(self.db_substrate.runtime_version, failure_key)
 
-        log_item.data = log_digest.value
         log_item.complete = True
         log_item.retry = False
-        log_item.save(self.session)
-        self.session.commit()
 
     def start(self):
 
-        incomplete_extrinsics = CodecBlockExtrinsic.query(self.session).filter(
-            CodecBlockExtrinsic.retry == True
-        )
+        try:
+            with GracefulInterruptHandler() as interrupt_handler:
 
-        for extrinsic in incomplete_extrinsics.limit(1000):
+                for item_type in ['extrinsic', 'log', 'storage']:
 
-            node_block_extrinsic = NodeBlockExtrinsic.query(self.session).filter_by(
-                block_hash=extrinsic.block_hash,
-                extrinsic_idx=extrinsic.extrinsic_idx
-            ).first()
+                    while self.retry_decode_failures(item_type) == self.retry_batch_size:
 
-            if node_block_extrinsic:
-                try:
+                        if interrupt_handler.interrupted:
+                            self.log("🛑 Warm shutdown initiated", 1)
+                            raise ShutdownException()
+        finally:
+            self.report_decode_failure_stats(self.harvester.decode_failure_cache.pop_failure_stats())
 
-                    self.decode_extrinsic(extrinsic, node_block_extrinsic)
+        if settings.LAZY_DECODE_CACHE_SIZE:
+            # Trimmed here as values are cached on read, regardless of the node type and the decode jobs that run
+            self.trim_decode_cache()
 
-                    self.log('Decoded extrinsic {}-{}'.format(
-                        extrinsic.block_number, extrinsic.extrinsic_idx)
-                    )
+    def trim_decode_cache(self):
+        """
+        Removes the least recently read values from the decode cache table exceeding `LAZY_DECODE_CACHE_SIZE`
+        """
+        last_read = self.session.query(CodecDecodeCache.last_read).order_by(
+            CodecDecodeCache.last_read.desc()
+        ).offset(settings.LAZY_DECODE_CACHE_SIZE).limit(1).scalar()
+
+        if last_read is not None:
+            removed_count = CodecDecodeCache.query(self.session).filter(
+                CodecDecodeCache.last_read <= last_read
+            ).delete(synchronize_session=False)
+            self.session.commit()
 
-                except Exception as e:
-                    self.log('⚠️  Failed to decode extrinsic {}-{} ({})'.format(
-                        extrinsic.block_number, extrinsic.extrinsic_idx, e),
-                    )
-                    extrinsic.retry = False
-                    extrinsic.save(self.session)
-                    self.session.commit()
+            self.log(f'Removed {removed_count} values from the decode cache', 2)
+
+    def get_decode_failure_batch(self, item_type: str) -> list:
+        """
+        Retrieves the next batch of due decode failures of given item type, joined with their raw and decoded item
+        :return: list of (decode failure, raw item, decoded item); items that do not exist anymore are None
+        """
+        if item_type == 'storage':
+            node_model, codec_model = NodeBlockStorage, CodecBlockStorage
+            node_key, codec_key = NodeBlockStorage.storage_key, CodecBlockStorage.storage_key
+            failure_key = CodecDecodeFailure.storage_key
+        elif item_type == 'log':
+            node_model, codec_model = NodeBlockHeaderDigestLog, CodecBlockHeaderDigestLog
+            node_key, codec_key = NodeBlockHeaderDigestLog.log_idx, CodecBlockHeaderDigestLog.log_idx
+            failure_key = CodecDecodeFailure.item_idx
+        else:
+            node_model, codec_model = NodeBlockExtrinsic, CodecBlockExtrinsic
+            node_key, codec_key = NodeBlockExtrinsic.extrinsic_idx, CodecBlockExtrinsic.extrinsic_idx
+            failure_key = CodecDecodeFailure.item_idx
+
+        return self.session.query(CodecDecodeFailure, node_model, codec_model).outerjoin(
+            node_model, and_(node_model.block_hash == CodecDecodeFailure.block_hash, node_key == failure_key)
+        ).outerjoin(
+            codec_model, and_(codec_model.block_hash == CodecDecodeFailure.block_hash, codec_key == failure_key)
+        ).filter(
+            CodecDecodeFailure.item_type == item_type,
+            CodecDecodeFailure.next_attempt <= datetime.now(timezone.utc)
+        ).order_by(CodecDecodeFailure.next_attempt).limit(self.retry_batch_size).all()
+
+    def retry_decode_failures(self, item_type: str) -> int:
+        """
+        Decodes a batch of due decode failures of given item type again, grouped per runtime, and writes the results
+        in one transaction
+        :return: number of processed decode failures
+        """
+        decode_failures = self.get_decode_failure_batch(item_type)
+
+        if not decode_failures:
+            return 0
 
-        incomplete_log = CodecBlockHeaderDigestLog.query(self.session).filter(
-            CodecBlockHeaderDigestLog.retry == True
+        self.db_substrate.load_block_hash_runtimes(
+            list(set(decode_failure.block_hash for decode_failure, _, _ in decode_failures))
         )
 
-        for log_item in incomplete_log.limit(1000):
+        def get_runtime_order(row):
+            decode_failure = row[0]
+            block_hash = f'0x{decode_failure.block_hash.hex()}'
 
-            node_log_item = NodeBlockHeaderDigestLog.query(self.session).filter_by(
-                block_hash=log_item.block_hash,
-                log_idx=log_item.log_idx
-            ).first()
+            return self.db_substrate.block_runtime_cache.get(block_hash, -1), decode_failure.block_number
 
-            if node_log_item:
-                try:
+        decoded_count = 0
 
-                    self.decode_log_item(log_item, node_log_item)
+        for decode_failure, node_item, codec_item in sorted(decode_failures, key=get_runtime_order):
 
-                    self.log(f'Decoded log item {log_item.block_number}-{log_item.log_idx}')
+            if node_item is None or codec_item is None:
+                # Item was removed, e.g. by decoding its block range again
+                self.session.delete(decode_failure)
+                continue
 
-                except Exception as e:
-                    self.log('⚠️  Failed to decode log {}-{} ({})'.format(
-                        log_item.block_number, log_item.log_idx, e),
-                    )
-                    log_item.retry = False
-                    log_item.save(self.session)
-                    self.session.commit()
+            if item_type == 'storage':
+                item_id = f'storage item #{decode_failure.block_number} "{decode_failure.type_key}"'
+            else:
+                item_id = f'{item_type} {decode_failure.block_number}-{decode_failure.item_idx}'
 
-        incomplete_storage = CodecBlockStorage.query(self.session).filter(
-            CodecBlockStorage.retry == True
-        )
+            # Changes of a failed item are rolled back without affecting the rest of the batch
+            savepoint = self.session.begin_nested()
 
-        for storage_item in incomplete_storage.limit(1000):
+            try:
+                self.db_substrate.init_runtime(block_hash=f'0x{decode_failure.block_hash.hex()}')
 
-            node_storage_item = NodeBlockStorage.query(self.session).filter_by(
-                block_hash=storage_item.block_hash,
-                storage_key=storage_item.storage_key
-            ).first()
+                if item_type == 'storage':
+                    self.decode_storage_item(node_item, codec_item)
+                elif item_type == 'log':
+                    self.decode_log_item(codec_item, node_item)
+                else:
+                    self.decode_extrinsic(codec_item, node_item)
 
-            if node_storage_item:
-                try:
+                savepoint.commit()
 
-                    self.decode_storage_item(node_storage_item, storage_item)
+                self.log(f'Decoded {item_id}', 2)
 
-                    self.log(f'Decoded storage item #{storage_item.block_number} "{storage_item.storage_module}.{storage_item.storage_name}"')
+            except UndecodableTypeException as e:
+                savepoint.rollback()
+                # Not decoded at all, so not counted as an attempt
+                self.log(f'⚠️  Skipped {item_id} ({e})', 2)
+                decode_failure.next_attempt = datetime.now(timezone.utc) + timedelta(
+                    seconds=self.harvester.settings.DECODE_RETRY_INTERVAL
+                )
+            except Exception as e:
+                savepoint.rollback()
+                self.log(f'⚠️  Failed to decode {item_id} ({e})', 2)
+                decode_failure.attempts += 1
+                self.set_decode_failure_error(decode_failure, e)
+            else:
+                self.session.delete(decode_failure)
+                decoded_count += 1
 
-                except Exception as e:
-                    self.log(f'⚠️  Failed to decode storage item #{storage_item.block_number} "{storage_item.storage_module}.{storage_item.storage_name}"')
-                    storage_item.retry = False
-                    storage_item.save(self.session)
-                    self.session.commit()
+        self.session.commit()
+
+        self.log(f'Retried {len(decode_failures)} {item_type} decode failures, {decoded_count} decoded')
 
-        # pending_amount = NodeBlockStorage.query(self.session).filter_by(complete=False).count()
-        #
-        # self.log('{} pending storage calls'.format(pending_amount))
+        return len(decode_failures)
 
 
 class RetrieveBlocks(Job):
@@ -323,6 +406,12 @@ class RetrieveRuntimeState(Job):
 
     icon = '🗄️'
 
+    storage_batch_size = 100
+
+    def __init__(self, **kwargs):
+        self.block_events = (None, None)
+        super().__init__(**kwargs)
+
     def start(self):
         """
         Second step in the harvester: store runtime state (only present in archive node)
@@ -369,86 +458,272 @@ class RetrieveRuntimeState(Job):
         )
         return response.get('result') or []
 
-    def storage_block_runtime_data(self, block_hash, block_number):
+    def get_storage_keys(self, prefix: bytes, block_hash: str) -> list:
+        """
+        Enumerates all storage keys starting with given prefix at given block
+        :param prefix: storage key prefix
+        :param block_hash: hex block hash
+        :return: list of storage keys as bytes
+        """
+        storage_keys = []
 
-        # Store runtime information
-        block_hash_hex = '0x{}'.format(block_hash.hex())
+        # Retrieve storage keys from RPC
+        paged_keys = self.get_next_storage_key_page(prefix, prefix, block_hash)
+        while len(paged_keys) > 0:
+            storage_keys += [bytes.fromhex(k[2:]) for k in paged_keys]
+            last_key = bytes.fromhex(paged_keys[-1][2:])
+            paged_keys = self.get_next_storage_key_page(prefix, last_key, block_hash)
 
-        self.log("🔎 [{}]".format('chain_getRuntimeVersion'), 3)
-        runtime_response = self.harvester.rpc_call('chain_getRuntimeVersion', [block_hash_hex])
+        return storage_keys
 
-        block_runtime = NodeBlockRuntime(
-            hash=block_hash,
+    @staticmethod
+    def storage_cron_key_refresh_required(cron_entry, block_number: int) -> bool:
+        """
+        Determines if the known key set of a prefix cron entry needs a full re-enumeration for given block
+        :param cron_entry: HarvesterStorageCron
+        :param block_number:
+        :return:
+        """
+        if cron_entry.key_refresh_block_number is None or block_number < cron_entry.key_refresh_block_number:
+            return True
+
+        return block_number - cron_entry.key_refresh_block_number >= cron_entry.key_refresh_interval
+
+    def storage_cron_key_refresh_triggered(self, cron_entry, block_hash: bytes) -> bool:
+        """
+        Determines if one of the key refresh events of a prefix cron entry occurred in given block. The raw events
+        are decoded here, so keys inserted by the block are enumerated before its state is captured
+        """
+        if not cron_entry.key_refresh_events:
+            return False
+
+        block_events = self.get_block_events(block_hash)
+
+        if block_events is None:
+            # Events could not be decoded, enumerate to be sure no keys are missed
+            return True
+
+        return bool(block_events.intersection(tuple(event.split('.', 1)) for event in cron_entry.key_refresh_events))
+
+    def get_block_events(self, block_hash: bytes):
+        """
+        Retrieves and decodes the events of given block, cached for the last block
+        :return: set of (pallet, event name) tuples or None when the events could not be decoded
+        """
+        if self.block_events[0] != block_hash:
+            block_events = None
+
+            try:
+                block_hash_hex = f'0x{block_hash.hex()}'
+                events_data = self.get_storage_values([self.harvester.event_storage_key], block_hash_hex)[0][1]
+
+                self.db_substrate.init_runtime(block_hash=block_hash_hex)
+                events = self.db_substrate.decode_storage_value('System', 'Events', events_data)[1]
+
+                block_events = set((event['module_id'], event['event_id']) for event in events or [])
+            except Exception as e:
+                self.log(f'⚠️  Failed to decode events of block {self.format_hash(block_hash)} ({e})', 2)
+
+            self.block_events = (block_hash, block_events)
+
+        return self.block_events[1]
+
+    def update_storage_cron_keys(self, cron_entry, storage_keys: list, block_number: int):
+        """
+        Replaces the known key set of a prefix cron entry with the result of a full enumeration
+        :param cron_entry: HarvesterStorageCron
+        :param storage_keys: list of enumerated storage keys
+        :param block_number: block of the enumeration
+        :return:
+        """
+        known_keys = set(
+            item.storage_key for item in
+            self.session.query(HarvesterStorageCronKey.storage_key).filter_by(cron_id=cron_entry.id, kind='tracked')
+        )
+        current_keys = set(storage_keys)
+
+        self.session.bulk_save_objects([
+            HarvesterStorageCronKey(cron_id=cron_entry.id, storage_key=storage_key, kind='tracked')
+            for storage_key in current_keys - known_keys
+        ])
+
+        self.remove_storage_cron_keys(cron_entry, list(known_keys - current_keys))
+
+        cron_entry.key_refresh_block_number = block_number
+        cron_entry.save(self.session)
+
+        self.log(f'Refreshed {len(current_keys)} keys of {cron_entry.storage_module}.{cron_entry.storage_name}', 2)
+
+    def remove_storage_cron_keys(self, cron_entry, storage_keys: list):
+        for batch_idx in range(0, len(storage_keys), self.storage_batch_size):
+            HarvesterStorageCronKey.query(self.session).filter(
+                HarvesterStorageCronKey.cron_id == cron_entry.id,
+                HarvesterStorageCronKey.kind == 'tracked',
+                HarvesterStorageCronKey.storage_key.in_(storage_keys[batch_idx:batch_idx + self.storage_batch_size])
+            ).delete(synchronize_session=False)
+
+    def store_storage_snapshot(self, cron_entry, block_hash: bytes, block_number: int, storage_keys: list,
+                               storage_data: list):
+        """
+        Writes the captured storage entries of a cron entry to a snapshot file instead of `NodeBlockStorage` rows
+        and registers the file in `NodeBlockStorageSnapshot`
+        """
+        file_path = get_snapshot_path(
+            settings.SNAPSHOT_PATH, cron_entry.storage_module, cron_entry.storage_name, block_number
+        )
+
+        write_storage_snapshot(file_path, storage_keys, storage_data)
+
+        snapshot = NodeBlockStorageSnapshot(
+            block_hash=block_hash,
+            storage_module=cron_entry.storage_module,
+            storage_name=cron_entry.storage_name,
             block_number=block_number,
-            spec_name=runtime_response['result']['specName'],
-            spec_version=runtime_response['result']['specVersion']
+            file_path=file_path,
+            count_keys=len(storage_keys),
+            decoded=False
         )
+        snapshot.save(self.session)
 
-        block_runtime.save(self.session)
+        self.log(f'Stored snapshot of {len(storage_keys)} {cron_entry.storage_module}.{cron_entry.storage_name} '
+                 f'entries for #{block_number}', 2)
 
-        # Store storage entries from cron
-        for cron_entry in self.harvester.storage_cron_entries:
+    def get_block_trace(self, block_hash: str, prefixes: list) -> dict:
+        """
+        Traces the execution of given block with `state_traceBlock` and returns the storage events of which the
+        key starts with one of given prefixes
+        :param block_hash: hex block hash
+        :param prefixes: list of storage key prefixes as bytes
+        :return: block trace
+        """
+        self.log("🔎 [{}]".format('state_traceBlock'), 3)
+        response = self.harvester.rpc_call(
+            'state_traceBlock', [block_hash, 'state', ','.join([prefix.hex() for prefix in prefixes]), None]
+        )
 
-            if block_number % cron_entry.block_number_interval == 0:
+        result = response.get('result') or {}
 
-                if cron_entry.storage_key is None and cron_entry.storage_key_prefix is None:
+        if 'traceError' in result:
+            raise ValueError(f"Trace of block {block_hash} failed: {result['traceError'].get('error')}")
 
-                    storage_hash = self.substrate.generate_storage_hash(
-                        storage_module=cron_entry.storage_module,
-                        storage_function=cron_entry.storage_name
-                    )
+        return result.get('blockTrace') or {}
+
+    def get_written_storage_keys(self, block_trace: dict) -> list:
+        """
+        Extracts the storage keys written during block execution from a block trace
+        :param block_trace:
+        :return: list of storage keys as bytes, in order of first write
+        """
+        storage_keys = {}
 
-                    storage_hash = bytes.fromhex(storage_hash[2:])
+        for event in block_trace.get('events') or []:
+            values = (event.get('data') or {}).get('stringValues') or {}
 
-                    storage_function = self.substrate.get_metadata_storage_function(
-                        cron_entry.storage_module, cron_entry.storage_name, block_hash=block_hash_hex
-                    )
+            if values.get('method') in ['Put', 'Append'] and values.get('key'):
+                storage_keys[bytes.fromhex(values['key'].replace('0x', ''))] = True
 
-                    if 'Plain' in storage_function.type:
-                        cron_entry.storage_key = storage_hash
-                    else:
-                        cron_entry.storage_key_prefix = storage_hash
+            elif values.get('method') == 'ClearPrefix':
+                self.log(f"⚠️  Cleared prefix {values.get('prefix')} not captured in trace", 2)
 
-                    cron_entry.save(self.session)
+        return list(storage_keys.keys())
 
-                storage_keys = []
+    def store_traced_storage(self, cron_entries: list, block_hash: bytes, block_number: int):
+        """
+        Stores the storage entries written in given block for storage cron entries in 'trace' capture mode. Values
+        are read from the post-state of the block, so rolled back writes and appends result in the final value
+        :param cron_entries: list of HarvesterStorageCron
+        :param block_hash:
+        :param block_number:
+        :return:
+        """
+        block_hash_hex = '0x{}'.format(block_hash.hex())
 
-                if cron_entry.storage_key:
-                    storage_keys.append(cron_entry.storage_key)
+        # Longest prefix first, so keys are assigned to the most specific storage function
+        cron_prefixes = sorted(
+            [(cron_entry.storage_key_prefix or cron_entry.storage_key, cron_entry) for cron_entry in cron_entries],
+            key=lambda item: len(item[0]), reverse=True
+        )
 
-                elif cron_entry.storage_key_prefix:
+        block_trace = self.get_block_trace(block_hash_hex, [prefix for prefix, cron_entry in cron_prefixes])
 
-                    # Retrieve storage keys from RPC
-                    paged_keys = self.get_next_storage_key_page(
-                        cron_entry.storage_key_prefix, cron_entry.storage_key_prefix, block_hash_hex
-                    )
-                    while len(paged_keys) > 0:
-                        storage_keys += [bytes.fromhex(k[2:]) for k in paged_keys]
-                        last_key = bytes.fromhex(paged_keys[-1][2:])
-                        paged_keys = self.get_next_storage_key_page(
-                            cron_entry.storage_key_prefix, last_key, block_hash_hex
-                        )
+        storage_keys = self.get_written_storage_keys(block_trace)
 
-                for storage_key in storage_keys:
-                    events_response = self.harvester.rpc_call(
-                        "state_getStorageAt", [f'0x{storage_key.hex()}', block_hash_hex]
-                    )
+        snapshots = {}
 
-                    if events_response.get('result'):
-                        events_data = bytes.fromhex(events_response.get('result')[2:])
-                    else:
-                        events_data = None
+        for storage_key, storage_data in self.get_storage_values(storage_keys, block_hash_hex):
 
-                    storage_item = NodeBlockStorage(
-                        block_hash=block_hash,
-                        storage_key=storage_key,
-                        data=events_data,
-                        block_number=block_number,
-                        storage_module=cron_entry.storage_module,
-                        storage_name=cron_entry.storage_name,
-                        complete=True
-                    )
-                    storage_item.save(self.session)
+            cron_entry = next(
+                (cron_entry for prefix, cron_entry in cron_prefixes if storage_key.startswith(prefix)), None
+            )
+
+            if cron_entry is None:
+                continue
+
+            if cron_entry.sink == 'file':
+                snapshot_keys, snapshot_data = snapshots.setdefault(cron_entry.id, (cron_entry, [], []))[1:]
+                snapshot_keys.append(storage_key)
+                snapshot_data.append(storage_data)
+                continue
+
+            storage_item = NodeBlockStorage(
+                block_hash=block_hash,
+                storage_key=storage_key,
+                data=storage_data,
+                block_number=block_number,
+                storage_module=cron_entry.storage_module,
+                storage_name=cron_entry.storage_name,
+                complete=True
+            )
+            storage_item.save(self.session)
+
+        for cron_entry, snapshot_keys, snapshot_data in snapshots.values():
+            self.store_storage_snapshot(cron_entry, block_hash, block_number, snapshot_keys, snapshot_data)
+
+        self.log(f'Stored {len(storage_keys)} traced storage changes for #{block_number}', 2)
+
+    def get_storage_values(self, storage_keys: list, block_hash: str) -> list:
+        """
+        Retrieves the values of given storage keys at given block in batches of `storage_batch_size`
+        :param storage_keys: list of storage keys as bytes
+        :param block_hash: hex block hash
+        :return: list of (storage_key, data) tuples, data is None if key is not present in storage
+        """
+        storage_values = []
+
+        for batch_idx in range(0, len(storage_keys), self.storage_batch_size):
+            batch_keys = storage_keys[batch_idx:batch_idx + self.storage_batch_size]
+
+            response = self.harvester.rpc_call(
+                "state_queryStorageAt", [[f'0x{storage_key.hex()}' for storage_key in batch_keys], block_hash]
+            )
+
+            changes = {}
+            for change_set in response.get('result') or []:
+                for change_key, change_data in change_set['changes']:
+                    changes[change_key] = change_data
+
+            for storage_key in batch_keys:
+                change_data = changes.get(f'0x{storage_key.hex()}')
+                storage_values.append((storage_key, bytes.fromhex(change_data[2:]) if change_data else None))
+
+        return storage_values
+
+    def storage_block_runtime_data(self, block_hash, block_number):
+
+        # Store runtime information
+        block_hash_hex = '0x{}'.format(block_hash.hex())
+
+        self.log("🔎 [{}]".format('chain_getRuntimeVersion'), 3)
+        runtime_response = self.harvester.rpc_call('chain_getRuntimeVersion', [block_hash_hex])
+
+        block_runtime = NodeBlockRuntime(
+            hash=block_hash,
+            block_number=block_number,
+            spec_name=runtime_response['result']['specName'],
+            spec_version=runtime_response['result']['specVersion']
+        )
+
+        block_runtime.save(self.session)
 
         # Check if runtime exists TODO optimize this
 
@@ -528,6 +803,121 @@ class RetrieveRuntimeState(Job):
 
                     codec_metadata.save(self.session)
 
+        # Store storage entries from cron, after the metadata of a new runtime is available
+        self.store_cron_storage(
+            block_hash, block_number, runtime_response['result']['specName'], runtime_response['result']['specVersion']
+        )
+
+    def store_cron_storage(self, block_hash: bytes, block_number: int, spec_name: str, spec_version: int):
+
+        # Store storage entries from cron
+        cron_entries = [
+            cron_entry for cron_entry in self.harvester.storage_cron_entries
+            if cron_entry.block_number_interval and block_number % cron_entry.block_number_interval == 0
+        ]
+
+        if cron_entries:
+            self.store_cron_entries_storage(cron_entries, block_hash, block_number, spec_name, spec_version)
+
+    def store_cron_entries_storage(self, cron_entries: list, block_hash: bytes, block_number: int, spec_name: str,
+                                   spec_version: int, track_keys: bool = True):
+        """
+        Captures the storage of given cron entries at given block according to their capture mode and sink
+        :param track_keys: use and update the known keys of prefix cron entries; disabled when capturing an earlier
+        block than the last enumeration
+        """
+        block_hash_hex = '0x{}'.format(block_hash.hex())
+
+        trace_cron_entries = []
+
+        for cron_entry in cron_entries:
+
+            if cron_entry.storage_key is None and cron_entry.storage_key_prefix is None:
+
+                storage_hash, storage_function = self.db_substrate.get_local_storage_function(
+                    spec_name, spec_version, cron_entry.storage_module, cron_entry.storage_name
+                )
+
+                if not storage_function:
+                    self.log(f'⚠️  Storage function "{cron_entry.storage_module}.{cron_entry.storage_name}" '
+                             f'not found in runtime {spec_name}-{spec_version}')
+                    continue
+
+                if 'Plain' in storage_function.type:
+                    cron_entry.storage_key = storage_hash
+                else:
+                    cron_entry.storage_key_prefix = storage_hash
+
+                cron_entry.save(self.session)
+
+            storage_keys = []
+            known_keys = False
+
+            if cron_entry.capture_mode == 'trace':
+                # Written keys are determined for all trace entries at once after this loop
+                trace_cron_entries.append(cron_entry)
+
+            elif cron_entry.capture_mode == 'watchlist':
+                storage_keys = [
+                    item.storage_key for item in
+                    HarvesterStorageCronKey.query(self.session).filter_by(cron_id=cron_entry.id, kind='watchlist')
+                ]
+
+            elif cron_entry.storage_key:
+                storage_keys.append(cron_entry.storage_key)
+
+            elif cron_entry.storage_key_prefix:
+
+                if track_keys and cron_entry.key_refresh_interval and not self.storage_cron_key_refresh_required(
+                        cron_entry, block_number) and not self.storage_cron_key_refresh_triggered(
+                        cron_entry, block_hash):
+                    # Only retrieve values of keys known from last enumeration
+                    storage_keys = [
+                        item.storage_key for item in
+                        HarvesterStorageCronKey.query(self.session).filter_by(cron_id=cron_entry.id, kind='tracked')
+                    ]
+                    known_keys = True
+                else:
+                    storage_keys = self.get_storage_keys(cron_entry.storage_key_prefix, block_hash_hex)
+
+                    if track_keys and cron_entry.key_refresh_interval:
+                        self.update_storage_cron_keys(cron_entry, storage_keys, block_number)
+
+            removed_keys = []
+            snapshot_keys = []
+            snapshot_data = []
+
+            for storage_key, storage_data in self.get_storage_values(storage_keys, block_hash_hex):
+
+                if known_keys and storage_data is None:
+                    removed_keys.append(storage_key)
+                    continue
+
+                if cron_entry.sink == 'file':
+                    snapshot_keys.append(storage_key)
+                    snapshot_data.append(storage_data)
+                    continue
+
+                storage_item = NodeBlockStorage(
+                    block_hash=block_hash,
+                    storage_key=storage_key,
+                    data=storage_data,
+                    block_number=block_number,
+                    storage_module=cron_entry.storage_module,
+                    storage_name=cron_entry.storage_name,
+                    complete=True
+                )
+                storage_item.save(self.session)
+
+            if removed_keys:
+                self.remove_storage_cron_keys(cron_entry, removed_keys)
+
+            if cron_entry.sink == 'file' and cron_entry.capture_mode != 'trace':
+                self.store_storage_snapshot(cron_entry, block_hash, block_number, snapshot_keys, snapshot_data)
+
+        if trace_cron_entries:
+            self.store_traced_storage(trace_cron_entries, block_hash, block_number)
+
     def store_runtime(self, metadata_decoder, runtime_info, block_hash):
         # Store metadata in database
         self.log(f'Store runtime {runtime_info.spec_name}-{runtime_info.spec_version}')
@@ -806,112 +1196,740 @@ class RetrieveRuntimeState(Job):
             runtime.save(self.session)
 
 
-class ScaleDecode(Job):
+class RetrieveRecentState(RetrieveRuntimeState):
 
-    icon = '⚙️'
+    icon = '🗄️'
 
-    def start(self):
-        # Extrinsics
-        min_extrinsic_block_id = (self.session.query(func.max(CodecBlockExtrinsic.block_number)).one()[0] or -1) + 1
+    finalised_head_refresh = 10
 
-        max_extrinsic_block_id = (self.session.query(func.max(NodeBlockExtrinsic.block_number)).one()[0] or -1)
+    state_pruning_probe_factor = 16
 
-        if self.harvester.block_start:
-            min_extrinsic_block_id = max(self.harvester.block_start, min_extrinsic_block_id)
+    def __init__(self, **kwargs):
+        self.state_pruning_window = None
+        super().__init__(**kwargs)
 
-        if self.harvester.block_end:
-            max_extrinsic_block_id = min(self.harvester.block_end, max_extrinsic_block_id)
+    def start(self):
+        """
+        Second step in the harvester for pruned (non-archive) nodes: store runtime state of finalised blocks
+        before the node discards it, oldest blocks (closest to be pruned) first
+        :return:
+        """
 
-        # Yield per 1000
-        max_extrinsic_block_id = min(max_extrinsic_block_id, min_extrinsic_block_id + self.yield_per)
+        if self.state_pruning_window is None:
+            self.state_pruning_window = self.detect_state_pruning_window()
+            self.log(f'State pruning window of node is {self.state_pruning_window} blocks')
 
-        with GracefulInterruptHandler() as interrupt_handler:
+        finalised_block_number = self.get_finalised_block_number()
 
-            for current_block_id in range(min_extrinsic_block_id, max_extrinsic_block_id + 1):
+        max_runtime_block_number = self.session.query(func.max(NodeBlockRuntime.block_number)).one()[0]
 
-                block_extrinsics = NodeBlockExtrinsic.query(self.session).filter(
-                    NodeBlockExtrinsic.block_number == current_block_id
-                )
+        if max_runtime_block_number is None:
+            current_block_id = self.get_oldest_state_block_number(finalised_block_number)
+        else:
+            current_block_id = max_runtime_block_number + 1
 
-                for node_extrinsic in block_extrinsics:
-                    self.decode_extrinsic(node_extrinsic)
+        if self.harvester.block_start:
+            current_block_id = max(self.harvester.block_start, current_block_id)
 
-                self.log('Decoded extrinsics for #{}'.format(current_block_id))
+        end_block_id = min(finalised_block_number, current_block_id + self.yield_per)
 
-                self.session.commit()
+        if self.harvester.block_end:
+            end_block_id = min(self.harvester.block_end, end_block_id)
 
-                if interrupt_handler.interrupted:
-                    self.log("🛑 Warm shutdown initiated", 1)
-                    raise ShutdownException()
+        processed_count = 0
 
-        # Logs
-        min_log_block_id = (self.session.query(func.max(CodecBlockHeaderDigestLog.block_number)).one()[0] or -1) + 1
+        with GracefulInterruptHandler() as interrupt_handler:
 
-        max_log_block_id = (self.session.query(func.max(NodeBlockHeaderDigestLog.block_number)).one()[0] or -1)
+            while current_block_id <= end_block_id:
 
-        if self.harvester.block_end:
-            max_log_block_id = min(self.harvester.block_end, max_log_block_id)
+                if processed_count > 0 and processed_count % self.finalised_head_refresh == 0:
+                    finalised_block_number = self.get_finalised_block_number()
 
-        if self.harvester.block_start:
-            min_log_block_id = max(self.harvester.block_start + 1, min_log_block_id)
+                oldest_state_block_id = self.get_oldest_state_block_number(finalised_block_number)
 
-        # Yield per 1000
-        max_log_block_id = min(max_log_block_id, min_log_block_id + self.yield_per)
+                if current_block_id < oldest_state_block_id:
+                    # State already pruned, continue with the block closest to be pruned
+                    missed_count = oldest_state_block_id - current_block_id
+                    self.harvester.prom_state_capture_missed.inc(missed_count)
+                    self.log(f'⚠️  Missed state of {missed_count} blocks from #{current_block_id}')
+                    current_block_id = oldest_state_block_id
+                    continue
 
-        with GracefulInterruptHandler() as interrupt_handler:
+                self.harvester.prom_state_capture_margin.set(current_block_id - oldest_state_block_id)
 
-            for current_block_id in range(min_log_block_id, max_log_block_id + 1):
+                block_hash = self.substrate.get_block_hash(current_block_id)
 
-                block_logs = NodeBlockHeaderDigestLog.query(self.session).filter(
-                    NodeBlockHeaderDigestLog.block_number == current_block_id
-                )
+                self.log('Process runtime state for #{}'.format(current_block_id))
 
-                for node_log_item in block_logs:
-                    self.decode_log_item(node_log_item)
-
-                self.log('Decoded logs for #{}'.format(current_block_id))
-
-                self.session.commit()
+                try:
+                    self.storage_block_runtime_data(
+                        block_hash=bytes.fromhex(block_hash[2:]), block_number=current_block_id
+                    )
+                except ValueError as e:
+                    if not self.is_state_discarded_error(e):
+                        raise
+                    # State pruned while processing
+                    self.session.rollback()
+                    self.harvester.prom_state_capture_missed.inc()
+                    self.log(f'⚠️  Missed state of #{current_block_id} ({e})')
+                else:
+                    HarvesterStatus.query(self.session).filter_by(key='PROCESS_STATE_MAX_BLOCKNUMBER').update(
+                        {HarvesterStatus.value: current_block_id}, synchronize_session='fetch'
+                    )
+                    self.session.commit()
 
                 if interrupt_handler.interrupted:
                     self.log("🛑 Warm shutdown initiated", 1)
                     raise ShutdownException()
 
-        # Storage
-        min_storage_block_id = (self.session.query(func.max(CodecBlockStorage.block_number)).one()[0] or -1) + 1
+                current_block_id += 1
+                processed_count += 1
+
+    def get_finalised_block_number(self) -> int:
+        finalised_hash = self.substrate.get_chain_finalised_head()
+        return self.substrate.get_block_number(finalised_hash)
+
+    def get_oldest_state_block_number(self, finalised_block_number: int) -> int:
+        return max(0, finalised_block_number - self.state_pruning_window + 1)
+
+    def state_available(self, block_number: int) -> bool:
+        block_hash = self.substrate.get_block_hash(block_number)
+        try:
+            self.harvester.rpc_call('state_getRuntimeVersion', [block_hash])
+            return True
+        except ValueError as e:
+            if self.is_state_discarded_error(e):
+                return False
+            raise
+
+    @staticmethod
+    def is_state_discarded_error(error: Exception) -> bool:
+        """
+        Determines if an RPC error is the error of the node for a block of which the state is pruned
+        """
+        return 'state already discarded' in str(error).lower()
+
+    def detect_state_pruning_window(self) -> int:
+        """
+        Determines the number of finalised blocks of which the node still serves state, by binary searching the
+        oldest block of which the runtime version can be retrieved. Only the last `STATE_PRUNING_WINDOW` *
+        `state_pruning_probe_factor` blocks are probed, as nodes can keep the state of older blocks like genesis.
+        Falls back to `STATE_PRUNING_WINDOW` setting
+        :return:
+        """
+        try:
+            finalised_block_number = self.get_finalised_block_number()
+
+            low = max(0, finalised_block_number - settings.STATE_PRUNING_WINDOW * self.state_pruning_probe_factor)
+            high = finalised_block_number
+
+            if self.state_available(low):
+                return finalised_block_number - low + 1
+
+            while low < high:
+                middle = (low + high) // 2
+                if self.state_available(middle):
+                    high = middle
+                else:
+                    low = middle + 1
+
+            return finalised_block_number - low + 1
+
+        except Exception as e:
+            self.log(f'⚠️  Could not detect state pruning window ({e})')
+            return settings.STATE_PRUNING_WINDOW
+
+
+class ScaleDecode(Job):
+
+    icon = '⚙️'
+
+    decode_range_size = 100
+
+    event_batch_size = 100
+
+    def __init__(self, **kwargs):
+        self.decoder_pool = None
+        self.decode_memo = OrderedDict()
+        self.decode_memo_hits = 0
+        self.decode_memo_misses = 0
+        self.event_batch_values = {}
+        self.decode_filter = DecodeFilter(settings.DECODE_INCLUDE, settings.DECODE_EXCLUDE)
+        self.deferred_calls = set(settings.DEFERRED_DECODE_CALLS)
+        # Collected instead of applied in worker processes, see `decode_block_range_worker`
+        self.storage_cron_events = None
+        super().__init__(**kwargs)
+
+    def start(self):
+
+        try:
+            if getattr(self.harvester, 'decoder_processes', 1) > 1:
+                self.start_pool()
+            else:
+                self.decode_blocks()
+        finally:
+            self.report_decode_memo_stats(*self.pop_decode_memo_stats())
+            self.report_decode_failure_stats(self.harvester.decode_failure_cache.pop_failure_stats())
+
+        # Storage snapshot files
+        self.decode_storage_snapshots()
+
+    def get_decode_range(self) -> tuple:
+        """
+        Determines the next block range to decode, starting after the decoder watermark
+        :return: tuple of (status record, min block number, max block number)
+        """
+        record = HarvesterStatus.query(self.session).get('PROCESS_DECODER_MAX_BLOCKNUMBER')
+
+        min_block_id = int(record.value) + 1 if record.value is not None else 0
 
         if self.harvester.block_start:
-            min_storage_block_id = max(self.harvester.block_start + 1, min_storage_block_id)
+            min_block_id = max(self.harvester.block_start, min_block_id)
 
-        max_storage_block_id = (self.session.query(func.max(NodeBlockStorage.block_number)).one()[0] or -1)
+        if self.harvester.type != 'archive':
+            # Pruned nodes only have the runtime of blocks of which the state was captured
+            min_runtime_block_id = self.session.query(func.min(NodeBlockRuntime.block_number)).one()[0]
 
-        max_storage_block_id = min(max_storage_block_id, min_storage_block_id + self.yield_per)
+            if min_runtime_block_id is None:
+                return record, min_block_id, min_block_id - 1
+
+            min_block_id = max(min_runtime_block_id, min_block_id)
+
+        # Only decode blocks of which both the extrinsics and the events are retrieved
+        max_block_id = min(
+            self.session.query(func.max(NodeBlockExtrinsic.block_number)).one()[0] or -1,
+            self.session.query(func.max(NodeBlockStorage.block_number)).one()[0] or -1
+        )
 
         if self.harvester.block_end:
-            max_storage_block_id = min(self.harvester.block_end, max_storage_block_id)
+            max_block_id = min(self.harvester.block_end, max_block_id)
+
+        # Yield per 1000
+        max_block_id = min(max_block_id, min_block_id + self.yield_per)
+
+        return record, min_block_id, max_block_id
+
+    def decode_blocks(self):
+        """
+        Decodes extrinsics, logs and storage of the next block range in a single pass. All items of a block are
+        committed in one transaction together with the decoder watermark, so the codec tables cannot drift apart.
+        """
+        record, min_block_id, max_block_id = self.get_decode_range()
+
+        if max_block_id < min_block_id:
+            return
+
+        self.clear_decoded_range(min_block_id, max_block_id)
 
         with GracefulInterruptHandler() as interrupt_handler:
 
-            for current_block_id in range(min_storage_block_id, max_storage_block_id + 1):
+            for block_number, block_extrinsics, block_logs, block_storage in self.read_blocks(
+                min_block_id, max_block_id
+            ):
+                self.decode_block(block_extrinsics, block_logs, block_storage)
 
-                block_storage = NodeBlockStorage.query(self.session).filter(
-                    NodeBlockStorage.block_number == current_block_id
-                )
+                record.value = block_number
+                record.save(self.session)
+                self.session.commit()
 
-                for node_storage in block_storage:
-                    self.decode_storage_item(node_storage)
+                self.log('Decoded block #{}'.format(block_number))
 
                 if interrupt_handler.interrupted:
                     self.log("🛑 Warm shutdown initiated", 1)
                     raise ShutdownException()
 
-        # Update status record
-        HarvesterStatus.query(self.session).filter_by(key='PROCESS_DECODER_MAX_BLOCKNUMBER').update(
-            {HarvesterStatus.value: min(max_extrinsic_block_id, max_log_block_id, max_storage_block_id)},
-            synchronize_session='fetch'
-        )
+            record.value = max_block_id
+            record.save(self.session)
+            self.session.commit()
+
+    def start_pool(self):
+        """
+        Decodes the next block range by dividing it in chunks of `decode_range_size` blocks over a pool of worker
+        processes. The decoder watermark only advances over the contiguous chunks that are completed, so a restart
+        continues from the first chunk that was not finished.
+        """
+        record, min_block_id, max_block_id = self.get_decode_range()
+
+        if max_block_id < min_block_id:
+            return
+
+        block_ranges = [
+            (block_from, min(block_from + self.decode_range_size - 1, max_block_id))
+            for block_from in range(min_block_id, max_block_id + 1, self.decode_range_size)
+        ]
+
+        if self.decoder_pool is None:
+            self.decoder_pool = multiprocessing.get_context('spawn').Pool(
+                processes=self.harvester.decoder_processes,
+                initializer=init_decode_worker,
+                initargs=(self.harvester.verbose_level, self.harvester.block_start, self.harvester.block_end)
+            )
+
+        completed_ranges = {}
+        watermark = min_block_id - 1
+
+        with GracefulInterruptHandler() as interrupt_handler:
+
+            try:
+                for block_from, block_to, memo_hits, memo_misses, failure_stats, data_cache_stats, \
+                        storage_cron_events in self.decoder_pool.imap_unordered(decode_block_range_worker, block_ranges):
+
+                    self.log(f'Decoded block range #{block_from}-#{block_to}')
+
+                    # Storage tasks of the workers are scheduled here, so only one process writes them
+                    for block_number, events in storage_cron_events:
+                        self.process_storage_cron_events(block_number, events)
+
+                    self.report_decode_memo_stats(memo_hits, memo_misses)
+                    self.report_decode_failure_stats(failure_stats)
+                    self.report_data_cache_stats(data_cache_stats)
+
+                    completed_ranges[block_from] = block_to
+
+                    # Advance watermark over contiguous completed ranges
+                    while watermark + 1 in completed_ranges:
+                        watermark = completed_ranges.pop(watermark + 1)
+
+                    record.value = watermark
+                    record.save(self.session)
+                    self.session.commit()
+
+                    if interrupt_handler.interrupted:
+                        self.log("🛑 Warm shutdown initiated", 1)
+                        raise ShutdownException()
+
+            except ShutdownException:
+                self.terminate_pool()
+                raise
+
+            except Exception as e:
+                self.terminate_pool()
+                raise BlockDecodeException(f'Decoder worker failed: {e}')
+
+    def terminate_pool(self):
+        if self.decoder_pool is not None:
+            self.decoder_pool.terminate()
+            self.decoder_pool.join()
+            self.decoder_pool = None
+
+    def decode_block_range(self, block_from: int, block_to: int):
+        """
+        Decodes extrinsics, logs and storage of given block range, committing per block. Previously decoded records in
+        the range are removed first, so a range that was interrupted halfway can safely be processed again.
+        """
+        self.clear_decoded_range(block_from, block_to)
+
+        for block_number, block_extrinsics, block_logs, block_storage in self.read_blocks(block_from, block_to):
+            self.decode_block(block_extrinsics, block_logs, block_storage)
+            self.session.commit()
+
+            self.log('Decoded block #{}'.format(block_number), 2)
+
+    def clear_decoded_range(self, block_from: int, block_to: int):
+        """
+        Removes decoded records of given block range that are left behind by an interrupted run
+        """
+        for model in [CodecBlockExtrinsic, CodecBlockHeaderDigestLog, CodecBlockStorage, CodecBlockEvent,
+                      CodecDecodeFailure, CodecDecodeCache, CodecDeferredDecode]:
+            model.query(self.session).filter(
+                model.block_number >= block_from, model.block_number <= block_to
+            ).delete(synchronize_session=False)
+
         self.session.commit()
 
+    def read_blocks(self, block_from: int, block_to: int):
+        """
+        Merges the raw extrinsic, log and storage streams of given block range per block. When batch decoding of events
+        is enabled, blocks are read ahead per `event_batch_size` blocks to decode their events together.
+        :return: generator of (block_number, extrinsics, logs, storage items)
+        """
+        self.db_substrate.load_block_runtimes(block_from, block_to)
+
+        blocks = self.merge_block_windows(block_from, block_to)
+
+        if not settings.ENABLE_EVENT_BATCH_DECODE:
+            yield from blocks
+            return
+
+        while True:
+            block_batch = list(islice(blocks, self.event_batch_size))
+
+            if not block_batch:
+                break
+
+            self.decode_event_batch([node_storage for block in block_batch for node_storage in block[3]])
+
+            yield from block_batch
+
+    def merge_block_windows(self, block_from: int, block_to: int):
+        windows = [
+            self.read_block_window(NodeBlockExtrinsic, block_from, block_to, NodeBlockExtrinsic.extrinsic_idx),
+            self.read_block_window(NodeBlockHeaderDigestLog, block_from, block_to, NodeBlockHeaderDigestLog.log_idx),
+            self.read_block_window(NodeBlockStorage, block_from, block_to, NodeBlockStorage.storage_key)
+        ]
+
+        pending = [next(window, None) for window in windows]
+
+        while any(pending):
+            block_number = min(item[0] for item in pending if item)
+
+            block_items = []
+            for idx, item in enumerate(pending):
+                if item and item[0] == block_number:
+                    block_items.append(item[1])
+                    pending[idx] = next(windows[idx], None)
+                else:
+                    block_items.append([])
+
+            yield (block_number, *block_items)
+
+    def decode_event_batch(self, block_storage: list):
+        """
+        Decodes the events of a window of blocks together per runtime; the results are picked up by
+        `decode_storage_item`, including the errors of items that failed to decode
+        """
+        self.event_batch_values = {}
+
+        event_items = [
+            node_storage for node_storage in block_storage
+            if node_storage.storage_key == self.harvester.event_storage_key and node_storage.data is not None and
+            self.decode_filter.is_included('storage', node_storage.storage_module, node_storage.storage_name)
+        ]
+
+        try:
+            for spec_version, runtime_items in groupby(
+                event_items, key=lambda item: self.db_substrate.get_block_spec_version(f'0x{item.block_hash.hex()}')
+            ):
+                runtime_items = list(runtime_items)
+
+                self.db_substrate.init_runtime(block_hash=f'0x{runtime_items[0].block_hash.hex()}')
+
+                scale_type, values = self.db_substrate.decode_storage_values(
+                    runtime_items[0].storage_module, runtime_items[0].storage_name,
+                    [node_storage.data for node_storage in runtime_items], return_exceptions=True
+                )
+
+                for node_storage, value in zip(runtime_items, values):
+                    self.event_batch_values[(node_storage.block_hash, node_storage.storage_key)] = (scale_type, value)
+
+        except Exception as e:
+            self.log(f'⚠️  Batch decoding of events failed ({e})', 2)
+
+    def decode_block(self, block_extrinsics: list, block_logs: list, block_storage: list):
+        """
+        Decodes all raw items of one block; the caller commits them as one transaction
+        """
+        block_rows = block_extrinsics or block_logs or block_storage
+
+        if block_rows:
+            # Resolve runtime once for the whole block
+            try:
+                self.db_substrate.init_runtime(block_hash=f'0x{block_rows[0].block_hash.hex()}')
+            except BlockRuntimeNotFound as e:
+                # State of the block was not captured, e.g. pruned before it was retrieved
+                self.log(f'⚠️  Skipped block #{block_rows[0].block_number} ({e})')
+                return
+
+        for node_extrinsic in block_extrinsics:
+            call_function = self.get_extrinsic_call_function(node_extrinsic)
+
+            if call_function is None:
+                self.decode_extrinsic(node_extrinsic)
+            elif not self.decode_filter.is_included('calls', call_function[1], call_function[2]):
+                continue
+            elif settings.LAZY_DECODE or self.is_decode_deferred(node_extrinsic, call_function[1], call_function[2]):
+                self.defer_extrinsic(node_extrinsic, *call_function)
+            else:
+                self.decode_extrinsic(node_extrinsic)
+
+        for node_log_item in block_logs:
+            self.decode_log_item(node_log_item)
+
+        for node_storage in block_storage:
+            if not self.decode_filter.is_included('storage', node_storage.storage_module, node_storage.storage_name):
+                continue
+
+            # Events are needed by the event index and storage cron, so these are always decoded
+            if settings.LAZY_DECODE and node_storage.storage_key != self.harvester.event_storage_key:
+                self.defer_storage_item(node_storage)
+            else:
+                self.decode_storage_item(node_storage)
+
+    def get_extrinsic_call_function(self, node_extrinsic):
+        """
+        Determines the call of the extrinsic by its call index, before the extrinsic is decoded, so the decode filters
+        and deferral policy can be applied
+        :return: tuple of (call index, pallet name, call function name) or None when not determined
+        """
+        if not self.decode_filter.is_active('calls') and not self.deferred_calls and not settings.DEFERRED_DECODE_SIZE \
+                and not settings.LAZY_DECODE:
+            return None
+
+        self.db_substrate.init_runtime(block_hash=f'0x{node_extrinsic.block_hash.hex()}')
+
+        try:
+            call_index = self.db_substrate.get_extrinsic_call_index(node_extrinsic.data)
+
+            if call_index is None:
+                return None
+
+            return (call_index,) + self.db_substrate.get_call_function_name(call_index)
+        except Exception:
+            # Let the decoder report invalid extrinsics
+            return None
+
+    def is_decode_deferred(self, node_extrinsic, call_module: str, call_function: str) -> bool:
+        if self.deferred_calls & {call_module, f'{call_module}.{call_function}'}:
+            return True
+
+        return bool(settings.DEFERRED_DECODE_SIZE) and len(node_extrinsic.data) > settings.DEFERRED_DECODE_SIZE
+
+    def defer_extrinsic(self, node_extrinsic, call_index: bytes, call_module: str, call_function: str):
+        """
+        Stores only the call header of the extrinsic; the full decode is done later by `DeferredDecode` or on demand.
+        The raw bytes stay in `node_block_extrinsic`, referenced by the same primary key.
+        """
+        extrinsic_hash = blake2b(node_extrinsic.length + node_extrinsic.data, digest_size=32).digest()
+
+        extrinsic = CodecBlockExtrinsic(
+            block_hash=node_extrinsic.block_hash,
+            block_number=node_extrinsic.block_number,
+            extrinsic_idx=node_extrinsic.extrinsic_idx,
+            scale_type='Extrinsic',
+            call_module=call_module,
+            call_name=call_function,
+            signed=node_extrinsic.data[0] & 128 == 128,
+            data={
+                'extrinsic_hash': f'0x{extrinsic_hash.hex()}',
+                'extrinsic_length': len(node_extrinsic.data),
+                'call': {
+                    'call_index': f'0x{call_index.hex()}',
+                    'call_function': call_function,
+                    'call_module': call_module
+                }
+            },
+            complete=False
+        )
+        extrinsic.save(self.session)
+
+        deferred_decode = CodecDeferredDecode(
+            item_type='extrinsic',
+            block_hash=node_extrinsic.block_hash,
+            item_idx=node_extrinsic.extrinsic_idx,
+            block_number=node_extrinsic.block_number
+        )
+        deferred_decode.save(self.session)
+
+        self.log(f'Deferred decoding of extrinsic {node_extrinsic.block_number}-{node_extrinsic.extrinsic_idx} '
+                 f'({call_module}.{call_function})', 2)
+
+    def decode_deferred_extrinsic(self, codec_extrinsic: CodecBlockExtrinsic):
+        """
+        Replaces the call header of a deferred extrinsic with its fully decoded value
+        """
+        node_extrinsic = NodeBlockExtrinsic.query(self.session).get(
+            (codec_extrinsic.block_hash, codec_extrinsic.extrinsic_idx)
+        )
+
+        CodecDeferredDecode.query(self.session).filter_by(
+            item_type='extrinsic', block_hash=codec_extrinsic.block_hash, item_idx=codec_extrinsic.extrinsic_idx
+        ).delete()
+        self.session.delete(codec_extrinsic)
+        self.session.flush()
+
+        self.decode_extrinsic(node_extrinsic)
+
+    def get_deferred_extrinsics(self, block_number: int = None, limit: int = None) -> list:
+        """
+        Retrieves the decoded records of extrinsics of which decoding is deferred, oldest first
+        """
+        deferred_extrinsics = CodecBlockExtrinsic.query(self.session).join(CodecDeferredDecode, and_(
+            CodecDeferredDecode.item_type == 'extrinsic',
+            CodecDeferredDecode.block_hash == CodecBlockExtrinsic.block_hash,
+            CodecDeferredDecode.item_idx == CodecBlockExtrinsic.extrinsic_idx
+        ))
+
+        if block_number is not None:
+            deferred_extrinsics = deferred_extrinsics.filter(CodecDeferredDecode.block_number == block_number)
+
+        return deferred_extrinsics.order_by(
+            CodecDeferredDecode.block_number, CodecDeferredDecode.item_idx
+        ).limit(limit).all()
+
+    def is_decode_deferred_item(self, item_type: str, codec_item, item_idx: int = 0, storage_key: bytes = b'') -> bool:
+        """
+        Determines if decoding of given decoded record is deferred; only incomplete records can be deferred
+        """
+        if codec_item.complete:
+            return False
+
+        return CodecDeferredDecode.query(self.session).get(
+            (item_type, codec_item.block_hash, item_idx, storage_key)
+        ) is not None
+
+    def defer_storage_item(self, node_storage):
+        """
+        Stores only the storage function of the storage item; the value is decoded on first read by `get_storage_value`
+        """
+        codec_block_storage = CodecBlockStorage(
+            block_hash=node_storage.block_hash,
+            block_number=node_storage.block_number,
+            storage_key=node_storage.storage_key,
+            storage_module=node_storage.storage_module,
+            storage_name=node_storage.storage_name,
+            complete=False
+        )
+        codec_block_storage.save(self.session)
+
+        deferred_decode = CodecDeferredDecode(
+            item_type='storage',
+            block_hash=node_storage.block_hash,
+            storage_key=node_storage.storage_key,
+            block_number=node_storage.block_number
+        )
+        deferred_decode.save(self.session)
+
+    def get_extrinsic_value(self, codec_extrinsic: CodecBlockExtrinsic) -> dict:
+        """
+        Decoding accessor of extrinsics: deferred extrinsics are decoded on read, other extrinsics return their stored
+        value. The caller commits the decode cache.
+        """
+        if not self.is_decode_deferred_item('extrinsic', codec_extrinsic, item_idx=codec_extrinsic.extrinsic_idx):
+            return codec_extrinsic.data
+
+        def decode_extrinsic_value():
+            node_extrinsic = NodeBlockExtrinsic.query(self.session).get(
+                (codec_extrinsic.block_hash, codec_extrinsic.extrinsic_idx)
+            )
+            self.db_substrate.init_runtime(block_hash=f'0x{codec_extrinsic.block_hash.hex()}')
+            return 'Extrinsic', self.db_substrate.decode_scale('Extrinsic', node_extrinsic.length + node_extrinsic.data)
+
+        return self.read_decode_cache(
+            'extrinsic', codec_extrinsic, decode_extrinsic_value, item_idx=codec_extrinsic.extrinsic_idx
+        )
+
+    def get_storage_value(self, codec_storage: CodecBlockStorage):
+        """
+        Decoding accessor of storage items: deferred items are decoded on read, other items return their stored
+        value. The caller commits the decode cache.
+        """
+        if not self.is_decode_deferred_item('storage', codec_storage, storage_key=codec_storage.storage_key):
+            return codec_storage.data
+
+        def decode_storage_value():
+            node_storage = NodeBlockStorage.query(self.session).get((codec_storage.block_hash, codec_storage.storage_key))
+            self.db_substrate.init_runtime(block_hash=f'0x{codec_storage.block_hash.hex()}')
+            return self.db_substrate.decode_storage_value(
+                codec_storage.storage_module, codec_storage.storage_name, node_storage.data
+            )
+
+        return self.read_decode_cache(
+            'storage', codec_storage, decode_storage_value, storage_key=codec_storage.storage_key
+        )
+
+    def read_decode_cache(self, item_type: str, codec_item, decode_item, item_idx: int = 0, storage_key: bytes = b''):
+        """
+        Returns the value of a deferred item from the decode cache table, or decodes it with `decode_item()` and adds
+        it to the cache. The cache is trimmed to `LAZY_DECODE_CACHE_SIZE` by the `Cron` job
+        """
+        if not settings.LAZY_DECODE_CACHE_SIZE:
+            return decode_item()[1]
+
+        decode_cache = CodecDecodeCache.query(self.session).get(
+            (item_type, codec_item.block_hash, item_idx, storage_key)
+        )
+
+        if decode_cache is not None:
+            decode_cache.last_read = datetime.now(timezone.utc)
+            decode_cache.save(self.session)
+            return decode_cache.data
+
+        scale_type, data = decode_item()
+
+        decode_cache = CodecDecodeCache(
+            item_type=item_type,
+            block_hash=codec_item.block_hash,
+            item_idx=item_idx,
+            storage_key=storage_key,
+            block_number=codec_item.block_number,
+            scale_type=scale_type,
+            data=data,
+            last_read=datetime.now(timezone.utc)
+        )
+
+        # Another reader can add the same item concurrently, in which case its cached value is kept
+        savepoint = self.session.begin_nested()
+
+        try:
+            decode_cache.save(self.session)
+            savepoint.commit()
+        except IntegrityError:
+            savepoint.rollback()
+            self.log(f'Decode cache of {item_type} #{codec_item.block_number} already added by another reader', 2)
+
+        return data
+
+    def get_decode_memo_key(self, node_storage):
+        """
+        Key of the decode memo for given storage item: the runtime, storage function and hash of the raw value.
+        Events are excluded, as their decoded value is altered after decoding
+        :return: tuple or None when the item should not be memoized
+        """
+        if node_storage.data is None or node_storage.storage_key == self.harvester.event_storage_key:
+            return None
+
+        return (
+            self.db_substrate.get_block_spec_version(f'0x{node_storage.block_hash.hex()}'),
+            node_storage.storage_module,
+            node_storage.storage_name,
+            blake2b(node_storage.data, digest_size=16).digest()
+        )
+
+    def pop_decode_memo_stats(self) -> tuple:
+        memo_stats = (self.decode_memo_hits, self.decode_memo_misses)
+        self.decode_memo_hits = 0
+        self.decode_memo_misses = 0
+        return memo_stats
+
+    def report_decode_memo_stats(self, memo_hits: int, memo_misses: int):
+        self.harvester.prom_decode_memo_hits.inc(memo_hits)
+        self.harvester.prom_decode_memo_misses.inc(memo_misses)
+
+        if memo_hits + memo_misses > 0:
+            self.log(f'Decode memo hit rate {memo_hits / (memo_hits + memo_misses):.1%}', 2)
+
+    def read_block_window(self, model, block_from: int, block_to: int, index_column):
+        """
+        Streams the raw rows of given table for a window of blocks with one server-side cursor query, ordered by block
+        and index. Rows are returned as lightweight named tuples instead of ORM objects, grouped per block.
+
+        A separate connection is used, so commits of the decoded records do not interfere with the open cursor.
+        :return: generator of (block_number, list of rows)
+        """
+        query = select(model.__table__).where(
+            model.block_number >= block_from, model.block_number <= block_to
+        ).order_by(model.block_number, index_column)
+
+        with self.harvester.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(query)
+
+            for block_number, rows in groupby(result, key=lambda row: row.block_number):
+                yield block_number, list(rows)
+
+    def decode_storage_snapshots(self):
+        with GracefulInterruptHandler() as interrupt_handler:
+
+            snapshots = NodeBlockStorageSnapshot.query(self.session).filter_by(
+                decoded=False, decode_error=None
+            ).order_by(NodeBlockStorageSnapshot.block_number)
+
+            for snapshot in snapshots.limit(self.yield_per).all():
+                self.decode_storage_snapshot(snapshot)
+
+                if interrupt_handler.interrupted:
+                    self.log("🛑 Warm shutdown initiated", 1)
+                    raise ShutdownException()
+
     def decode_extrinsic(self, node_block_extrinsic: NodeBlockExtrinsic):
         self.db_substrate.init_runtime(block_hash=f'0x{node_block_extrinsic.block_hash.hex()}')
 
@@ -922,21 +1940,43 @@ class ScaleDecode(Job):
             scale_type='Extrinsic',
             complete=False
         )
+
+        failure_key = None
+
+        if self.harvester.decode_failure_cache.has_failures():
+            failure_key = self.get_extrinsic_failure_key(node_block_extrinsic)
+
+            if self.harvester.decode_failure_cache.is_undecodable(self.db_substrate.runtime_version, failure_key):
+                self.log(f'Skipped extrinsic {node_block_extrinsic.block_number}-{node_block_extrinsic.extrinsic_idx} '
+                         f'of known undecodable type "{failure_key}"', 2)
+                extrinsic.retry = True
+                extrinsic.save(self.session)
+                self.add_decode_failure(
+                    'extrinsic', node_block_extrinsic, UndecodableTypeException(f'Known undecodable type "{failure_key}"'),
+                    type_key=failure_key, spec_version=self.db_substrate.runtime_version
+                )
+                return
+
         try:
-            scale_extrinsic = self.db_substrate.runtime_config.create_scale_object(
-                "Extrinsic",
-                data=ScaleBytes(node_block_extrinsic.length + node_block_extrinsic.data),
-                metadata=self.db_substrate.metadata
+            extrinsic_value = self.db_substrate.decode_scale(
+                "Extrinsic", node_block_extrinsic.length + node_block_extrinsic.data
             )
-            scale_extrinsic.decode()
+
+            if failure_key:
+                self.harvester.decode_failure_cache.add_success(self.db_substrate.runtime_version, failure_key)
+
+            if not self.decode_filter.is_included(
+                'calls', extrinsic_value['call']['call_module'], extrinsic_value['call']['call_function']
+            ):
+                return
 
             # Workaround put MultiAddress as address
 
-            extrinsic.data = scale_extrinsic.value
-            extrinsic.call_module = scale_extrinsic.value['call']['call_module']
-            extrinsic.call_name = scale_extrinsic.value['call']['call_function']
+            extrinsic.data = extrinsic_value
+            extrinsic.call_module = extrinsic_value['call']['call_module']
+            extrinsic.call_name = extrinsic_value['call']['call_function']
             extrinsic.complete = True
-            extrinsic.signed = 'signature' in scale_extrinsic.value
+            extrinsic.signed = 'signature' in extrinsic_value
 
         except Exception as e:
             self.log('⚠️  Failed to decode extrinsic {}-{} ({})'.format(
@@ -944,6 +1984,12 @@ class ScaleDecode(Job):
             )
             extrinsic.retry = True
 
+            failure_key = failure_key or self.get_extrinsic_failure_key(node_block_extrinsic)
+            self.harvester.decode_failure_cache.add_failure(self.db_substrate.runtime_version, failure_key)
+            self.add_decode_failure(
+                'extrinsic', node_block_extrinsic, e, type_key=failure_key, spec_version=self.db_substrate.runtime_version
+            )
+
         extrinsic.save(self.session)
 
     def decode_log_item(self, node_log_item: NodeBlockHeaderDigestLog):
@@ -956,20 +2002,31 @@ class ScaleDecode(Job):
             scale_type='sp_runtime::generic::digest::DigestItem',
             complete=False
         )
-        try:
-            scale_log_item = self.db_substrate.runtime_config.create_scale_object(
-                type_string='sp_runtime::generic::digest::DigestItem',
-                data=ScaleBytes(node_log_item.data),
-                metadata=self.db_substrate.metadata
+
+        failure_key = f'log:DigestItem.0x{node_log_item.data[:1].hex()}'
+
+        if self.harvester.decode_failure_cache.is_undecodable(self.db_substrate.runtime_version, failure_key):
+            log_item.retry = True
+            log_item.save(self.session)
+            self.add_decode_failure(
+                'log', node_log_item, UndecodableTypeException(f'Known undecodable type "{failure_key}"'),
+                type_key=failure_key, spec_version=self.db_substrate.runtime_version
             )
+            return
 
-            log_item.data = scale_log_item.decode()
+        try:
+            log_item.data = self.db_substrate.decode_scale('sp_runtime::generic::digest::DigestItem', node_log_item.data)
             log_item.complete = True
+            self.harvester.decode_failure_cache.add_success(self.db_substrate.runtime_version, failure_key)
         except Exception as e:
             self.log('⚠️  Failed to decode log item {}-{} ({})'.format(
                 node_log_item.block_number, node_log_item.log_idx, e),
             )
             log_item.retry = True
+            self.harvester.decode_failure_cache.add_failure(self.db_substrate.runtime_version, failure_key)
+            self.add_decode_failure(
+                'log', node_log_item, e, type_key=failure_key, spec_version=self.db_substrate.runtime_version
+            )
 
         log_item.save(self.session)
 
@@ -982,17 +2039,49 @@ class ScaleDecode(Job):
             storage_name=node_storage.storage_name
         )
 
-        try:
-            decoded_storage_entry = self.db_substrate.query(
-                module=node_storage.storage_module,
-                storage_function=node_storage.storage_name,
-                raw_storage_key=node_storage.storage_key,
-                block_hash=f'0x{node_storage.block_hash.hex()}'
+        spec_version = self.db_substrate.get_block_spec_version(f'0x{node_storage.block_hash.hex()}')
+        failure_key = f'storage:{node_storage.storage_module}.{node_storage.storage_name}'
+
+        if self.harvester.decode_failure_cache.is_undecodable(spec_version, failure_key):
+            codec_block_storage.complete = False
+            codec_block_storage.retry = True
+            codec_block_storage.save(self.session)
+            self.add_decode_failure(
+                'storage', node_storage, UndecodableTypeException(f'Known undecodable type "{failure_key}"'),
+                type_key=failure_key, spec_version=spec_version
             )
-            if decoded_storage_entry:
-                codec_block_storage.data = decoded_storage_entry.value
-                codec_block_storage.scale_type = decoded_storage_entry.type_string or \
-                    decoded_storage_entry.__class__.__name__
+            return
+
+        try:
+            memo_key = self.get_decode_memo_key(node_storage)
+
+            if memo_key and memo_key in self.decode_memo:
+                self.decode_memo.move_to_end(memo_key)
+                codec_block_storage.data, codec_block_storage.scale_type = self.decode_memo[memo_key]
+                self.decode_memo_hits += 1
+            elif (node_storage.block_hash, node_storage.storage_key) in self.event_batch_values:
+                scale_type, value = self.event_batch_values.pop((node_storage.block_hash, node_storage.storage_key))
+
+                if isinstance(value, Exception):
+                    # Failed in the batch, not decoded again
+                    raise value
+
+                codec_block_storage.scale_type, codec_block_storage.data = scale_type, value
+            else:
+                self.db_substrate.init_runtime(block_hash=f'0x{node_storage.block_hash.hex()}')
+
+                codec_block_storage.scale_type, codec_block_storage.data = self.db_substrate.decode_storage_value(
+                    node_storage.storage_module, node_storage.storage_name, node_storage.data
+                )
+
+                if memo_key:
+                    self.decode_memo_misses += 1
+                    self.decode_memo[memo_key] = (codec_block_storage.data, codec_block_storage.scale_type)
+
+                    if len(self.decode_memo) > settings.DECODE_MEMO_SIZE:
+                        self.decode_memo.popitem(last=False)
+
+                self.harvester.decode_failure_cache.add_success(spec_version, failure_key)
 
             codec_block_storage.complete = True
 
@@ -1005,6 +2094,9 @@ class ScaleDecode(Job):
 
                     event_data['event_index'] = f"0x{event_data['event_index']}"
 
+                    if not self.decode_filter.is_included('events', event_data['module_id'], event_data['event_id']):
+                        continue
+
                     codec_event = CodecBlockEvent(
                         block_hash=codec_block_storage.block_hash,
                         block_number=codec_block_storage.block_number,
@@ -1019,6 +2111,14 @@ class ScaleDecode(Job):
 
                     codec_event.save(self.session)
 
+                if self.storage_cron_events is not None:
+                    self.storage_cron_events.append((node_storage.block_number, [
+                        {'module_id': event_data['module_id'], 'event_id': event_data['event_id']}
+                        for event_data in codec_block_storage.data
+                    ]))
+                else:
+                    self.process_storage_cron_events(node_storage.block_number, codec_block_storage.data)
+
                 self.log(f'Decoded events for #{node_storage.block_number}')
 
         except Exception as e:
@@ -1029,10 +2129,129 @@ class ScaleDecode(Job):
             ))
             codec_block_storage.complete = False
             codec_block_storage.retry = True
+            self.harvester.decode_failure_cache.add_failure(spec_version, failure_key)
+            self.add_decode_failure('storage', node_storage, e, type_key=failure_key, spec_version=spec_version)
 
         codec_block_storage.save(self.session)
+
+    def decode_storage_snapshot(self, snapshot: NodeBlockStorageSnapshot):
+        try:
+            self.db_substrate.init_runtime(block_hash=f'0x{snapshot.block_hash.hex()}')
+
+            value_scale_type = self.db_substrate.get_storage_value_type(
+                snapshot.storage_module, snapshot.storage_name
+            )[0]
+
+            table = read_storage_snapshot(snapshot.file_path, columns=['storage_key', 'data'])
+        except Exception as e:
+            # Mark the snapshot as failed, so it does not block decoding of the snapshots after it
+            self.log(f'⚠️  Failed to decode snapshot "{snapshot.storage_module}.{snapshot.storage_name}" '
+                     f'for #{snapshot.block_number} ({e})')
+            snapshot.decode_error = str(e)[:1024]
+            snapshot.save(self.session)
+            self.session.commit()
+            return
+
+        storage_keys = table.column('storage_key').to_pylist()
+        storage_data = table.column('data').to_pylist()
+
+        decoded = []
+        failed_count = 0
+
+        for data in storage_data:
+            if data is None:
+                decoded.append(None)
+                continue
+
+            try:
+                decoded.append(json.dumps(
+                    self.db_substrate.decode_storage_value(snapshot.storage_module, snapshot.storage_name, data)[1]
+                ))
+            except Exception:
+                decoded.append(None)
+                failed_count += 1
+
+        write_storage_snapshot(snapshot.file_path, storage_keys, storage_data, decoded)
+
+        if failed_count > 0:
+            self.log(f'⚠️  Failed to decode {failed_count} entries of snapshot '
+                     f'"{snapshot.storage_module}.{snapshot.storage_name}" for #{snapshot.block_number}')
+
+        snapshot.scale_type = value_scale_type
+        snapshot.decoded = True
+        snapshot.save(self.session)
         self.session.commit()
 
+        self.log(f'Decoded snapshot {snapshot.storage_module}.{snapshot.storage_name} for #{snapshot.block_number}')
+
+
+decode_worker_job = None
+
+
+def init_decode_worker(verbose_level, block_start, block_end):
+    """
+    Initializer of decoder pool processes; interrupts are handled by the parent process
+    """
+    global decode_worker_job
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    decode_worker_job = ScaleDecode(
+        harvester=WorkerHarvester(settings, verbose_level=verbose_level, block_start=block_start, block_end=block_end)
+    )
+
+
+def decode_block_range_worker(block_range: tuple) -> tuple:
+    decode_worker_job.storage_cron_events = []
+    decode_worker_job.decode_block_range(*block_range)
+    return block_range + decode_worker_job.pop_decode_memo_stats() + (
+        decode_worker_job.harvester.decode_failure_cache.pop_failure_stats(),
+        decode_worker_job.harvester.db_substrate.pop_data_cache_stats(),
+        decode_worker_job.storage_cron_events
+    )
+
+
+class DeferredDecode(ScaleDecode):
+    """
+    Lower priority lane that fully decodes extrinsics of which decoding was deferred by `ScaleDecode`
+    """
+
+    icon = '🐢'
+
+    def start(self):
+        if settings.LAZY_DECODE:
+            # Deferred items are decoded when they are read instead
+            return
+
+        with GracefulInterruptHandler() as interrupt_handler:
+
+            deferred_extrinsics = self.get_deferred_extrinsics(limit=settings.DEFERRED_DECODE_LIMIT)
+
+            if not deferred_extrinsics:
+                return
+
+            self.db_substrate.load_block_hash_runtimes(
+                list({codec_extrinsic.block_hash for codec_extrinsic in deferred_extrinsics})
+            )
+
+            for codec_extrinsic in deferred_extrinsics:
+                self.decode_deferred_extrinsic(codec_extrinsic)
+
+                self.log(f'Decoded deferred extrinsic {codec_extrinsic.block_number}-{codec_extrinsic.extrinsic_idx}', 2)
+
+                if interrupt_handler.interrupted:
+                    break
+
+            # The batch is committed as a whole, an interrupted batch is decoded again in the next cycle
+            if interrupt_handler.interrupted:
+                self.session.rollback()
+                self.log("🛑 Warm shutdown initiated", 1)
+                raise ShutdownException()
+
+            self.session.commit()
+
+            self.log(f'Decoded {len(deferred_extrinsics)} deferred extrinsics')
+
 
 class EventIndex(Job):
 
@@ -1197,6 +2416,10 @@ class StorageTask(Job):
         if task:
             self.log(f'Processing "{task.description}"')
 
+            if task.cron_id is not None:
+                self.process_cron_task(task)
+                return
+
             # Loop through block range
             if 'block_ids' in task.blocks:
                 block_ids = task.blocks['block_ids']
@@ -1207,9 +2430,9 @@ class StorageTask(Job):
 
             # Determine storage key(s) according to pallet/storage function
             if not task.storage_key and not task.storage_key_prefix:
-                block_hash = self.substrate.get_block_hash(block_ids[0])
-                storage_function = self.substrate.get_metadata_storage_function(
-                    task.storage_pallet, task.storage_name, block_hash=block_hash
+
+                storage_hash, storage_function = self.get_storage_function(
+                    task.storage_pallet, task.storage_name, block_ids[0]
                 )
 
                 if not storage_function:
@@ -1220,13 +2443,6 @@ class StorageTask(Job):
                     self.session.commit()
                     return
 
-
-                storage_hash = self.substrate.generate_storage_hash(
-                    storage_module=task.storage_pallet,
-                    storage_function=task.storage_name
-                )
-                storage_hash = bytes.fromhex(storage_hash[2:])
-
                 if 'Plain' in storage_function.type:
                     task.storage_key = storage_hash
                 else:
@@ -1306,12 +2522,97 @@ class StorageTask(Job):
             task.save(self.session)
             self.session.commit()
 
+    def process_cron_task(self, task):
+        """
+        Captures the storage of an event-triggered storage cron entry at the block of the event the same way as an
+        interval cron entry, so the capture mode and sink of the cron entry apply
+        """
+        cron_entry = HarvesterStorageCron.query(self.session).get(task.cron_id)
+        block_runtime = NodeBlockRuntime.query(self.session).filter_by(block_number=task.block_number).first()
+
+        if not cron_entry:
+            task.description = "Error: Storage cron not found"
+            self.log(task.description)
+        elif not block_runtime:
+            task.description = "Error: Runtime of block not found"
+            self.log(task.description)
+        else:
+            try:
+                RetrieveRuntimeState(harvester=self.harvester).store_cron_entries_storage(
+                    [cron_entry], block_runtime.hash, block_runtime.block_number, block_runtime.spec_name,
+                    block_runtime.spec_version, track_keys=False
+                )
+                self.decode_cron_task_storage(cron_entry, block_runtime.hash)
+                self.session.commit()
+                self.log(f'Captured storage of cron {cron_entry.id} for block #{task.block_number}')
+            except IntegrityError:
+                self.session.rollback()
+                task = HarvesterStorageTask.query(self.session).get(task.id)
+                self.log(f'Skipped existing storage of cron {task.cron_id} for block #{task.block_number}')
+
+        task.complete = True
+        task.save(self.session)
+        self.session.commit()
+
+    def decode_cron_task_storage(self, cron_entry, block_hash: bytes):
+        """
+        Decodes the storage items captured for an event-triggered cron entry. The block of the event is already passed
+        by the decoder watermark, so `ScaleDecode` does not revisit it. Snapshot files are decoded by `ScaleDecode`.
+        """
+        self.session.flush()
+
+        node_storage_items = NodeBlockStorage.query(self.session).filter_by(
+            block_hash=block_hash, storage_module=cron_entry.storage_module, storage_name=cron_entry.storage_name
+        ).filter(~exists().where(and_(
+            CodecBlockStorage.block_hash == NodeBlockStorage.block_hash,
+            CodecBlockStorage.storage_key == NodeBlockStorage.storage_key
+        ))).all()
+
+        if not node_storage_items:
+            return
+
+        decode_job = ScaleDecode(harvester=self.harvester)
+
+        for node_storage in node_storage_items:
+            decode_job.decode_storage_item(node_storage)
+
     def get_next_storage_key_page(self, prefix: bytes, start_key: bytes, block_hash: str) -> list:
         response = self.harvester.rpc_call(
             method="state_getKeysPaged", params=[f'0x{prefix.hex()}', 100, f'0x{start_key.hex()}', block_hash]
         )
         return response.get('result') or []
 
+    def get_storage_function(self, pallet: str, storage_name: str, block_number: int) -> tuple:
+        """
+        Resolves the storage function and key prefix at given block from the local runtime tables, only falls back
+        to the node when the runtime of the block is not harvested
+        :return: tuple of (storage key prefix, storage function metadata)
+        """
+        block_runtime = NodeBlockRuntime.query(self.session).filter_by(block_number=block_number).first()
+
+        if block_runtime:
+            spec_name, spec_version = block_runtime.spec_name, block_runtime.spec_version
+        else:
+            runtime_info = self.substrate.get_block_runtime_version(self.substrate.get_block_hash(block_number))
+            spec_name, spec_version = runtime_info['specName'], runtime_info['specVersion']
+
+        storage_hash, storage_function = self.db_substrate.get_local_storage_function(
+            spec_name, spec_version, pallet, storage_name
+        )
+
+        if storage_function:
+            return storage_hash, storage_function
+
+        block_hash = self.substrate.get_block_hash(block_number)
+        storage_function = self.substrate.get_metadata_storage_function(pallet, storage_name, block_hash=block_hash)
+
+        if not storage_function:
+            return None, None
+
+        storage_hash = self.substrate.generate_storage_hash(storage_module=pallet, storage_function=storage_name)
+
+        return bytes.fromhex(storage_hash[2:]), storage_function
+
     def decode_storage_item(self, node_storage, codec_block_storage):
 
         decoded_storage_entry = self.db_substrate.query(
@@ -22,7 +22,7 @@ from sqlalchemy.sql import expression
 from app.models.base import BaseModel
 import sqlalchemy as sa
 
-from app.models.field_types import UTCDateTime
+from app.models.field_types import UTCDateTime, SerializedData
 
 
 class CodecBlockExtrinsic(BaseModel):
@@ -39,10 +39,10 @@ class CodecBlockExtrinsic(BaseModel):
     call_name = sa.Column(sa.String(255), nullable=True, index=True)
     signed = sa.Column(sa.SmallInteger(), index=True)
 
-    data = sa.Column(sa.JSON())
+    data = sa.Column(SerializedData('codec_block_extrinsic'))
 
-    complete = sa.Column(sa.Boolean(), nullable=False, default=False, index=True)
-    retry = sa.Column(sa.Boolean(), nullable=False, default=False, index=True, server_default=expression.false())
+    complete = sa.Column(sa.Boolean(), nullable=False, default=False)
+    retry = sa.Column(sa.Boolean(), nullable=False, default=False, server_default=expression.false())
 
     def __repr__(self):
         return "<{}(block_hash={}, extrinsic_idx={})>".format(
@@ -109,10 +109,10 @@ class CodecBlockEvent(BaseModel):
     event_name = sa.Column(sa.String(255), nullable=True, index=True)
     extrinsic_idx = sa.Column(sa.Integer(), index=True)
 
-    data = sa.Column(sa.JSON())
+    data = sa.Column(SerializedData('codec_block_event'))
 
-    complete = sa.Column(sa.Boolean(), nullable=False, default=False, index=True)
-    retry = sa.Column(sa.Boolean(), nullable=False, default=False, index=True, server_default=expression.false())
+    complete = sa.Column(sa.Boolean(), nullable=False, default=False)
+    retry = sa.Column(sa.Boolean(), nullable=False, default=False, server_default=expression.false())
 
     def __repr__(self):
         return "<{}(block_hash={}, event_idx={})>".format(
@@ -129,10 +129,10 @@ class CodecBlockHeaderDigestLog(BaseModel):
     block_number = sa.Column(sa.Integer(), nullable=False, index=True)
 
     scale_type = sa.Column(sa.String(255))
-    data = sa.Column(sa.JSON())
+    data = sa.Column(SerializedData('codec_block_header_digest_log'))
 
-    complete = sa.Column(sa.Boolean(), nullable=False, default=False, index=True)
-    retry = sa.Column(sa.Boolean(), nullable=False, default=False, index=True, server_default=expression.false())
+    complete = sa.Column(sa.Boolean(), nullable=False, default=False)
+    retry = sa.Column(sa.Boolean(), nullable=False, default=False, server_default=expression.false())
 
     def __repr__(self):
         return "<{}(block_hash={}, log_idx={})>".format(self.__class__.__name__, self.block_hash.hex(), self.log_idx)
@@ -151,10 +151,10 @@ class CodecBlockStorage(BaseModel):
     storage_module = sa.Column(sa.String(255), nullable=True, index=True)
     storage_name = sa.Column(sa.String(255), nullable=True, index=True)
 
-    data = sa.Column(sa.JSON())
+    data = sa.Column(SerializedData('codec_block_storage'))
 
-    complete = sa.Column(sa.Boolean(), nullable=False, default=False, index=True)
-    retry = sa.Column(sa.Boolean(), nullable=False, default=False, index=True, server_default=expression.false())
+    complete = sa.Column(sa.Boolean(), nullable=False, default=False)
+    retry = sa.Column(sa.Boolean(), nullable=False, default=False, server_default=expression.false())
 
     def __repr__(self):
         return "<{}(storage_key={}, block_hash={})>".format(
@@ -162,6 +162,67 @@ class CodecBlockStorage(BaseModel):
         )
 
 
+class CodecDecodeFailure(BaseModel):
+    __tablename__ = 'codec_decode_failure'
+
+    item_type = sa.Column(sa.String(16), primary_key=True, nullable=False)
+    block_hash = sa.Column(sa.types.BINARY(32), primary_key=True, nullable=False)
+    item_idx = sa.Column(sa.Integer(), primary_key=True, nullable=False, autoincrement=False, default=0)
+    storage_key = sa.Column(sa.VARBINARY(128), primary_key=True, nullable=False, default=b'')
+
+    block_number = sa.Column(sa.Integer(), nullable=False, index=True)
+    spec_version = sa.Column(sa.Integer(), nullable=True)
+    type_key = sa.Column(sa.String(255), nullable=True, index=True)
+
+    error_class = sa.Column(sa.String(255), nullable=True, index=True)
+    error_message = sa.Column(sa.Text(), nullable=True)
+
+    attempts = sa.Column(sa.Integer(), nullable=False, default=1)
+    next_attempt = sa.Column(UTCDateTime(timezone=True), nullable=True, index=True)
+
+    def __repr__(self):
+        return "<{}(item_type={}, block_hash={}, item_idx={}, storage_key={})>".format(
+            self.__class__.__name__, self.item_type, self.block_hash.hex(), self.item_idx, self.storage_key.hex()
+        )
+
+
+class CodecDeferredDecode(BaseModel):
+    __tablename__ = 'codec_deferred_decode'
+
+    item_type = sa.Column(sa.String(16), primary_key=True, nullable=False)
+    block_hash = sa.Column(sa.types.BINARY(32), primary_key=True, nullable=False)
+    item_idx = sa.Column(sa.Integer(), primary_key=True, nullable=False, autoincrement=False, default=0)
+    storage_key = sa.Column(sa.VARBINARY(128), primary_key=True, nullable=False, default=b'')
+
+    block_number = sa.Column(sa.Integer(), nullable=False, index=True)
+
+    def __repr__(self):
+        return "<{}(item_type={}, block_hash={}, item_idx={}, storage_key={})>".format(
+            self.__class__.__name__, self.item_type, self.block_hash.hex(), self.item_idx, self.storage_key.hex()
+        )
+
+
+class CodecDecodeCache(BaseModel):
+    __tablename__ = 'codec_decode_cache'
+
+    item_type = sa.Column(sa.String(16), primary_key=True, nullable=False)
+    block_hash = sa.Column(sa.types.BINARY(32), primary_key=True, nullable=False)
+    item_idx = sa.Column(sa.Integer(), primary_key=True, nullable=False, autoincrement=False, default=0)
+    storage_key = sa.Column(sa.VARBINARY(128), primary_key=True, nullable=False, default=b'')
+
+    block_number = sa.Column(sa.Integer(), nullable=False, index=True)
+
+    scale_type = sa.Column(sa.String(255))
+    data = sa.Column(SerializedData('codec_decode_cache'))
+
+    last_read = sa.Column(UTCDateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self):
+        return "<{}(item_type={}, block_hash={}, item_idx={}, storage_key={})>".format(
+            self.__class__.__name__, self.item_type, self.block_hash.hex(), self.item_idx, self.storage_key.hex()
+        )
+
+
 class CodecMetadata(BaseModel):
     __tablename__ = 'codec_metadata'
 
@@ -169,7 +230,7 @@ class CodecMetadata(BaseModel):
     spec_version = sa.Column(sa.Integer(), nullable=False, primary_key=True, index=True)
 
     scale_type = sa.Column(sa.String(255))
-    data = sa.Column(sa.JSON())
+    data = sa.Column(SerializedData('codec_metadata'))
 
     complete = sa.Column(sa.Boolean(), nullable=False, default=False, index=True)
     retry = sa.Column(sa.Boolean(), nullable=False, default=False, index=True, server_default=expression.false())
@@ -22,6 +22,9 @@ from datetime import timezone
 import sqlalchemy as sa
 from sqlalchemy.dialects.mysql import INTEGER, NUMERIC, TINYINT
 
+from app import settings
+from app.serialization import dumps_data, loads_data, is_binary_format
+
 
 class UTCDateTime(sa.types.TypeDecorator):
 
@@ -39,6 +42,8 @@ class UTCDateTime(sa.types.TypeDecorator):
     def result_processor(self, dialect, coltype):
         """Return a processor that encodes hex values."""
         def process(value):
+            if value is None:
+                return
             return value.replace(tzinfo=timezone.utc)
         return process
 
@@ -90,3 +95,40 @@ class HashVarBinary(sa.types.VARBINARY):
         """Produce an adapted form of this type, given an impl class."""
         return HashVarBinary()
 
+
+class SerializedData(sa.types.TypeDecorator):
+    """
+    Data column of which the serialization format is configured per table in `settings.CODEC_DATA_SERIALIZATION`.
+    The default `json` format is a plain JSON column; `orjson` writes JSON text and the binary formats require a
+    LONGBLOB column, which is verified by `Harvester.check_data_serialization`. The stored format is detected on read,
+    so values written with any format stay readable after the setting changes. None is stored as NULL.
+    """
+
+    impl = sa.types.JSON
+
+    cache_ok = True
+
+    def __init__(self, table_name: str, *args, **kwargs):
+        self.table_name = table_name
+        super().__init__(*args, **kwargs)
+
+    @property
+    def serialization_format(self) -> str:
+        return settings.CODEC_DATA_SERIALIZATION.get(self.table_name, 'json')
+
+    def load_dialect_impl(self, dialect):
+        if self.serialization_format == 'json':
+            return dialect.type_descriptor(sa.types.JSON(none_as_null=True))
+        if is_binary_format(self.serialization_format):
+            return dialect.type_descriptor(sa.types.LargeBinary(length=(2**32)-1))
+        return dialect.type_descriptor(sa.types.Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or self.serialization_format == 'json':
+            return value
+        return dumps_data(value, self.serialization_format)
+
+    def result_processor(self, dialect, coltype):
+        # Raw column values are deserialized by their own format instead of the result processing of the column type
+        # of the configured format, e.g. a JSON column type cannot read binary frames
+        return loads_data
@@ -103,6 +103,28 @@ class NodeBlockStorage(BaseModel):
         )
 
 
+class NodeBlockStorageSnapshot(BaseModel):
+    __tablename__ = 'node_block_storage_snapshot'
+
+    block_hash = sa.Column(sa.types.BINARY(32), primary_key=True, nullable=False)
+    storage_module = sa.Column(sa.String(255), primary_key=True, nullable=False)
+    storage_name = sa.Column(sa.String(255), primary_key=True, nullable=False)
+
+    block_number = sa.Column(sa.Integer(), nullable=False, index=True)
+
+    file_path = sa.Column(sa.String(1024), nullable=False)
+    count_keys = sa.Column(sa.Integer(), nullable=False, server_default='0')
+    scale_type = sa.Column(sa.String(512), nullable=True)
+
+    decoded = sa.Column(sa.Boolean(), nullable=False, default=False, index=True)
+    decode_error = sa.Column(sa.Text(), nullable=True)
+
+    def __repr__(self):
+        return "<{}(block_number={}, storage_module={}, storage_name={})>".format(
+            self.__class__.__name__, self.block_number, self.storage_module, self.storage_name
+        )
+
+
 class NodeMetadata(BaseModel):
     __tablename__ = 'node_metadata'
 
@@ -165,13 +187,40 @@ class HarvesterStorageCron(BaseModel):
     storage_key = sa.Column(sa.VARBINARY(128))
     storage_key_prefix = sa.Column(sa.VARBINARY(128))
 
+    trigger_event_module = sa.Column(sa.String(255), nullable=True)
+    trigger_event_name = sa.Column(sa.String(255), nullable=True)
+
+    capture_mode = sa.Column(sa.String(32), nullable=True)
+
+    key_refresh_interval = sa.Column(sa.Integer(), nullable=True)
+    key_refresh_events = sa.Column(sa.JSON(), nullable=True)
+    key_refresh_block_number = sa.Column(sa.Integer(), nullable=True)
+
+    sink = sa.Column(sa.String(32), nullable=True)
+
     def __repr__(self):
         return f"<{self.__class__.__name__}(block_number_interval={self.block_number_interval})," \
                f" storage_module={self.storage_module}, storage_name={self.storage_name}>"
 
 
+class HarvesterStorageCronKey(BaseModel):
+    __tablename__ = 'harvester_storage_cron_key'
+
+    cron_id = sa.Column(sa.Integer(), primary_key=True, nullable=False, autoincrement=False)
+    storage_key = sa.Column(sa.VARBINARY(128), primary_key=True, nullable=False)
+
+    kind = sa.Column(sa.String(16), nullable=False, server_default='watchlist')
+    params = sa.Column(sa.JSON(), nullable=True)
+
+    def __repr__(self):
+        return "<{}(cron_id={}, storage_key={}, kind={})>".format(
+            self.__class__.__name__, self.cron_id, self.storage_key.hex(), self.kind
+        )
+
+
 class HarvesterStorageTask(BaseModel):
     __tablename__ = 'harvester_storage_task'
+    __table_args__ = (sa.Index('ix_harvester_storage_task_cron_block', 'cron_id', 'block_number', unique=True),)
 
     id = sa.Column(sa.Integer(), primary_key=True, autoincrement=True)
     description = sa.Column(sa.String(255), nullable=True)
@@ -183,5 +232,9 @@ class HarvesterStorageTask(BaseModel):
 
     blocks = sa.Column(sa.JSON(), nullable=True)
 
+    # Set for tasks scheduled by an event-triggered storage cron entry
+    cron_id = sa.Column(sa.Integer(), nullable=True)
+    block_number = sa.Column(sa.Integer(), nullable=True)
+
     complete = sa.Column(sa.Boolean(), nullable=True, default=False, index=True)
 
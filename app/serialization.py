@@ -0,0 +1,107 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import json
+import zlib
+
+import msgpack
+import orjson
+
+# Header byte of binary frames; JSON text never starts with these bytes, so legacy JSON values stay readable
+FRAME_JSON = 0x01
+FRAME_MSGPACK = 0x02
+FRAME_ZLIB = 0x80
+
+SERIALIZATION_FORMATS = ['json', 'orjson', 'json+zlib', 'msgpack', 'msgpack+zlib']
+
+
+def is_binary_format(name: str) -> bool:
+    return name not in ('json', 'orjson')
+
+
+def dumps_data(value, name: str = 'json'):
+    """
+    Serializes a decoded value with given format. The JSON formats return text for JSON columns, the other formats
+    return a binary frame that starts with a header byte identifying the encoding.
+
+    Integers that exceed 64 bits (e.g. u128 balances) are not supported by orjson and msgpack, those values fall back
+    to the stdlib JSON encoder.
+    :param value: decoded value
+    :param name: one of `SERIALIZATION_FORMATS`
+    :return: str or bytes
+    """
+    if name == 'json':
+        return json.dumps(value)
+
+    if name == 'orjson':
+        try:
+            return orjson.dumps(value).decode()
+        except TypeError:
+            return json.dumps(value)
+
+    if name not in SERIALIZATION_FORMATS:
+        raise ValueError(f'Unknown serialization format "{name}"')
+
+    frame = FRAME_JSON
+    payload = None
+
+    if name.startswith('msgpack'):
+        try:
+            payload = msgpack.packb(value, use_bin_type=True)
+            frame = FRAME_MSGPACK
+        except (OverflowError, TypeError):
+            pass
+
+    if payload is None:
+        payload = json.dumps(value, separators=(',', ':')).encode()
+
+    if name.endswith('+zlib'):
+        payload = zlib.compress(payload)
+        frame |= FRAME_ZLIB
+
+    return bytes([frame]) + payload
+
+
+def loads_data(data):
+    """
+    Deserializes a value stored by `dumps_data`, regardless of the format that was configured at the time of writing
+    """
+    if data is None:
+        return None
+
+    if type(data) is str:
+        return json.loads(data)
+
+    if not isinstance(data, (bytes, bytearray)):
+        # Scalar JSON values already converted by the driver, e.g. by the numeric affinity of JSON columns in SQLite
+        return data
+
+    frame = data[0]
+
+    if frame not in (FRAME_JSON, FRAME_MSGPACK, FRAME_JSON | FRAME_ZLIB, FRAME_MSGPACK | FRAME_ZLIB):
+        # JSON text in a binary column
+        return json.loads(data)
+
+    payload = data[1:]
+
+    if frame & FRAME_ZLIB:
+        payload = zlib.decompress(payload)
+
+    if frame & ~FRAME_ZLIB == FRAME_MSGPACK:
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+    return json.loads(payload)
@@ -60,6 +60,71 @@ if os.environ.get("INSTALLED_ETL_DATABASES"):
 else:
     INSTALLED_ETL_DATABASES = []
 
+DECODER_PROCESSES = int(os.environ.get("DECODER_PROCESSES", 1))
+
+RUNTIME_CACHE_SIZE = int(os.environ.get("RUNTIME_CACHE_SIZE", 10))
+
+# Headers, digest logs and block runtimes kept in memory by the database data source
+DATA_CACHE_SIZE = int(os.environ.get("DATA_CACHE_SIZE", 1000))
+
+DECODE_MEMO_SIZE = int(os.environ.get("DECODE_MEMO_SIZE", 10000))
+
+# Consecutive failures after which a type is skipped for a runtime until the harvester restarts, 0 disables
+DECODE_FAILURE_THRESHOLD = int(os.environ.get("DECODE_FAILURE_THRESHOLD", 3))
+
+# Delay in seconds before a failed item is decoded again, doubled after every failed attempt
+DECODE_RETRY_INTERVAL = int(os.environ.get("DECODE_RETRY_INTERVAL", 60))
+
+DECODE_RETRY_MAX_ATTEMPTS = int(os.environ.get("DECODE_RETRY_MAX_ATTEMPTS", 5))
+
+# Decode with plans compiled from the runtime metadata instead of the generic decoder (opt-in)
+ENABLE_DECODER_PLANS = bool(int(os.environ.get("ENABLE_DECODER_PLANS", 0)))
+
+ENABLE_EVENT_BATCH_DECODE = bool(int(os.environ.get("ENABLE_EVENT_BATCH_DECODE", 0)))
+
+# Decode filters per item kind ("calls", "events" or "storage"), entries are a pallet or "Pallet.Name", e.g.
+# {"calls": ["Balances", "Staking.bond"], "storage": ["System.Events"]}
+if os.environ.get("DECODE_INCLUDE") is not None:
+    DECODE_INCLUDE = json.loads(os.environ.get("DECODE_INCLUDE"))
+else:
+    DECODE_INCLUDE = {}
+
+if os.environ.get("DECODE_EXCLUDE") is not None:
+    DECODE_EXCLUDE = json.loads(os.environ.get("DECODE_EXCLUDE"))
+else:
+    DECODE_EXCLUDE = {}
+
+# Calls ("Pallet" or "Pallet.Name", e.g. "ParaInherent.enter") and extrinsic size in bytes (0 = disabled) of which the
+# full decode is deferred
+if os.environ.get("DEFERRED_DECODE_CALLS"):
+    DEFERRED_DECODE_CALLS = os.environ.get("DEFERRED_DECODE_CALLS").split(',')
+else:
+    DEFERRED_DECODE_CALLS = []
+
+DEFERRED_DECODE_SIZE = int(os.environ.get("DEFERRED_DECODE_SIZE", 0))
+
+# Lazy mode: the decoder only stores the call of extrinsics and the storage function of storage items (events are
+# still decoded); full values are decoded on first read, see `Harvester.get_decoded_extrinsic`
+LAZY_DECODE = bool(int(os.environ.get("LAZY_DECODE", 0)))
+
+# Values decoded on read that are kept in the `codec_decode_cache` table, least recently read first removed (0 = none)
+LAZY_DECODE_CACHE_SIZE = int(os.environ.get("LAZY_DECODE_CACHE_SIZE", 100000))
+
+# Deferred extrinsics decoded per cycle in one transaction; at least the decoder's 1000 blocks per cycle to keep up
+DEFERRED_DECODE_LIMIT = int(os.environ.get("DEFERRED_DECODE_LIMIT", 1000))
+
+# Serialization format of the `data` column per codec table, e.g. {"codec_block_event": "msgpack+zlib"}. The migrations
+# create JSON columns, which support json and orjson; binary formats require the column to be changed to LONGBLOB first,
+# which is checked at startup. Rows stay readable after changing the format. The ETL procedures only read JSON columns
+if os.environ.get("CODEC_DATA_SERIALIZATION") is not None:
+    CODEC_DATA_SERIALIZATION = json.loads(os.environ.get("CODEC_DATA_SERIALIZATION"))
+else:
+    CODEC_DATA_SERIALIZATION = {}
+
+STATE_PRUNING_WINDOW = int(os.environ.get("STATE_PRUNING_WINDOW", 256))
+
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", os.path.join(os.path.dirname(__file__), '..', 'snapshots'))
+
 if os.environ.get("BLOCK_START") is not None:
     BLOCK_START = int(os.environ.get("BLOCK_START"))
 else:
@@ -0,0 +1,57 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SNAPSHOT_SCHEMA = pa.schema([
+    ('storage_key', pa.binary()),
+    ('data', pa.binary()),
+    ('decoded', pa.string())
+])
+
+
+def get_snapshot_path(base_path: str, storage_module: str, storage_name: str, block_number: int) -> str:
+    return os.path.join(base_path, storage_module, storage_name, f'{block_number}.parquet')
+
+
+def write_storage_snapshot(path: str, storage_keys: list, data: list, decoded: list = None):
+    """
+    Writes a zstd compressed Parquet file with one row per storage key
+    :param path: file path of the snapshot
+    :param storage_keys: list of storage keys as bytes
+    :param data: list of raw SCALE encoded values, in the same order as `storage_keys`
+    :param decoded: optional list of JSON serialized decoded values, in the same order as `storage_keys`
+    :return:
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    table = pa.Table.from_arrays([
+        pa.array(storage_keys, type=pa.binary()),
+        pa.array(data, type=pa.binary()),
+        pa.array(decoded or [None] * len(storage_keys), type=pa.string())
+    ], schema=SNAPSHOT_SCHEMA)
+
+    # Write to temporary file first, so an interrupted write never leaves a truncated snapshot
+    pq.write_table(table, f'{path}.tmp', compression='zstd')
+    os.replace(f'{path}.tmp', path)
+
+
+def read_storage_snapshot(path: str, columns: list = None) -> pa.Table:
+    return pq.read_table(path, columns=columns)
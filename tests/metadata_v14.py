@@ -0,0 +1,148 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+"""
+Metadata V14 test fixture with the type layout of a substrate node runtime: events, calls, a storage function,
+extrinsics with signed extensions, digest items and the common primitive, composite, variant, sequence, array, tuple
+and compact types.
+"""
+from scalecodec.base import RuntimeConfigurationObject
+from scalecodec.type_registry import load_type_registry_preset
+
+types = {}
+
+
+def T(i, d, path=(), params=()):
+    types[i] = {'path': list(path), 'params': [{'name': n, 'type': t} for n, t in params], 'def': d, 'docs': []}
+
+
+def F(t, name=None, tn=None):
+    return {'name': name, 'type': t, 'typeName': tn, 'docs': []}
+
+
+def V(name, idx, fields=()):
+    return {'name': name, 'fields': list(fields), 'index': idx, 'docs': []}
+
+
+def comp(*fields):
+    return {'composite': {'fields': list(fields)}}
+
+
+def var(*variants):
+    return {'variant': {'variants': list(variants)}}
+
+
+T(0, {'primitive': 'u8'})
+T(1, {'primitive': 'u32'})
+T(2, {'primitive': 'u64'})
+T(3, {'primitive': 'u128'})
+T(4, {'sequence': {'type': 0}})
+T(5, {'array': {'len': 32, 'type': 0}})
+T(6, comp(F(5, tn='[u8; 32]')), path=['sp_core', 'crypto', 'AccountId32'])
+T(7, comp(F(5, tn='[u8; 32]')), path=['primitive_types', 'H256'])
+T(8, var(V('ApplyExtrinsic', 0, [F(1, tn='u32')]), V('Finalization', 1), V('Initialization', 2)), path=['frame_system', 'Phase'])
+T(9, var(V('Transfer', 2, [F(6, 'from', 'T::AccountId'), F(6, 'to', 'T::AccountId'), F(3, 'amount', 'T::Balance')]),
+         V('Deposit', 7, [F(6, 'who', 'T::AccountId'), F(3, 'amount', 'T::Balance')])),
+  path=['pallet_balances', 'pallet', 'Event'])
+T(10, var(V('ExtrinsicSuccess', 0, [F(11, 'dispatch_info', 'DispatchInfo')]), V('NewAccount', 3, [F(6, 'account', 'T::AccountId')]),
+          V('CodeUpdated', 4)),
+  path=['frame_system', 'pallet', 'Event'])
+T(11, comp(F(2, 'weight', 'Weight'), F(12, 'class', 'DispatchClass'), F(13, 'pays_fee', 'Pays')), path=['frame_support', 'dispatch', 'DispatchInfo'])
+T(12, var(V('Normal', 0), V('Operational', 1), V('Mandatory', 2)), path=['frame_support', 'dispatch', 'DispatchClass'])
+T(13, var(V('Yes', 0), V('No', 1)), path=['frame_support', 'dispatch', 'Pays'])
+T(14, var(V('System', 0, [F(10, tn='frame_system::Event<Runtime>')]), V('Balances', 5, [F(9, tn='pallet_balances::Event<Runtime>')])),
+  path=['node_runtime', 'RuntimeEvent'])
+T(15, {'sequence': {'type': 7}})
+T(16, comp(F(8, 'phase', 'Phase'), F(14, 'event', 'E'), F(15, 'topics', 'Vec<T>')), path=['frame_system', 'EventRecord'],
+  params=[('E', 14), ('T', 7)])
+T(17, {'sequence': {'type': 16}})
+T(18, {'compact': {'type': 3}})
+T(19, var(V('transfer', 0, [F(21, 'dest', 'AccountIdLookupOf<T>'), F(18, 'value', 'T::Balance')])), path=['pallet_balances', 'pallet', 'Call'])
+T(20, var(V('set', 0, [F(22, 'now', 'T::Moment')])), path=['pallet_timestamp', 'pallet', 'Call'])
+T(21, var(V('Id', 0, [F(6, tn='AccountId')]), V('Raw', 2, [F(4, tn='Vec<u8>')]), V('Address32', 3, [F(5, tn='[u8; 32]')])),
+  path=['sp_runtime', 'multiaddress', 'MultiAddress'], params=[('AccountId', 6), ('AccountIndex', None)])
+T(22, {'compact': {'type': 2}})
+T(23, var(V('Timestamp', 3, [F(20, tn='x')]), V('Balances', 5, [F(19, tn='x')]), V('Utility', 6, [F(25, tn='x')]),
+          V('Test', 7, [F(40, tn='x')])),
+  path=['node_runtime', 'RuntimeCall'])
+T(24, {'sequence': {'type': 23}})
+T(25, var(V('batch', 0, [F(24, 'calls', 'Vec<<T as Config>::RuntimeCall>')])), path=['pallet_utility', 'pallet', 'Call'])
+T(26, var(V('Other', 0, [F(4, tn='Vec<u8>')]), V('Consensus', 4, [F(27, tn='ConsensusEngineId'), F(4, tn='Vec<u8>')]),
+          V('Seal', 5, [F(27, tn='ConsensusEngineId'), F(4, tn='Vec<u8>')]),
+          V('PreRuntime', 6, [F(27, tn='ConsensusEngineId'), F(4, tn='Vec<u8>')]), V('RuntimeEnvironmentUpdated', 8)),
+  path=['sp_runtime', 'generic', 'digest', 'DigestItem'])
+T(27, {'array': {'len': 4, 'type': 0}})
+T(28, comp(F(4)), path=['sp_runtime', 'generic', 'unchecked_extrinsic', 'UncheckedExtrinsic'],
+  params=[('Address', 21), ('Call', 23), ('Signature', 29), ('Extra', 30)])
+T(29, var(V('Ed25519', 0, [F(31)]), V('Sr25519', 1, [F(31)]), V('Ecdsa', 2, [F(39)])), path=['sp_runtime', 'MultiSignature'])
+T(30, {'tuple': [32, 33, 35]})
+T(31, {'array': {'len': 64, 'type': 0}})
+T(32, var(V('Immortal', 0)), path=['sp_runtime', 'generic', 'era', 'Era'])
+T(33, comp(F(34, tn='T::Index')), path=['frame_system', 'extensions', 'check_nonce', 'CheckNonce'])
+T(34, {'compact': {'type': 1}})
+T(35, comp(F(18, tn='BalanceOf<T>')), path=['pallet_transaction_payment', 'ChargeTransactionPayment'])
+T(36, {'primitive': 'bool'})
+T(37, var(V('None', 0), V('Some', 1, [F(1)])), path=['Option'], params=[('T', 1)])
+T(38, {'tuple': [1, 2]})
+T(39, {'array': {'len': 65, 'type': 0}})
+T(40, var(V('misc', 0, [F(36, 'flag', 'bool'), F(37, 'maybe', 'Option<u32>'), F(38, 'pair', '(u32, u64)'),
+                        F(41, 'small', 'i32'), F(4, 'text', 'Vec<u8>'), F(42, 'nothing', '()')]),
+          V('empty', 1)),
+  path=['pallet_test', 'pallet', 'Call'])
+T(41, {'primitive': 'i32'})
+T(42, {'tuple': []})
+T(43, {'primitive': 'u16'})
+
+pallets = [
+    {'name': 'System', 'storage': None, 'calls': None, 'event': {'ty': 10}, 'constants': [], 'error': None, 'index': 0},
+    {'name': 'Timestamp', 'storage': {'prefix': 'Timestamp', 'entries': [
+        {'name': 'Now', 'modifier': 'Default', 'type': {'Plain': 2}, 'default': '0x0000000000000000', 'documentation': []}
+    ]}, 'calls': {'ty': 20}, 'event': None, 'constants': [], 'error': None, 'index': 3},
+    {'name': 'Balances', 'storage': None, 'calls': {'ty': 19}, 'event': {'ty': 9}, 'constants': [], 'error': None, 'index': 5},
+    {'name': 'Utility', 'storage': None, 'calls': {'ty': 25}, 'event': None, 'constants': [], 'error': None, 'index': 6},
+    {'name': 'Test', 'storage': None, 'calls': {'ty': 40}, 'event': None, 'constants': [], 'error': None, 'index': 7},
+]
+
+metadata_value = [
+    '0x6d657461',
+    {'V14': {
+        'types': {'types': [{'id': i, 'type': t} for i, t in sorted(types.items())]},
+        'pallets': pallets,
+        'extrinsic': {'ty': 28, 'version': 4, 'signed_extensions': [
+            {'identifier': 'CheckMortality', 'ty': 32, 'additional_signed': 7},
+            {'identifier': 'CheckNonce', 'ty': 33, 'additional_signed': 42},
+            {'identifier': 'ChargeTransactionPayment', 'ty': 35, 'additional_signed': 42},
+        ]},
+        'runtime_type': 0
+    }}
+]
+
+
+def build_metadata(ss58_prefix: int = None) -> bytes:
+    """
+    Encodes the fixture as MetadataVersioned
+    :param ss58_prefix: value of the `System.SS58Prefix` constant, omitted when None
+    :return: SCALE encoded metadata
+    """
+    runtime_config = RuntimeConfigurationObject()
+    runtime_config.update_type_registry(load_type_registry_preset('core'))
+
+    pallets[0]['constants'] = [] if ss58_prefix is None else [
+        {'name': 'SS58Prefix', 'type': 43, 'value': f'0x{ss58_prefix.to_bytes(2, "little").hex()}', 'documentation': []}
+    ]
+
+    return bytes(runtime_config.create_scale_object('MetadataVersioned').encode(metadata_value).data)
@@ -0,0 +1,162 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
+
+from app import settings
+from app.base import DatabaseSubstrateInterface
+from app.failure_cache import DecodeFailureCache
+from app.jobs import ScaleDecode, DeferredDecode
+from app.models.codec import CodecBlockExtrinsic, CodecBlockHeaderDigestLog, CodecBlockStorage, CodecBlockEvent, \
+    CodecDecodeFailure, CodecDecodeCache, CodecDeferredDecode
+from app.models.node import HarvesterStatus, NodeBlockHeader, NodeBlockExtrinsic, NodeBlockHeaderDigestLog, \
+    NodeBlockRuntime, NodeBlockStorage, NodeMetadata, NodeRuntime
+from tests.metadata_v14 import build_metadata
+
+TIMESTAMP_SET = b'\x04' + bytes([3, 0]) + b'\x0b\x00\x20\x4a\xa9\xd1\x01'
+
+
+def block_hash(block_number: int) -> bytes:
+    return bytes([block_number]) * 32
+
+
+class DecodeHarvester:
+    """
+    Stand-in for the harvester of a pruned node, decoding from an in-memory database
+    """
+
+    event_storage_key = bytes(32)
+    substrate = None
+    block_start = None
+    block_end = None
+
+    def __init__(self, session, node_type: str):
+        self.session = session
+        self.engine = session.get_bind()
+        self.type = node_type
+        self.settings = settings
+        self.decode_failure_cache = DecodeFailureCache(3)
+        self.db_substrate = DatabaseSubstrateInterface(
+            db_session=session, type_registry_preset='core', auto_discover=False
+        )
+        self.db_substrate.runtime_config.ss58_format = None
+
+    def log(self, message, verbose_level=1):
+        pass
+
+
+@pytest.fixture
+def session():
+    # Raw rows are streamed over a separate connection, which has to see the same in-memory database
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+
+    for model in [HarvesterStatus, NodeBlockHeader, NodeBlockExtrinsic, NodeBlockHeaderDigestLog, NodeBlockRuntime,
+                  NodeBlockStorage, NodeMetadata, NodeRuntime, CodecBlockExtrinsic, CodecBlockHeaderDigestLog,
+                  CodecBlockStorage, CodecBlockEvent, CodecDecodeFailure, CodecDecodeCache, CodecDeferredDecode]:
+        model.__table__.create(engine)
+
+    session = scoped_session(sessionmaker(bind=engine))
+
+    session.add(HarvesterStatus(key='PROCESS_DECODER_MAX_BLOCKNUMBER', value=None))
+    session.add(NodeMetadata(spec_name='node', spec_version=1, block_hash=block_hash(1), data=build_metadata(),
+                             complete=True))
+
+    for block_number in range(1, 11):
+        session.add(NodeBlockHeader(
+            hash=block_hash(block_number), block_number=block_number, parent_hash=block_hash(block_number - 1),
+            number=block_number.to_bytes(4, 'little'), extrinsics_root=bytes(32), state_root=bytes(32)
+        ))
+        session.add(NodeBlockExtrinsic(
+            block_hash=block_hash(block_number), extrinsic_idx=0, block_number=block_number, data=TIMESTAMP_SET,
+            hash=bytes(32), length=bytes([len(TIMESTAMP_SET) * 4])
+        ))
+        session.add(NodeBlockStorage(
+            block_hash=block_hash(block_number), storage_key=b'\x01' * 32, block_number=block_number,
+            storage_module='Timestamp', storage_name='Now', data=(block_number * 6000).to_bytes(8, 'little')
+        ))
+
+    # State of blocks 1-2 was pruned before the harvester started, state of block 6 was missed
+    for block_number in [3, 4, 5, 7, 8, 9, 10]:
+        session.add(NodeBlockRuntime(
+            hash=block_hash(block_number), block_number=block_number, spec_name='node', spec_version=1
+        ))
+
+    session.commit()
+    yield session
+    session.remove()
+
+
+def test_blocks_without_runtime_are_skipped(session):
+    ScaleDecode(harvester=DecodeHarvester(session, 'full')).decode_blocks()
+
+    # Blocks are decoded against the runtime of their parent block
+    assert [item.block_number for item in CodecBlockExtrinsic.query(session).order_by('block_number')] == \
+        [4, 5, 6, 8, 9, 10]
+    assert [item.block_number for item in CodecBlockStorage.query(session).order_by('block_number')] == \
+        [4, 5, 6, 8, 9, 10]
+    assert HarvesterStatus.query(session).get('PROCESS_DECODER_MAX_BLOCKNUMBER').value == 10
+
+
+def test_decode_range_starts_at_first_captured_runtime(session):
+    record, min_block_id, max_block_id = ScaleDecode(harvester=DecodeHarvester(session, 'full')).get_decode_range()
+    assert (min_block_id, max_block_id) == (3, 10)
+
+    record, min_block_id, max_block_id = ScaleDecode(harvester=DecodeHarvester(session, 'archive')).get_decode_range()
+    assert (min_block_id, max_block_id) == (0, 10)
+
+
+def test_no_decode_range_before_runtime_captured(session):
+    NodeBlockRuntime.query(session).delete()
+
+    record, min_block_id, max_block_id = ScaleDecode(harvester=DecodeHarvester(session, 'light')).get_decode_range()
+    assert max_block_id < min_block_id
+
+
+def test_deferred_extrinsics_are_queued_and_decoded(session, monkeypatch):
+    monkeypatch.setattr(settings, 'DEFERRED_DECODE_CALLS', ['Timestamp.set'])
+    harvester = DecodeHarvester(session, 'full')
+    ScaleDecode(harvester=harvester).decode_blocks()
+
+    assert [item.block_number for item in CodecDeferredDecode.query(session).order_by('block_number')] == \
+        [4, 5, 6, 8, 9, 10]
+    assert not any(item.complete for item in CodecBlockExtrinsic.query(session))
+
+    monkeypatch.setattr(settings, 'DEFERRED_DECODE_LIMIT', 4)
+    DeferredDecode(harvester=harvester).start()
+
+    assert [item.block_number for item in CodecDeferredDecode.query(session).order_by('block_number')] == [9, 10]
+    assert [item.block_number for item in CodecBlockExtrinsic.query(session).filter_by(complete=True)
+            .order_by('block_number')] == [4, 5, 6, 8]
+
+
+def test_lazy_storage_is_queued_and_decoded_on_read(session, monkeypatch):
+    monkeypatch.setattr(settings, 'LAZY_DECODE', True)
+    job = ScaleDecode(harvester=DecodeHarvester(session, 'full'))
+    job.decode_blocks()
+
+    assert [item.block_number for item in CodecDeferredDecode.query(session).filter_by(item_type='storage')
+            .order_by('block_number')] == [4, 5, 6, 8, 9, 10]
+
+    for codec_storage in CodecBlockStorage.query(session).order_by('block_number'):
+        assert job.get_storage_value(codec_storage) == codec_storage.block_number * 6000
+    session.commit()
+
+    assert CodecDecodeCache.query(session).filter_by(item_type='storage').count() == 6
+    assert not any(item.complete for item in CodecBlockStorage.query(session))
@@ -0,0 +1,153 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import json
+
+import pytest
+from scalecodec.base import RuntimeConfigurationObject, ScaleBytes
+from scalecodec.type_registry import load_type_registry_preset
+
+from app.decoder_plans import DecoderPlans
+from tests.metadata_v14 import build_metadata
+
+ACCOUNT = bytes(range(32))
+
+EVENTS_TYPE = 'Vec<scale_info::16>'
+
+DIGEST_ITEM_TYPE = 'sp_runtime::generic::digest::DigestItem'
+
+
+@pytest.fixture
+def runtime_config():
+    runtime_config = RuntimeConfigurationObject(implements_scale_info=True)
+    runtime_config.update_type_registry(load_type_registry_preset('core'))
+    return runtime_config
+
+
+@pytest.fixture
+def plans(runtime_config):
+    metadata = runtime_config.create_scale_object('MetadataVersioned', data=ScaleBytes(bytearray(build_metadata())))
+    metadata.decode()
+    runtime_config.add_portable_registry(metadata)
+    return DecoderPlans(runtime_config, metadata)
+
+
+def compact(value: int) -> bytes:
+    runtime_config = RuntimeConfigurationObject()
+    runtime_config.update_type_registry(load_type_registry_preset('core'))
+    return bytes(runtime_config.create_scale_object('Compact<u128>').encode(value).data)
+
+
+def length_prefixed(data: bytes) -> bytes:
+    return compact(len(data)) + data
+
+
+CALL_TRANSFER = bytes([5, 0]) + b'\x00' + ACCOUNT + compact(10**18)
+
+CALL_MISC = bytes([7, 0]) + b'\x01' + b'\x01' + (7).to_bytes(4, 'little') + (1).to_bytes(4, 'little') + \
+    (2).to_bytes(8, 'little') + (-5).to_bytes(4, 'little', signed=True) + compact(3) + b'abc'
+
+CALL_MISC_NONE = bytes([7, 0]) + b'\x00' + b'\x00' + (1).to_bytes(4, 'little') + (2).to_bytes(8, 'little') + \
+    (-5).to_bytes(4, 'little', signed=True) + compact(2) + b'\xff\xfe'
+
+SIGNED_EXTRINSIC = b'\x84' + b'\x00' + ACCOUNT + b'\x01' + bytes(64) + b'\x00' + compact(5) + compact(0) + \
+    CALL_TRANSFER
+
+EXTRINSICS = {
+    'unsigned': length_prefixed(b'\x04' + bytes([3, 0]) + compact(1690000000000)),
+    'signed': length_prefixed(SIGNED_EXTRINSIC),
+    'nested calls': length_prefixed(
+        b'\x04' + bytes([6, 0]) + compact(4) + CALL_TRANSFER + CALL_MISC + CALL_MISC_NONE + bytes([7, 1])
+    )
+}
+
+DIGEST_ITEMS = [
+    b'\x06' + b'BABE' + compact(3) + b'\x01\x02\x03',
+    b'\x05' + b'aura' + compact(2) + b'hi',
+    b'\x08',
+    b'\x00' + compact(1) + b'\x80'
+]
+
+EVENT_RECORDS = [
+    b'\x00' + (1).to_bytes(4, 'little') + b'\x00\x00' + (123).to_bytes(8, 'little') + b'\x01' + b'\x00' + compact(0),
+    b'\x00' + (1).to_bytes(4, 'little') + b'\x05\x02' + ACCOUNT + ACCOUNT + (99).to_bytes(16, 'little') +
+    compact(1) + ACCOUNT,
+    b'\x01' + b'\x05\x07' + ACCOUNT + (5).to_bytes(16, 'little') + compact(0),
+    b'\x02' + b'\x00\x04' + compact(0),
+]
+
+
+def assert_equal_output(plan_value, generic_value):
+    assert json.dumps(plan_value, default=str) == json.dumps(generic_value, default=str)
+
+
+@pytest.mark.parametrize('name', EXTRINSICS.keys())
+def test_extrinsic_plan_matches_generic_decoder(plans, name):
+    data = EXTRINSICS[name]
+    assert_equal_output(plans.decode('Extrinsic', data), plans.decode_generic('Extrinsic', data))
+    assert plans.entries['Extrinsic'] is not None
+
+
+@pytest.mark.parametrize('data', DIGEST_ITEMS)
+def test_digest_item_plan_matches_generic_decoder(plans, data):
+    assert_equal_output(plans.decode(DIGEST_ITEM_TYPE, data), plans.decode_generic(DIGEST_ITEM_TYPE, data))
+    assert plans.entries[DIGEST_ITEM_TYPE] is not None
+
+
+def test_events_plan_matches_generic_decoder(plans):
+    data = compact(len(EVENT_RECORDS)) + b''.join(EVENT_RECORDS)
+    assert_equal_output(plans.decode(EVENTS_TYPE, data), plans.decode_generic(EVENTS_TYPE, data))
+    assert plans.entries[EVENTS_TYPE] is not None
+
+
+def test_events_batch_matches_generic_decoder(plans):
+    data_list = [compact(len(EVENT_RECORDS[:count])) + b''.join(EVENT_RECORDS[:count]) for count in range(5)]
+    assert_equal_output(
+        plans.decode_batch(EVENTS_TYPE, data_list), [plans.decode_generic(EVENTS_TYPE, data) for data in data_list]
+    )
+
+
+def test_signed_extrinsic_call_index(plans):
+    assert plans.decode_call_index(SIGNED_EXTRINSIC) == bytes([5, 0])
+
+
+def test_invalid_data_raises_generic_error(plans):
+    with pytest.raises(Exception):
+        plans.decode('Extrinsic', EXTRINSICS['signed'][:-3])
+
+
+def test_plan_disabled_on_difference(plans):
+    data = EXTRINSICS['unsigned']
+    generic_value = plans.decode_generic('Extrinsic', data)
+
+    plans.entries['Extrinsic'] = lambda stream: stream.get_next_bytes(stream.length) and {'invalid': True}
+
+    assert_equal_output(plans.decode('Extrinsic', data), generic_value)
+    assert plans.entries['Extrinsic'] is None
+
+
+def test_events_batch_falls_back_per_item(plans):
+    data_list = [compact(len(EVENT_RECORDS)) + b''.join(EVENT_RECORDS), b'\x08\x00', compact(1) + EVENT_RECORDS[2]]
+
+    values = plans.decode_batch(EVENTS_TYPE, data_list, return_exceptions=True)
+
+    assert isinstance(values[1], Exception)
+    assert_equal_output(values[0], plans.decode_generic(EVENTS_TYPE, data_list[0]))
+    assert_equal_output(values[2], plans.decode_generic(EVENTS_TYPE, data_list[2]))
+
+    with pytest.raises(Exception):
+        plans.decode_batch(EVENTS_TYPE, data_list)
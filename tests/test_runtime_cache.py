@@ -0,0 +1,100 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from app.base import DatabaseSubstrateInterface
+from app.models.codec import RuntimeStorage
+from app.models.node import NodeBlockHeader, NodeBlockRuntime, NodeMetadata, NodeRuntime
+from tests.metadata_v14 import build_metadata
+
+SPEC_VERSIONS = [1, 2, 3]
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+
+    for model in [NodeBlockHeader, NodeBlockRuntime, NodeMetadata, NodeRuntime, RuntimeStorage]:
+        model.__table__.create(engine)
+
+    session = scoped_session(sessionmaker(bind=engine))
+
+    for spec_version in SPEC_VERSIONS:
+        session.add(NodeMetadata(spec_name='node', spec_version=spec_version, block_hash=bytes([spec_version]) * 32,
+                                 data=build_metadata(), complete=True))
+        session.add(RuntimeStorage(spec_name='node', spec_version=spec_version, pallet='Timestamp', storage_name='Now',
+                                   pallet_storage_idx=0, key_prefix_pallet=bytes(16),
+                                   key_prefix_name=bytes(16)))
+
+    session.commit()
+    yield session
+    session.remove()
+
+
+@pytest.fixture
+def db_substrate(session):
+    db_substrate = DatabaseSubstrateInterface(
+        db_session=session, type_registry_preset='core', auto_discover=False, runtime_cache_size=2
+    )
+    db_substrate.runtime_config.ss58_format = None
+    return db_substrate
+
+
+def test_local_metadata_cache_is_bounded(db_substrate):
+    for spec_version in SPEC_VERSIONS:
+        assert db_substrate.get_local_storage_function('node', spec_version, 'Timestamp', 'Now')[0] == bytes(32)
+
+    assert list(db_substrate.local_metadata_cache) == [('node', 2), ('node', 3)]
+    assert {key[:2] for key in db_substrate.local_storage_function_cache} == {('node', 2), ('node', 3)}
+
+    # Reading a runtime marks it as most recently used
+    metadata = db_substrate.get_local_metadata('node', 2)
+    assert list(db_substrate.local_metadata_cache) == [('node', 3), ('node', 2)]
+    assert db_substrate.get_local_metadata('node', 2) is metadata
+
+    assert db_substrate.get_local_metadata('node', 4) is None
+
+
+def test_runtime_cache_hit_restores_runtime_properties(session, db_substrate):
+    for spec_version in SPEC_VERSIONS:
+        block_hash = bytes([spec_version]) * 32
+        NodeMetadata.query(session).get(('node', spec_version)).data = build_metadata(ss58_prefix=spec_version)
+        session.add(NodeBlockHeader(hash=block_hash, block_number=spec_version, parent_hash=bytes(32),
+                                    number=spec_version.to_bytes(4, 'little'), extrinsics_root=bytes(32),
+                                    state_root=bytes(32)))
+        session.add(NodeBlockRuntime(hash=block_hash, block_number=spec_version, spec_name='node',
+                                     spec_version=spec_version))
+        session.add(NodeRuntime(impl_name='node', impl_version=1, spec_name='node', spec_version=spec_version,
+                                authoring_version=1, transaction_version=spec_version * 10, block_hash=block_hash,
+                                block_number=spec_version))
+    session.commit()
+
+    for spec_version in [1, 2, 1, 3]:
+        db_substrate.init_runtime(block_hash=f'0x{bytes([spec_version]).hex() * 32}')
+        db_substrate.get_storage_value_type('Timestamp', 'Now')
+
+        assert db_substrate.runtime_version == spec_version
+        assert db_substrate.transaction_version == spec_version * 10
+        assert db_substrate.ss58_format == spec_version
+        assert db_substrate.runtime_config.ss58_format is None
+
+    # Runtime 2 is evicted together with the lookups of its metadata
+    assert list(db_substrate.runtime_cache) == [1, 3]
+    assert set(db_substrate.storage_value_types) == {1, 3}
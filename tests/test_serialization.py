@@ -0,0 +1,62 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import pytest
+import sqlalchemy as sa
+
+from app import settings
+from app.models.field_types import SerializedData
+from app.serialization import SERIALIZATION_FORMATS, dumps_data, loads_data
+
+VALUES = [{'amount': 2**70, 'who': '0x' + '00' * 32, 'items': [1, 2, None]}, {'nested': {'a': [True, 1.5]}}, [], 0]
+
+
+def data_table():
+    # A new table object per configured format, like the models after a restart with changed settings
+    return sa.Table(
+        'data_table', sa.MetaData(), sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('data', SerializedData('data_table'))
+    )
+
+
+@pytest.mark.parametrize('serialization_format', SERIALIZATION_FORMATS)
+def test_values_survive_each_format(serialization_format):
+    for value in VALUES:
+        assert loads_data(dumps_data(value, serialization_format)) == value
+
+
+@pytest.mark.parametrize('serialization_format', SERIALIZATION_FORMATS)
+def test_rows_readable_after_switching_format(serialization_format, monkeypatch):
+    engine = sa.create_engine('sqlite://')
+
+    monkeypatch.setattr(settings, 'CODEC_DATA_SERIALIZATION', {'data_table': serialization_format})
+    table = data_table()
+    table.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [{'id': 1, 'data': VALUES[0]}, {'id': 2, 'data': None}])
+
+    monkeypatch.setattr(settings, 'CODEC_DATA_SERIALIZATION', {})
+    table = data_table()
+
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [{'id': 3, 'data': VALUES[1]}])
+
+        assert connection.execute(sa.select(table.c.data).order_by(table.c.id)).scalars().all() == \
+            [VALUES[0], None, VALUES[1]]
+        # None is stored as NULL in any format
+        assert connection.exec_driver_sql('SELECT data FROM data_table WHERE id = 2').scalar() is None
@@ -0,0 +1,118 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from app import settings
+from app.base import DatabaseSubstrateInterface
+from app.failure_cache import DecodeFailureCache
+from app.jobs import StorageTask
+from app.models.codec import CodecBlockStorage, CodecBlockEvent, CodecDecodeFailure
+from app.models.node import HarvesterStorageTask, HarvesterStorageCron, NodeBlockHeader, NodeBlockRuntime, \
+    NodeBlockStorage, NodeMetadata, NodeRuntime
+from tests.metadata_v14 import build_metadata
+
+TIMESTAMP_NOW = bytes.fromhex('f0c365c3cf59d671eb72da0e7a4113c49f1f0515f462cdcf84e0f1d6045dfcbb')
+
+
+def block_hash(block_number: int) -> bytes:
+    return bytes([block_number]) * 32
+
+
+class TaskHarvester:
+    """
+    Stand-in for the harvester that serves the storage values of a block instead of requesting them from a node
+    """
+
+    event_storage_key = bytes(32)
+    substrate = None
+
+    def __init__(self, session, storage: dict):
+        self.session = session
+        self.settings = settings
+        self.storage = storage
+        self.decode_failure_cache = DecodeFailureCache(3)
+        self.db_substrate = DatabaseSubstrateInterface(
+            db_session=session, type_registry_preset='core', auto_discover=False
+        )
+        self.db_substrate.runtime_config.ss58_format = None
+
+    def log(self, message, verbose_level=1):
+        pass
+
+    def rpc_call(self, method, params, result_handler=None):
+        if method == 'state_queryStorageAt':
+            return {'result': [{'block': params[1], 'changes': [
+                [storage_key, self.storage.get(storage_key)] for storage_key in params[0]
+            ]}]}
+
+        raise ValueError(f'No response for {method}')
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+
+    for model in [HarvesterStorageTask, HarvesterStorageCron, NodeBlockHeader, NodeBlockRuntime, NodeBlockStorage,
+                  NodeMetadata, NodeRuntime, CodecBlockStorage, CodecBlockEvent, CodecDecodeFailure]:
+        model.__table__.create(engine)
+
+    session = scoped_session(sessionmaker(bind=engine))
+
+    session.add(NodeMetadata(spec_name='node', spec_version=1, block_hash=block_hash(1), data=build_metadata(),
+                             complete=True))
+
+    for block_number in range(1, 6):
+        session.add(NodeBlockHeader(
+            hash=block_hash(block_number), block_number=block_number, parent_hash=block_hash(block_number - 1),
+            number=block_number.to_bytes(4, 'little'), extrinsics_root=bytes(32), state_root=bytes(32)
+        ))
+        session.add(NodeBlockRuntime(
+            hash=block_hash(block_number), block_number=block_number, spec_name='node', spec_version=1
+        ))
+
+    session.commit()
+    yield session
+    session.remove()
+
+
+def test_event_triggered_storage_is_decoded(session):
+    cron_entry = HarvesterStorageCron(
+        storage_module='Timestamp', storage_name='Now', storage_key=TIMESTAMP_NOW,
+        trigger_event_module='Balances', trigger_event_name='Transfer'
+    )
+    cron_entry.save(session)
+
+    task = HarvesterStorageTask(
+        description='Storage cron Timestamp.Now on Balances.Transfer', cron_id=cron_entry.id, block_number=5,
+        complete=False
+    )
+    task.save(session)
+    session.commit()
+
+    harvester = TaskHarvester(session, {f'0x{TIMESTAMP_NOW.hex()}': f'0x{(30000).to_bytes(8, "little").hex()}'})
+
+    StorageTask(harvester=harvester).start()
+
+    # The block of the event is already passed by the decoder watermark, so the task decodes what it captures
+    codec_storage = CodecBlockStorage.query(session).get((block_hash(5), TIMESTAMP_NOW))
+
+    assert codec_storage is not None
+    assert (codec_storage.complete, codec_storage.data) == (True, 30000)
+    assert HarvesterStorageTask.query(session).get(task.id).complete
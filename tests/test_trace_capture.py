@@ -0,0 +1,155 @@
+#  Polkascan Harvester
+#
+#  Copyright 2018-2022 Stichting Polkascan (Polkascan Foundation).
+#  This file is part of Polkascan.
+#
+#  Polkascan is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Polkascan is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Polkascan. If not, see <http://www.gnu.org/licenses/>.
+import json
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+
+from app import settings
+from app.jobs import RetrieveRuntimeState
+from app.models.node import NodeBlockStorage, NodeBlockStorageSnapshot, HarvesterStorageCron
+from app.snapshot import read_storage_snapshot
+
+RECORDING = os.path.join(os.path.dirname(__file__), 'fixtures', 'state_trace_block.json')
+
+SYSTEM_ACCOUNT = bytes.fromhex('26aa394eea5630e07c48ae0c9558cef7b99d880ec681799c0cf30e8886371da9')
+
+STAKING_LEDGER = bytes.fromhex('5f3e4907f716ac89b6347d15ececedca422adb579f1dbf4f3886c5cfa3bb8cc4')
+
+
+class RecordedHarvester:
+    """
+    Stand-in for the harvester that replays a recorded `state_traceBlock` response and the post-state of the
+    traced block instead of requesting them from a node
+    """
+
+    def __init__(self, session, recording: dict):
+        self.session = session
+        self.substrate = None
+        self.db_substrate = None
+        self.settings = settings
+        self.recording = recording
+        self.rpc_requests = []
+
+    def log(self, message, verbose_level=1):
+        pass
+
+    def rpc_call(self, method, params, result_handler=None):
+        self.rpc_requests.append((method, params))
+
+        if method == 'state_traceBlock':
+            return self.recording['state_traceBlock']
+
+        if method == 'state_queryStorageAt':
+            return {'result': [{'block': params[1], 'changes': [
+                [storage_key, self.recording['storage'].get(storage_key)] for storage_key in params[0]
+            ]}]}
+
+        raise ValueError(f'No recorded response for {method}')
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+
+    for model in [NodeBlockStorage, NodeBlockStorageSnapshot, HarvesterStorageCron]:
+        model.__table__.create(engine)
+
+    session = scoped_session(sessionmaker(bind=engine))
+    yield session
+    session.remove()
+
+
+@pytest.fixture
+def recording():
+    with open(RECORDING) as recording_file:
+        return json.load(recording_file)
+
+
+def add_trace_cron(session, storage_module, storage_name, storage_key_prefix, sink=None):
+    cron_entry = HarvesterStorageCron(
+        block_number_interval=1, storage_module=storage_module, storage_name=storage_name,
+        storage_key_prefix=storage_key_prefix, capture_mode='trace', sink=sink
+    )
+    cron_entry.save(session)
+    return cron_entry
+
+
+def capture_block(session, recording, cron_entries):
+    harvester = RecordedHarvester(session, recording)
+    block_hash = bytes.fromhex(recording['block_hash'][2:])
+
+    RetrieveRuntimeState(harvester=harvester).store_traced_storage(cron_entries, block_hash, 10)
+    session.commit()
+
+    return harvester
+
+
+def test_only_written_keys_of_traced_prefixes_are_stored(session, recording):
+    cron_entries = [
+        add_trace_cron(session, 'System', 'Account', SYSTEM_ACCOUNT),
+        add_trace_cron(session, 'Staking', 'Ledger', STAKING_LEDGER)
+    ]
+
+    harvester = capture_block(session, recording, cron_entries)
+
+    method, params = harvester.rpc_requests[0]
+    assert method == 'state_traceBlock'
+    assert params[2] == f'{SYSTEM_ACCOUNT.hex()},{STAKING_LEDGER.hex()}'
+
+    stored = {
+        item.storage_key: (item.storage_module, item.storage_name, item.data)
+        for item in NodeBlockStorage.query(session)
+    }
+
+    # Read-only access and writes outside the traced prefixes are not captured; values are read from the
+    # post-state, so a key written twice gets its final value and a removed key is stored as None
+    assert stored == {
+        SYSTEM_ACCOUNT + bytes.fromhex('aa' * 16 + '11' * 32): ('System', 'Account', bytes.fromhex('0300000000')),
+        SYSTEM_ACCOUNT + bytes.fromhex('bb' * 16 + '22' * 32): ('System', 'Account', None),
+        STAKING_LEDGER + bytes.fromhex('cc' * 16 + '33' * 32): ('Staking', 'Ledger', bytes.fromhex('0a00'))
+    }
+
+
+def test_file_sink_writes_snapshot_instead_of_rows(session, recording, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SNAPSHOT_PATH', str(tmp_path))
+
+    cron_entries = [
+        add_trace_cron(session, 'System', 'Account', SYSTEM_ACCOUNT),
+        add_trace_cron(session, 'Staking', 'Ledger', STAKING_LEDGER, sink='file')
+    ]
+
+    capture_block(session, recording, cron_entries)
+
+    assert [item.storage_module for item in NodeBlockStorage.query(session)] == ['System', 'System']
+
+    snapshot = NodeBlockStorageSnapshot.query(session).one()
+
+    assert (snapshot.storage_module, snapshot.storage_name, snapshot.count_keys) == ('Staking', 'Ledger', 1)
+    assert read_storage_snapshot(snapshot.file_path, columns=['storage_key', 'data']).to_pylist() == [
+        {'storage_key': STAKING_LEDGER + bytes.fromhex('cc' * 16 + '33' * 32), 'data': bytes.fromhex('0a00')}
+    ]
+
+
+def test_trace_error_is_raised(session, recording):
+    recording['state_traceBlock'] = {'result': {'traceError': {'error': 'Tracing is not enabled'}}}
+
+    with pytest.raises(ValueError, match='Tracing is not enabled'):
+        capture_block(session, recording, [add_trace_cron(session, 'System', 'Account', SYSTEM_ACCOUNT)])